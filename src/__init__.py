@@ -2,3 +2,4 @@ import os
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(ROOT_DIR, "src", "data")
+CACHE_DIR = os.path.join(ROOT_DIR, "src", "cache")
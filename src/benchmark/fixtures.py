@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from src import DATA_DIR
+from src.webscraper.dates import BASE_URL
+
+BENCHMARK_DIR = os.path.join(DATA_DIR, "benchmarks")
+FIXTURES_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+MANIFEST_FILENAME = "manifest.json"
+
+
+def fixture_dir(name: str) -> str:
+    return os.path.join(FIXTURES_DIR, name)
+
+
+def page_path(fixture: str, url_path: str) -> str:
+    """Recorded pages mirror the site's url paths under the fixture"""
+    parts = [part for part in url_path.split("/") if part and part != ".."]
+    return os.path.join(fixture, "site", *parts)
+
+
+def save_page(fixture: str, url: str, content: bytes) -> None:
+    path = page_path(fixture, urlsplit(url).path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def load_manifest(fixture: str) -> dict:
+    with open(os.path.join(fixture, MANIFEST_FILENAME)) as f:
+        return json.load(f)
+
+
+def save_manifest(fixture: str, manifest: dict) -> None:
+    with open(os.path.join(fixture, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serve recorded pages, pointing links to the live site back at us"""
+
+    def do_GET(self):
+        path = page_path(self.server.fixture, urlsplit(self.path).path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        with open(path, "rb") as f:
+            body = f.read()
+        body = body.replace(BASE_URL.encode(), self.server.base_url.encode())
+        is_html = path.endswith(".html")
+        self.send_response(200)
+        self.send_header(
+            "Content-Type", "text/html" if is_html else "application/json"
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@contextmanager
+def serve_fixture(fixture: str):
+    """Serve fixture on a free local port, yielding its base url"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.daemon_threads = True
+    server.fixture = fixture
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.base_url
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,115 @@
+import argparse
+import os
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+import src.utils.logger as logs
+from src.benchmark.fixtures import fixture_dir, save_manifest, save_page
+from src.configs.config import load_config
+from src.webscraper.dates import get_archive_url, parse_article_urls
+from src.webscraper.http_scraper import get_article_id
+from src.webscraper.scraper import CONSENT_URL
+
+log = logs.CustomLogger(__name__)
+
+# Rendered DOM without scripts or frames, so a replayed page shows exactly
+# what was scraped and nothing on it can reach the live site. Links are
+# dropped so clicking the comment tabs never navigates away.
+SNAPSHOT_SCRIPT = """
+const doc = document.documentElement.cloneNode(true);
+doc.querySelectorAll("script, iframe, noscript").forEach(e => e.remove());
+doc.querySelectorAll("a[href]").forEach(e => e.removeAttribute("href"));
+return "<!DOCTYPE html>" + doc.outerHTML;
+"""
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", type=str, required=True)
+    parser.add_argument("--n-articles", type=int, default=100)
+    parser.add_argument("--name", type=str, required=True)
+
+    return parser.parse_args(argv)
+
+
+def snapshot(driver) -> bytes:
+    return driver.execute_script(SNAPSHOT_SCRIPT).encode()
+
+
+def click(driver, xpath: str, timeout: float = 5) -> bool:
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.element_to_be_clickable((By.XPATH, xpath))
+        ).click()
+        return True
+    except TimeoutException:
+        return False
+
+
+def record_fixture(date_str: str, n_articles: int, name: str) -> str:
+    """
+    Record one day from the live site: the sitemap archive, a rendered
+    snapshot and the comments payload of its first n articles
+    """
+    scraper_config = load_config("webscraper/scraper_config.yaml")
+    fixture = fixture_dir(name)
+    date_ = datetime.strptime(date_str, "%d/%m/%Y").date()
+    session = requests.Session()
+
+    archive_url = get_archive_url(date_)
+    res = session.get(archive_url)
+    res.raise_for_status()
+    save_page(fixture, archive_url, res.content)
+    article_urls = parse_article_urls(res.content)[:n_articles]
+
+    comments_url = scraper_config["http"]["comments_url"]
+    for url in article_urls:
+        article_comments_url = comments_url.format(article_id=get_article_id(url))
+        res = session.get(article_comments_url)
+        if res.ok:
+            save_page(fixture, article_comments_url, res.content)
+
+    options = Options()
+    for arg in scraper_config["chrome_args"]:
+        options.add_argument(arg)
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(scraper_config["page_load_timeout"])
+    try:
+        # Consent page keeps its pop-up, so replays pay for dismissing it too
+        driver.get(CONSENT_URL)
+        save_page(fixture, CONSENT_URL, snapshot(driver))
+        click(driver, "//button[text()='Got it']")
+
+        for i, url in enumerate(article_urls):
+            driver.get(url)
+            click(driver, "//a[text()='Best rated']")
+            save_page(fixture, url, snapshot(driver))
+            log.info(f"Recorded {i + 1}/{len(article_urls)} articles")
+    finally:
+        driver.quit()
+
+    save_manifest(
+        fixture,
+        {
+            "date": date_.isoformat(),
+            "created": datetime.utcnow().isoformat(),
+            "consent_path": urlsplit(CONSENT_URL).path,
+            "article_paths": [urlsplit(url).path for url in article_urls],
+        },
+    )
+    log.info(f"Fixture {name} recorded to {fixture}")
+    return fixture
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.makedirs(fixture_dir(args.name), exist_ok=True)
+    record_fixture(date_str=args.date, n_articles=args.n_articles, name=args.name)
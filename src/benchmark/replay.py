@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from contextlib import nullcontext
+from datetime import date, datetime
+from time import perf_counter
+from typing import List
+
+import yaml
+
+import src.utils.logger as logs
+from src import ROOT_DIR
+from src.benchmark.fixtures import (
+    BENCHMARK_DIR,
+    fixture_dir,
+    load_manifest,
+    serve_fixture,
+)
+from src.configs.config import load_config
+from src.utils.memory import MB, descendants_rss
+from src.webscraper.dates import BASE_URL, get_dates_article_urls
+from src.webscraper.metrics import ScrapeMetrics
+from src.webscraper.run import create_scraper
+
+log = logs.CustomLogger(__name__)
+
+"""
+Record a day once against the live site, then replay it against any commit
+or settings and compare:
+
+python -m src.benchmark.record --date 01/03/2023 --n-articles 100 --name march
+python -m src.benchmark.replay run --fixture march --set n_workers=4
+python -m src.benchmark.replay compare --fixture march
+
+Page weight before/after resource blocking, against the live site:
+
+python -m src.benchmark.replay run --fixture march --live --label full
+    --set page.measure_transfer=true --set page.load_strategy=normal
+    --set page.block_resources=false
+python -m src.benchmark.replay run --fixture march --live --label light
+    --set page.measure_transfer=true
+"""
+
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, "results.jsonl")
+# Anything not served by the fixture fails fast instead of reaching the web
+OFFLINE_CHROME_ARG = "host-resolver-rules=MAP * ~NOTFOUND , EXCLUDE 127.0.0.1"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--fixture", type=str, required=True)
+    run_parser.add_argument("--n-top-comments", type=int, default=1)
+    run_parser.add_argument("--label", type=str, required=False)
+    run_parser.add_argument("--live", action="store_true")
+    run_parser.add_argument(
+        "--set",
+        dest="overrides",
+        action="append",
+        default=[],
+        help="Scraper config override, e.g. backend=http or waits.min_timeout=0.1",
+    )
+
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("--fixture", type=str, required=False)
+
+    return parser.parse_args(argv)
+
+
+def apply_override(config: dict, override: str) -> None:
+    key, _, value = override.partition("=")
+    *parents, leaf = key.split(".")
+    for parent in parents:
+        config = config[parent]
+    config[leaf] = yaml.safe_load(value)
+
+
+def get_commit() -> str:
+    return subprocess.check_output(
+        ["git", "describe", "--always", "--dirty"], cwd=ROOT_DIR, text=True
+    ).strip()
+
+
+class MemorySampler:
+    """Sample combined RSS of the browser processes in the background"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.samples: List[int] = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.samples.append(descendants_rss())
+
+    def stats(self) -> dict:
+        if not self.samples:
+            return {"peak_mb": None, "mean_mb": None}
+        return {
+            "peak_mb": round(max(self.samples) / MB, 1),
+            "mean_mb": round(sum(self.samples) / len(self.samples) / MB, 1),
+        }
+
+
+def replay_config(
+    scraper_config: dict, base_url: str, manifest: dict, metrics_dir: str
+) -> dict:
+    """Point scraper config at the replay server and drop run-level sections"""
+    scraper_config = scraper_config.copy()
+    for section in (
+        "sitemaps",
+        "prefilter",
+        "task_queue",
+        "cache",
+        "supervisor",
+        "results",
+        "daily",
+    ):
+        scraper_config.pop(section)
+    scraper_config["metrics"] = ScrapeMetrics(
+        **scraper_config["metrics"], metrics_dir=metrics_dir
+    )
+    if base_url == BASE_URL:
+        return scraper_config
+
+    scraper_config["consent_url"] = base_url + manifest["consent_path"]
+    scraper_config["chrome_args"] = scraper_config["chrome_args"] + [
+        OFFLINE_CHROME_ARG
+    ]
+    http_config = dict(scraper_config["http"])
+    http_config["comments_url"] = http_config["comments_url"].replace(
+        BASE_URL, base_url
+    )
+    scraper_config["http"] = http_config
+    return scraper_config
+
+
+async def replay(date_: date, article_urls: List[str], scraper_config: dict):
+    """Scrape recorded articles, returning seconds taken and memory stats"""
+    with MemorySampler() as memory:
+        async with create_scraper(**scraper_config) as scraper:
+            start = perf_counter()
+            await scraper.process_date(date_, article_urls)
+            seconds = perf_counter() - start
+    return seconds, memory.stats()
+
+
+def run_benchmark(
+    fixture_name: str,
+    n_top_comments: int,
+    overrides: List[str],
+    label: str = None,
+    live: bool = False,
+) -> dict:
+    """
+    Replay fixture's articles through the configured backend. With live, the
+    same articles are fetched from the site instead, e.g. to measure page
+    weight with and without resource blocking.
+    """
+    fixture = fixture_dir(fixture_name)
+    manifest = load_manifest(fixture)
+    date_ = datetime.strptime(manifest["date"], "%Y-%m-%d").date()
+    recorded_paths = set(manifest["article_paths"])
+
+    scraper_config = load_config("webscraper/scraper_config.yaml")
+    scraper_config["n_top_comments"] = n_top_comments
+    for override in overrides:
+        apply_override(scraper_config, override)
+
+    server = nullcontext(BASE_URL) if live else serve_fixture(fixture)
+    with server as base_url, tempfile.TemporaryDirectory() as tmp:
+        start = perf_counter()
+        article_urls = get_dates_article_urls(date_, base_url=base_url)
+        sitemap_seconds = perf_counter() - start
+        article_urls = [
+            url
+            for url in article_urls
+            if url[len(base_url) :].split("#")[0] in recorded_paths
+        ]
+
+        config = replay_config(scraper_config, base_url, manifest, tmp)
+        seconds, memory = asyncio.run(replay(date_, article_urls, config))
+
+    metrics = config["metrics"]
+    result = {
+        "commit": get_commit(),
+        "label": label,
+        "created": datetime.utcnow().isoformat(),
+        "fixture": fixture_name,
+        "live": live,
+        "backend": scraper_config["backend"],
+        "n_workers": scraper_config["n_workers"],
+        "overrides": overrides,
+        "articles": len(article_urls),
+        "seconds": round(seconds, 2),
+        "articles_per_sec": round(len(article_urls) / seconds, 3),
+        "sitemap_seconds": round(sitemap_seconds, 3),
+        "phases": {phase: hist.stats() for phase, hist in metrics.phases.items()},
+        "events": dict(metrics.counters),
+        "browser_rss": memory,
+    }
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    with open(RESULTS_PATH, "a") as f:
+        f.write(json.dumps(result) + "\n")
+
+    log.info(
+        f"{result['articles']} articles in {result['seconds']}s - "
+        f"{result['articles_per_sec']} articles/sec, "
+        f"peak browser RSS {memory['peak_mb']} MB"
+    )
+    return result
+
+
+def compare(fixture_name: str = None) -> None:
+    """Print results history, oldest first, one line per run"""
+    if not os.path.exists(RESULTS_PATH):
+        print("No benchmark results yet")
+        return
+
+    with open(RESULTS_PATH) as f:
+        results = [json.loads(line) for line in f]
+    if fixture_name:
+        results = [r for r in results if r["fixture"] == fixture_name]
+
+    print(
+        "commit          label       backend    workers  art/s   p95 art  "
+        "KB/art   peak MB"
+    )
+    for r in results:
+        p95 = r["phases"].get("article", {}).get("p95")
+        page_bytes = r["events"].get("page_bytes")
+        kb = round(page_bytes / 1024 / r["articles"]) if page_bytes else "-"
+        print(
+            f"{r['commit']:<15} {r['label'] or '-':<11} {r['backend']:<10} "
+            f"{r['n_workers']:<8} {r['articles_per_sec']:<7} "
+            f"{p95 if p95 is not None else '-':<8} {kb:<8} "
+            f"{r['browser_rss']['peak_mb']}"
+        )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "run":
+        run_benchmark(
+            fixture_name=args.fixture,
+            n_top_comments=args.n_top_comments,
+            overrides=args.overrides,
+            label=args.label,
+            live=args.live,
+        )
+    else:
+        compare(fixture_name=args.fixture)
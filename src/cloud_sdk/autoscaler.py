@@ -0,0 +1,314 @@
+import math
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import src.utils.logger as logs
+from src.cloud_sdk.gcp_client import STOPPED_STATUSES
+from src.cloud_sdk.object_store import ObjectStore
+from src.webscraper.collect import published_dates, read_statuses
+
+log = logs.CustomLogger(__name__)
+
+"""
+Under per-second billing the VM-hours a run needs are roughly its articles
+divided by per-instance throughput, plus one startup per instance, so the
+cheapest fleet is the smallest one that still meets the deadline. The
+controller starts there and adds instances only once measured throughput
+says the deadline will be missed. An instance is removed as soon as its
+dates are published, and the whole fleet is stopped if the budget runs out.
+"""
+
+
+class FleetController:
+    """
+    Keep one-shot scraper instances working through their assigned dates.
+    Each poll reads published partitions and worker status reports from the
+    results store, then:
+
+    - deletes instances whose dates are all published
+    - replaces an instance that stopped (e.g. spot preemption) or failed to
+      start with one assigned only its unpublished dates
+    - with a deadline, splits the largest remaining assignment with a new
+      instance until the fleet's projected finish meets the deadline
+    - with a budget, stops adding instances past it and deletes the fleet
+      once it is spent
+
+    Each instance's startup time, from launch until its first worker
+    reported starting, is passed to compute's record_startup for the
+    capacity planner.
+
+    compute is a GCPClient, or anything with the same launch,
+    get_instance_statuses, delete_vm_instances and record_startup methods,
+    e.g. a simulator.
+    """
+
+    def __init__(
+        self,
+        compute,
+        results: ObjectStore,
+        make_script: Callable[[List[date]], str],
+        date_articles: Dict[date, int],
+        config: dict,
+        price_per_hour: float,
+        deadline: float = None,
+        budget: float = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.compute = compute
+        self.results = results
+        self.make_script = make_script
+        self.date_articles = date_articles
+        self.config = config
+        self.price_per_hour = price_per_hour
+        self.deadline = deadline
+        self.budget = budget
+        self.clock = clock
+        self.sleep = sleep
+        self.assignments: Dict[str, List[date]] = {}
+        self.launched_at: Dict[str, float] = {}
+        self.deleted_at: Dict[str, float] = {}
+        self.failed: Set[str] = set()
+        self.seen: Set[str] = set()
+        self.started: Set[str] = set()
+        self.dropped: List[date] = []
+        self.replacements = 0
+
+    def __repr__(self):
+        return f"{__class__.__name__}({len(self.assignments)} instances)"
+
+    def launch(self, date_groups: List[List[date]]) -> List[str]:
+        """Start one instance per date group, returning instance names"""
+        scripts = [self.make_script(dates) for dates in date_groups]
+        launched = self.compute.launch(scripts)
+        now = self.clock()
+        for (name, operation), dates in zip(launched, date_groups):
+            self.assignments[name] = dates
+            self.launched_at[name] = now
+            if operation is None:
+                # Never created, so never billed
+                self.failed.add(name)
+                self.deleted_at[name] = now
+        return [name for name, _ in launched]
+
+    def delete(self, names: List[str]) -> None:
+        if not names:
+            return
+        self.compute.delete_vm_instances(names)
+        now = self.clock()
+        for name in names:
+            self.deleted_at.setdefault(name, now)
+
+    def articles(self, dates: List[date]) -> int:
+        return sum(self.date_articles[d] for d in dates)
+
+    def spent(self) -> float:
+        """Cost so far, billing every instance from launch until deletion"""
+        now = self.clock()
+        seconds = sum(
+            self.deleted_at.get(name, now) - launched_at
+            for name, launched_at in self.launched_at.items()
+        )
+        return seconds / 3600 * self.price_per_hour
+
+    @staticmethod
+    def instance_reports(name: str, statuses: List[dict]) -> List[dict]:
+        """Status reports of every process on an instance"""
+        return [s for s in statuses if s["worker_id"].startswith(f"{name}-")]
+
+    def throughput(self, statuses: List[dict]) -> float:
+        """
+        Articles per second per instance, measured from the status reports of
+        every process on an instance. The configured estimate is used until
+        enough articles have been reported.
+        """
+        n_articles = 0
+        seconds = 0.0
+        for name in self.launched_at:
+            reports = self.instance_reports(name, statuses)
+            if reports:
+                n_articles += sum(s["articles"] for s in reports)
+                seconds += max(s["updated_at"] - s["started_at"] for s in reports)
+
+        if n_articles < self.config["min_measured_articles"] or seconds <= 0:
+            return self.config["articles_per_second"]
+        return n_articles / seconds
+
+    def record_startups(self, statuses: List[dict]) -> None:
+        """
+        Time from launch until an instance's first worker started, for every
+        instance reporting for the first time. Only fleets GCPClient.run waits
+        on are otherwise timed.
+        """
+        ready = {}
+        for name, launched_at in self.launched_at.items():
+            reports = self.instance_reports(name, statuses)
+            if reports and name not in self.started:
+                ready[name] = min(s["started_at"] for s in reports) - launched_at
+        if ready:
+            self.started.update(ready)
+            self.compute.record_startup(ready)
+
+    def initial_instances(self, default: int) -> int:
+        """Fleet to start with, sized by estimated throughput if there is a deadline"""
+        if self.deadline is None:
+            return default
+        required = self.required_instances(
+            sum(self.date_articles.values()), self.config["articles_per_second"]
+        )
+        return max(1, min(required, self.config["max_instances"]))
+
+    def required_instances(self, remaining_articles: int, rate: float) -> int:
+        """Smallest fleet finishing remaining articles by the deadline"""
+        if self.deadline is None:
+            return len(self.assignments)
+        # New instances only start working once booted
+        seconds_left = self.deadline - self.clock() - self.config["startup_seconds"]
+        if seconds_left <= 0:
+            return self.config["max_instances"]
+        capacity = rate * seconds_left / self.config["deadline_margin"]
+        return math.ceil(remaining_articles / capacity)
+
+    def affordable(self, remaining_articles: int, rate: float, n_new: int) -> bool:
+        """Whether finishing with n_new more instances is projected within budget"""
+        if self.budget is None:
+            return True
+        seconds = remaining_articles / rate + n_new * self.config["startup_seconds"]
+        return self.spent() + seconds / 3600 * self.price_per_hour <= self.budget
+
+    def split(self, name: str, rate: float) -> Optional[List[date]]:
+        """
+        Hand the back of instance's remaining dates to a new instance. The
+        instance keeps a larger front, as the new one first has to boot.
+        Returns the dates taken, or None if there is nothing worth splitting.
+        """
+        dates = self.assignments[name]
+        if len(dates) < 2:
+            return None
+
+        total = self.articles(dates)
+        target = (total + rate * self.config["startup_seconds"]) / 2
+        cumulative = 0
+        for i, d in enumerate(dates[:-1], start=1):
+            cumulative += self.date_articles[d]
+            if cumulative >= target:
+                break
+        # Less work than a boot's worth is finished sooner where it is
+        if self.articles(dates[i:]) < rate * self.config["startup_seconds"]:
+            return None
+        self.assignments[name] = dates[:i]
+        return dates[i:]
+
+    def replace_stopped(self, statuses: Dict[str, str]) -> None:
+        """Relaunch unpublished dates of instances that stopped or never started"""
+        stopped = []
+        for name in list(self.assignments):
+            gone = statuses.get(name) in STOPPED_STATUSES or (
+                name in self.seen and name not in statuses
+            )
+            if gone or name in self.failed:
+                stopped.append(name)
+
+        replaced, replace = [], []
+        for name in stopped:
+            dates = self.assignments.pop(name)
+            self.failed.discard(name)
+            if self.replacements >= self.config["max_replacements"]:
+                log.warning(
+                    f"Instance {name} stopped with {len(dates)} dates left, "
+                    f"replacement limit reached - Dropping from {dates[0]}"
+                )
+                self.dropped.extend(dates)
+                continue
+            self.replacements += 1
+            replaced.append(name)
+            replace.append(dates)
+
+        self.delete([name for name in stopped if name in statuses])
+        for name, new_name in zip(replaced, self.launch(replace)):
+            log.warning(
+                f"Instance {name} stopped - Replaced by {new_name} "
+                f"({self.replacements} replacements)"
+            )
+
+    def scale(self, remaining_articles: int, rate: float) -> None:
+        """Split assignments with new instances until the deadline is met"""
+        required = min(
+            self.required_instances(remaining_articles, rate),
+            self.config["max_instances"],
+        )
+        new_groups = []
+        while len(self.assignments) + len(new_groups) < required:
+            if not self.affordable(remaining_articles, rate, len(new_groups) + 1):
+                log.warning(f"Budget caps fleet below the {required} instances needed")
+                break
+            largest = max(
+                self.assignments, key=lambda n: self.articles(self.assignments[n])
+            )
+            dates = self.split(largest, rate)
+            if dates is None:
+                break
+            new_groups.append(dates)
+
+        if new_groups:
+            names = self.launch(new_groups)
+            log.info(f"Scaling up by {len(names)} instances to meet deadline")
+
+    def poll(self) -> bool:
+        """One control step. Returns False once every date is published."""
+        published = published_dates(self.results)
+        statuses = self.compute.get_instance_statuses()
+        self.seen.update(name for name in self.assignments if name in statuses)
+
+        finished = []
+        for name, dates in list(self.assignments.items()):
+            remaining = [d for d in dates if d not in published]
+            if remaining:
+                self.assignments[name] = remaining
+            else:
+                finished.append(name)
+                self.assignments.pop(name)
+                self.failed.discard(name)
+        self.delete([name for name in finished if name in statuses])
+
+        if not self.assignments:
+            return False
+
+        if self.budget is not None and self.spent() >= self.budget:
+            left = sorted(d for dates in self.assignments.values() for d in dates)
+            log.warning(
+                f"Budget of {self.budget:.2f} spent - Stopping fleet with "
+                f"{len(left)} dates left from {left[0]}"
+            )
+            self.delete([name for name in self.assignments if name in statuses])
+            self.dropped.extend(left)
+            self.assignments = {}
+            return False
+
+        self.replace_stopped(statuses)
+        reports = read_statuses(self.results)
+        self.record_startups(reports)
+        remaining_articles = sum(self.articles(d) for d in self.assignments.values())
+        rate = self.throughput(reports)
+        self.scale(remaining_articles, rate)
+
+        log.info(
+            f"{len(published)} dates published, {remaining_articles} articles left "
+            f"- {len(self.assignments)} instances at {rate:.2f} articles/s each, "
+            f"{self.spent():.2f} spent"
+        )
+        return bool(self.assignments)
+
+    def run(self) -> Tuple[float, List[date]]:
+        """Poll until done, returning total cost and any dates given up on"""
+        while True:
+            self.sleep(self.config["poll_seconds"])
+            if not self.poll():
+                break
+
+        log.info(
+            f"Fleet finished after {self.replacements} replacements - "
+            f"cost {self.spent():.2f}, {len(self.dropped)} dates dropped"
+        )
+        return self.spent(), self.dropped
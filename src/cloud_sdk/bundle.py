@@ -0,0 +1,111 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import urllib.request
+from datetime import datetime
+from typing import List
+
+import src.utils.logger as logs
+from src import ROOT_DIR
+from src.configs.config import load_config
+
+log = logs.CustomLogger(__name__)
+
+BUNDLE_NAME = "topcomment-bundle"
+REQUIREMENTS_PATH = os.path.join(ROOT_DIR, "src", "requirements.txt")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ref", type=str, default="HEAD")
+    parser.add_argument("--output-dir", type=str, required=False)
+
+    return parser.parse_args(argv)
+
+
+def get_version(ref: str) -> str:
+    """Bundle version from the commit and the pinned requirements"""
+    commit = subprocess.check_output(
+        ["git", "rev-parse", "--short", ref], cwd=ROOT_DIR, text=True
+    ).strip()
+    with open(REQUIREMENTS_PATH, "rb") as f:
+        requirements_hash = hashlib.sha256(f.read()).hexdigest()[:8]
+    return f"{commit}-{requirements_hash}"
+
+
+def package_code(ref: str, bundle_dir: str) -> None:
+    archive_path = os.path.join(bundle_dir, "code.tar")
+    git_archive = ["git", "archive", "--format=tar", "--prefix=TopComment/"]
+    subprocess.check_call(git_archive + ["-o", archive_path, ref], cwd=ROOT_DIR)
+    with tarfile.open(archive_path) as tar:
+        tar.extractall(bundle_dir)
+    os.remove(archive_path)
+
+
+def build_wheelhouse(bundle_dir: str, python_version: str, platform: str) -> None:
+    """Binary wheels for the VM's interpreter, plus pip itself to bootstrap"""
+    wheelhouse = os.path.join(bundle_dir, "wheelhouse")
+    pip_download = ["python3", "-m", "pip", "download", "--dest", wheelhouse]
+    pip_download += ["--only-binary=:all:", "--implementation", "cp"]
+    pip_download += ["--platform", platform, "--python-version", python_version]
+    subprocess.check_call(pip_download + ["pip"])
+    subprocess.check_call(pip_download + ["-r", REQUIREMENTS_PATH])
+    shutil.copy(REQUIREMENTS_PATH, os.path.join(bundle_dir, "requirements.txt"))
+
+
+def download_browser(bundle_dir: str, urls: List[str]) -> None:
+    browser_dir = os.path.join(bundle_dir, "browser")
+    os.makedirs(browser_dir)
+    for url in urls:
+        filepath = os.path.join(browser_dir, url.rsplit("/", 1)[-1])
+        log.info(f"Downloading {url}")
+        urllib.request.urlretrieve(url, filepath)
+
+
+def build_bundle(ref: str, output_dir: str, bundle_config: dict) -> str:
+    """
+    Package code, a wheelhouse of the pinned requirements and the pinned
+    browser and driver into one versioned tarball for the fast startup script
+    """
+    version = get_version(ref)
+    os.makedirs(output_dir, exist_ok=True)
+    bundle_path = os.path.join(output_dir, f"{BUNDLE_NAME}-{version}.tar.gz")
+
+    with tempfile.TemporaryDirectory() as staging_dir:
+        bundle_dir = os.path.join(staging_dir, BUNDLE_NAME)
+        os.makedirs(bundle_dir)
+        package_code(ref, bundle_dir)
+        build_wheelhouse(
+            bundle_dir, bundle_config["python_version"], bundle_config["platform"]
+        )
+        download_browser(
+            bundle_dir, [bundle_config["chrome_url"], bundle_config["chromedriver_url"]]
+        )
+
+        manifest = {
+            "version": version,
+            "ref": ref,
+            "created": datetime.utcnow().isoformat(),
+            "chrome_url": bundle_config["chrome_url"],
+            "chromedriver_url": bundle_config["chromedriver_url"],
+        }
+        with open(os.path.join(bundle_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        with tarfile.open(bundle_path, "w:gz") as tar:
+            tar.add(bundle_dir, arcname=BUNDLE_NAME)
+
+    log.info(f"Bundle {version} written to {bundle_path}")
+    return bundle_path
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    bundle_config = load_config("cloud_sdk/bundle_config.yaml")
+    output_dir = args.output_dir or os.path.join(ROOT_DIR, bundle_config["output_dir"])
+    build_bundle(ref=args.ref, output_dir=output_dir, bundle_config=bundle_config)
@@ -0,0 +1,251 @@
+import json
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import src.utils.logger as logs
+from src.cloud_sdk.gcp_client import STARTUP_LOG_PATH
+from src.cloud_sdk.object_store import ObjectStore
+from src.webscraper.collect import read_summaries
+from src.webscraper.ledger import LEDGER_PATH, ArticleLedger
+from src.webscraper.metrics import DAILY_SUMMARY_FILENAME, METRICS_DIR, TOTAL_PHASE
+from src.webscraper.partition import get_article_counts
+
+log = logs.CustomLogger(__name__)
+
+"""
+Predict wall-clock time, VM-hours and cost of scraping a date range for every
+combination of instance count, machine type and browsers per VM, from:
+
+- article counts per date, from the sitemap archives
+- seconds per article for one browser, from the daily summaries scrapers
+  publish to the results store (or write locally, without one)
+- instance startup time, from the startup log GCPClient appends to, both
+  for fleets it waits on and for those the fleet controller runs
+
+Each candidate is computed at once as numpy arrays over a grid shaped
+(instances, machine types, concurrency). The fleet is assumed to be run by
+the controller, which deletes each instance as soon as its dates are done.
+"""
+
+
+def load_summaries(
+    results: ObjectStore = None,
+    summary_path: str = os.path.join(METRICS_DIR, DAILY_SUMMARY_FILENAME),
+) -> List[dict]:
+    """
+    Daily summaries instances published to the results store, else those of
+    scrapers run on this machine
+    """
+    if results is not None:
+        summaries = read_summaries(results)
+        if summaries:
+            return summaries
+    if not os.path.exists(summary_path):
+        return []
+    with open(summary_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def load_article_seconds(summaries: List[dict]) -> Optional[float]:
+    """Mean seconds one browser spends per article over recorded days"""
+    count, seconds = 0, 0.0
+    for summary in summaries:
+        stats = summary["phases"].get(TOTAL_PHASE)
+        if stats:
+            count += stats["count"]
+            seconds += stats["sum"]
+    return seconds / count if count else None
+
+
+def load_startup_seconds(
+    startup_path: str = STARTUP_LOG_PATH, bundle: bool = None
+) -> Optional[float]:
+    """Median recorded seconds from instance insert to ready"""
+    if not os.path.exists(startup_path):
+        return None
+
+    with open(startup_path) as f:
+        records = [json.loads(line) for line in f]
+    if bundle is not None:
+        records = [r for r in records if r["bundle"] == bundle]
+    if not records:
+        return None
+    return float(np.median([r["ready_seconds"] for r in records]))
+
+
+def measured_inputs(
+    planner_config: dict,
+    bundle: bool,
+    default_startup_seconds: float,
+    results: ObjectStore = None,
+) -> Dict[str, float]:
+    """
+    Per-article and startup seconds from telemetry, falling back to the
+    ledger's wall-clock rate and then to configured estimates
+    """
+    article_seconds = load_article_seconds(load_summaries(results))
+    source = "daily summaries"
+    if article_seconds is None and os.path.exists(LEDGER_PATH):
+        ledger = ArticleLedger()
+        # Wall-clock per article of past runs, i.e. already shared by browsers
+        wall_seconds = ledger.seconds_per_article()
+        ledger.close()
+        if wall_seconds is not None:
+            article_seconds = wall_seconds * planner_config["recorded_concurrency"]
+            source = "ledger"
+    if article_seconds is None:
+        article_seconds = planner_config["seconds_per_article"]
+        source = "config"
+
+    startup_seconds = load_startup_seconds(bundle=bundle)
+    startup_source = "startup log"
+    if startup_seconds is None:
+        startup_seconds = default_startup_seconds
+        startup_source = "config"
+
+    log.info(
+        f"{article_seconds:.2f}s per article per browser ({source}), "
+        f"{startup_seconds:.0f}s startup ({startup_source})"
+    )
+    return {"article_seconds": article_seconds, "startup_seconds": startup_seconds}
+
+
+def predict(
+    day_articles: np.ndarray,
+    instances: np.ndarray,
+    machine_types: Dict[str, dict],
+    concurrency: np.ndarray,
+    article_seconds: float,
+    startup_seconds: float,
+    supervisor_config: dict,
+    day_concurrency: int,
+) -> Dict[str, np.ndarray]:
+    """
+    Predictions over a grid shaped (instances, machine types, concurrency).
+
+    A VM's throughput is its browsers over per-article seconds, with browsers
+    beyond browsers_per_core times its vCPUs adding nothing. Each day is
+    scraped by one process of day_concurrency browsers (n_workers), so the
+    largest day bounds how fast any split can finish. Candidates whose
+    browsers and processes do not fit in memory are marked infeasible.
+    """
+    n = instances.astype(float)[:, None, None]
+    c = concurrency.astype(float)[None, None, :]
+    machines = list(machine_types.values())
+    vcpus = np.array([m["vcpus"] for m in machines], dtype=float)[None, :, None]
+    memory_mb = np.array([m["memory_gb"] * 1024 for m in machines])[None, :, None]
+    price = np.array([m["price_per_hour"] for m in machines])[None, :, None]
+    spot_price = np.array([m["spot_price_per_hour"] for m in machines])[None, :, None]
+
+    total_articles = day_articles.sum()
+    n_days = len(day_articles)
+    effective = np.minimum(c, vcpus * supervisor_config["browsers_per_core"])
+    vm_rate = effective / article_seconds
+    day_rate = np.minimum(effective, day_concurrency) / article_seconds
+
+    # More instances than days leaves the rest idle
+    n_working = np.minimum(n, n_days)
+    work_seconds = np.maximum(
+        total_articles / (n_working * vm_rate), day_articles.max() / day_rate
+    )
+    wall_seconds = startup_seconds + work_seconds
+    vm_hours = (n_working * startup_seconds + total_articles / vm_rate) / 3600
+
+    # The supervisor runs a process per day_concurrency browsers, each with
+    # its own overhead
+    n_processes = np.ceil(c / max(day_concurrency, 1))
+    needed_mb = (
+        c * supervisor_config["browser_mb"]
+        + n_processes * supervisor_config["process_mb"]
+        + supervisor_config["reserve_mb"]
+    )
+    shape = np.broadcast(n, vcpus, c).shape
+    return {
+        "instances": np.broadcast_to(n, shape),
+        "machine": np.broadcast_to(np.arange(len(machines))[None, :, None], shape),
+        "concurrency": np.broadcast_to(c, shape),
+        "wall_hours": np.broadcast_to(wall_seconds / 3600, shape),
+        "vm_hours": np.broadcast_to(vm_hours, shape),
+        "cost": np.broadcast_to(vm_hours * price, shape),
+        "spot_cost": np.broadcast_to(vm_hours * spot_price, shape),
+        "feasible": np.broadcast_to(needed_mb <= memory_mb, shape),
+    }
+
+
+def select(
+    predictions: Dict[str, np.ndarray], deadline_hours: float = None, top: int = 10
+) -> np.ndarray:
+    """
+    Flat indices of the candidates worth showing: the cheapest meeting the
+    deadline, or without one every candidate no other beats on both time
+    and cost
+    """
+    flat = {key: values.ravel() for key, values in predictions.items()}
+    candidates = np.flatnonzero(flat["feasible"])
+    if deadline_hours is not None:
+        candidates = candidates[flat["wall_hours"][candidates] <= deadline_hours]
+        order = np.lexsort((flat["wall_hours"][candidates], flat["cost"][candidates]))
+        return candidates[order][:top]
+
+    candidates = candidates[
+        np.lexsort((flat["cost"][candidates], flat["wall_hours"][candidates]))
+    ]
+    costs = flat["cost"][candidates]
+    cheaper = costs < np.minimum.accumulate(np.concatenate(([np.inf], costs[:-1])))
+    return candidates[cheaper]
+
+
+def plan_capacity(
+    dates: List[date],
+    planner_config: dict,
+    scraper_config: dict,
+    default_startup_seconds: float,
+    bundle: bool = False,
+    deadline_hours: float = None,
+    results: ObjectStore = None,
+) -> Dict[str, np.ndarray]:
+    """Log predictions for a date range and return the full grid"""
+    counts = get_article_counts(
+        dates, planner_config["default_articles"], scraper_config["sitemaps"]
+    )
+    day_articles = np.array([counts[d] for d in dates])
+    inputs = measured_inputs(
+        planner_config, bundle, default_startup_seconds, results
+    )
+    machine_types = planner_config["machine_types"]
+    predictions = predict(
+        day_articles,
+        instances=np.array(planner_config["candidates"]["instances"]),
+        machine_types=machine_types,
+        concurrency=np.array(planner_config["candidates"]["concurrency"]),
+        supervisor_config=scraper_config["supervisor"],
+        day_concurrency=scraper_config["n_workers"],
+        **inputs,
+    )
+
+    selected = select(predictions, deadline_hours)
+    log.info(
+        f"{len(dates)} days, {day_articles.sum()} articles - "
+        f"{predictions['feasible'].sum()} feasible of {predictions['feasible'].size}"
+    )
+    if not len(selected):
+        if deadline_hours is None:
+            log.warning("No candidate fits its browsers in memory")
+        else:
+            log.warning(f"No candidate finishes within {deadline_hours}h")
+        return predictions
+
+    names = list(machine_types)
+    flat = {key: values.ravel() for key, values in predictions.items()}
+    log.info("instances  machine          browsers  wall h   VM-hours  cost     spot")
+    for i in selected:
+        log.info(
+            f"{flat['instances'][i]:<10.0f} {names[flat['machine'][i]]:<16} "
+            f"{flat['concurrency'][i]:<9.0f} {flat['wall_hours'][i]:<8.1f} "
+            f"{flat['vm_hours'][i]:<9.1f} {flat['cost'][i]:<8.2f} "
+            f"{flat['spot_cost'][i]:.2f}"
+        )
+    return predictions
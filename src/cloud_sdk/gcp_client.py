@@ -1,8 +1,13 @@
+import asyncio
 import inspect
+import json
+import os
+import re
 import secrets
 import string
-from time import sleep
-from typing import List
+from datetime import datetime
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
 
 from google.api_core.exceptions import NotFound
 from google.cloud import compute_v1
@@ -12,6 +17,7 @@ from googleapiclient.errors import HttpError
 
 import src.utils.logger as logs
 from src.configs.config import load_config
+from src.webscraper.metrics import METRICS_DIR
 
 log = logs.CustomLogger(__name__)
 
@@ -22,8 +28,19 @@ def generate_id(n):
     return unique_id
 
 
+BATCH_SIZE = 100
+READY_MESSAGE = "Setup complete"
+# Most of an unfinished serial output line carried over to the next read
+MAX_TAIL_CHARS = 1000
+PHASE_PATTERN = re.compile(r"Startup (?:phase (\w+)|(total)): ([\d.]+)s")
+FAST_STARTUP_SCRIPT = "cloud_sdk/startup_script_fast.sh"
+STARTUP_LOG_PATH = os.path.join(METRICS_DIR, "startup.jsonl")
+# Instance states from which a preempted spot VM never comes back by itself
+STOPPED_STATUSES = ("STOPPING", "TERMINATED", "SUSPENDING", "SUSPENDED")
+
+
 class GCPClient:
-    def __init__(self, config):
+    def __init__(self, config, client=None):
         self.project_config = config["project"]
         self.instance_config = config["vm_instances"]
         self.network_config = config["vpc_network"]
@@ -32,52 +49,196 @@ class GCPClient:
         self.region = self.project_config["region"]
         self.zone = self.project_config["zone"]
         self.startup_timeout = self.project_config["startup_timeout"]
-
-        self.credentials = service_account.Credentials.from_service_account_file(
-            self.instance_config["service_account_credentials"],
-            scopes=["https://www.googleapis.com/auth/cloud-platform"],
-        )
-        self.client = build(
-            self.instance_config["service"], "v1", credentials=self.credentials
+        self.poll_interval = self.project_config["poll_interval"]
+        self.max_poll_interval = self.project_config["max_poll_interval"]
+        self.bundle_url = self.instance_config.get("bundle_url") or ""
+        self.spot = self.instance_config.get("spot", False)
+        self.spot_termination_action = self.instance_config.get(
+            "spot_termination_action", "DELETE"
         )
+        self.startup_phases: Dict[str, Dict[str, float]] = {}
+
+        # A prebuilt client (e.g. a local fake compute API) skips credentials
+        self.credentials = None
+        self.client = client
+        if client is None:
+            self.credentials = service_account.Credentials.from_service_account_file(
+                self.instance_config["service_account_credentials"],
+                scopes=["https://www.googleapis.com/auth/cloud-platform"],
+            )
+            self.client = build(
+                self.instance_config["service"], "v1", credentials=self.credentials
+            )
 
     def __repr__(self):
         return f"{__class__.__name__}({self.project_name}, {self.zone})"
 
-    def run(self, num_instances: int, scripts: List[str]) -> None:
-        for i in range(num_instances):
-            instance_template = self.load_instance_template(script=scripts[i])
-            self.create_vm_instance(instance_template)
-
-    def await_startup_script_execution(self, instance):
-        """Ensures all libraries are installed before using VM"""
-        request = self.client.instances().getSerialPortOutput(
-            project=self.project_id,
-            zone=self.zone,
-            instance=instance["id"],
-        )
-        response = self.execute_request(request)
-        console_output = response.get("contents", "")
-        t = 0
-        while (
-            "Setup complete" not in console_output and instance["status"] != "RUNNING"
-        ):
-            sleep(2)
-            if t > self.startup_timeout:
-                error_msg = f"Startup script exceeded timeout limit ({self.startup_timeout}s) for instance {instance}"
+    def run(self, num_instances: int, scripts: List[str]) -> Dict[str, float]:
+        """Create all instances at once and wait until every one is ready"""
+        launched = self.launch(scripts[:num_instances])
+        operations = {name: op for name, op in launched if op is not None}
+        return asyncio.run(self.await_instances_ready(operations))
+
+    def launch(self, scripts: List[str]) -> List[Tuple[str, Optional[dict]]]:
+        """
+        Submit one instance per script without waiting for them. Returns the
+        instance name and insert operation (None if it failed) of each script.
+        """
+        instance_templates = [self.load_instance_template(script) for script in scripts]
+        operations = self.create_vm_instances(instance_templates)
+        return [
+            (template["name"], operations.get(template["name"]))
+            for template in instance_templates
+        ]
+
+    def execute_batch(self, requests: Dict[str, object]) -> Tuple[dict, dict]:
+        """Execute requests in as few HTTP round trips as possible"""
+        responses, errors = {}, {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                responses[request_id] = response
+
+        items = list(requests.items())
+        for i in range(0, len(items), BATCH_SIZE):
+            batch = self.client.new_batch_http_request(callback=callback)
+            for request_id, request in items[i : i + BATCH_SIZE]:
+                batch.add(request, request_id=request_id)
+            batch.execute()
+
+        return responses, errors
+
+    def create_vm_instances(self, instance_templates: List[dict]) -> Dict[str, dict]:
+        """Submit every instance insert together, returning operations by name"""
+        requests = {
+            template["name"]: self.client.instances().insert(
+                project=self.project_id, zone=self.zone, body=template
+            )
+            for template in instance_templates
+        }
+        operations, errors = self.execute_batch(requests)
+        for name, error in errors.items():
+            log.warning(f"create_vm_instances request failed for {name} - {error}")
+
+        log.info(f"Submitted {len(operations)}/{len(requests)} instance inserts")
+        return operations
+
+    async def await_instances_ready(
+        self, operations: Dict[str, dict]
+    ) -> Dict[str, float]:
+        """
+        Track every instance together: first its insert operation, then its
+        serial port output until the startup script reports completion. Polls
+        back off while nothing changes. An instance whose requests fail is
+        dropped as failed. Returns seconds to ready per instance, which are
+        also recorded if the wait times out.
+        """
+        loop = asyncio.get_event_loop()
+        start = monotonic()
+        pending_ops = dict(operations)
+        booting = {}
+        ready = {}
+        delay = self.poll_interval
+
+        while pending_ops or booting:
+            if monotonic() - start > self.startup_timeout:
+                waiting = sorted(list(pending_ops) + list(booting))
+                error_msg = (
+                    f"Startup script exceeded timeout limit ({self.startup_timeout}s) "
+                    f"for instances {waiting}"
+                )
                 log.warning(error_msg)
+                if ready:
+                    self.record_startup(ready)
                 raise TimeoutError(error_msg)
 
-        log.info(f"Startup script correctly for instance {instance}")
+            await asyncio.sleep(delay)
+            requests = {
+                f"op:{name}": self.client.zoneOperations().get(
+                    project=self.project_id, zone=self.zone, operation=op["name"]
+                )
+                for name, op in pending_ops.items()
+            }
+            for name, (offset, _) in booting.items():
+                request = self.client.instances().getSerialPortOutput(
+                    project=self.project_id, zone=self.zone, instance=name, start=offset
+                )
+                requests[f"serial:{name}"] = request
+            responses, errors = await loop.run_in_executor(
+                None, self.execute_batch, requests
+            )
 
-    def create_vm_instance(self, instance_template) -> None:
-        """Create a VM instance"""
-        request = self.client.instances().insert(
-            project=self.project_id,
-            zone=self.zone,
-            body=instance_template,
-        )
-        self.execute_request(request, operation=True)
+            progressed = False
+            for request_id, error in errors.items():
+                kind, name = request_id.split(":", 1)
+                log.warning(f"Instance {name} failed - {kind} request error: {error}")
+                pending_ops.pop(name, None)
+                booting.pop(name, None)
+                progressed = True
+
+            for request_id, response in responses.items():
+                kind, name = request_id.split(":", 1)
+                if kind == "op":
+                    if response.get("status") != "DONE":
+                        continue
+                    progressed = True
+                    pending_ops.pop(name)
+                    if "error" in response:
+                        log.warning(f"Instance {name} failed - {response['error']}")
+                    else:
+                        booting[name] = (0, "")
+                    continue
+
+                offset, tail = booting[name]
+                contents = tail + response.get("contents", "")
+                next_offset = int(response.get("next", offset))
+                if next_offset != offset:
+                    progressed = True
+                phases = self.startup_phases.setdefault(name, {})
+                for phase, total, seconds in PHASE_PATTERN.findall(contents):
+                    phases[phase or total] = float(seconds)
+                if READY_MESSAGE in contents:
+                    booting.pop(name)
+                    ready[name] = monotonic() - start
+                    log.info(f"Startup script complete for {name} ({ready[name]:.0f}s)")
+                    log.info(f"Startup phases for {name}: {phases}")
+                else:
+                    # Keep the unfinished last line, which the next read completes
+                    tail = contents[contents.rfind("\n") + 1 :][-MAX_TAIL_CHARS:]
+                    booting[name] = (next_offset, tail)
+
+            if progressed:
+                delay = self.poll_interval
+            else:
+                delay = min(delay * 2, self.max_poll_interval)
+
+        if ready:
+            log.info(
+                f"{len(ready)}/{len(operations)} instances ready - "
+                f"slowest {max(ready.values()):.0f}s"
+            )
+            self.record_startup(ready)
+        return ready
+
+    def record_startup(self, ready: Dict[str, float]) -> None:
+        """Append startup times, which the capacity planner reads back"""
+        machine_type = load_config(self.instance_config["instance_template"])[
+            "machineType"
+        ].rsplit("/", 1)[-1]
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(STARTUP_LOG_PATH, "a") as f:
+            for name, seconds in ready.items():
+                record = {
+                    "instance": name,
+                    "created": datetime.utcnow().isoformat(),
+                    "machine_type": machine_type,
+                    "bundle": bool(self.bundle_url),
+                    "ready_seconds": round(seconds, 1),
+                    "phases": self.startup_phases.get(name, {}),
+                }
+                f.write(json.dumps(record) + "\n")
 
     def get_instances(self):
         """Get all VM instances"""
@@ -87,19 +248,30 @@ class GCPClient:
                 project=self.project_id,
                 zone=self.zone,
             )
-            .execute()["items"]
+            .execute()
+            .get("items", [])
         )
 
-    def delete_all_vm_instances(self):
-        """Delete all VM instances"""
-        instances = self.get_instances()
+    def get_instance_statuses(self) -> Dict[str, str]:
+        """Status of every instance by name. Deleted instances are absent."""
+        return {
+            instance["name"]: instance["status"] for instance in self.get_instances()
+        }
 
-        for instance in instances["items"]:
-            instance_name = instance["name"]
-            request = self.client.instances().delete(
-                project=self.project_id, zone=self.zone, instance=instance_name
+    def delete_vm_instances(self, names: List[str]) -> None:
+        requests = {
+            name: self.client.instances().delete(
+                project=self.project_id, zone=self.zone, instance=name
             )
-            self.execute_request(request, operation=True)
+            for name in names
+        }
+        _, errors = self.execute_batch(requests)
+        for name, error in errors.items():
+            log.warning(f"delete_vm_instances request failed for {name} - {error}")
+
+    def delete_all_vm_instances(self):
+        """Delete all VM instances"""
+        self.delete_vm_instances(list(self.get_instance_statuses()))
 
     def load_instance_template(self, script: str) -> dict:
         """Load instance template, add unique name, update metadata startup script"""
@@ -108,10 +280,22 @@ class GCPClient:
         # Add unique id to name
         instance_template["name"] += f"-{generate_id(10)}"
 
-        # Add startup script
+        # Spot VMs cost far less but can be preempted at any time
+        if self.spot:
+            instance_template["scheduling"] = {
+                "provisioningModel": "SPOT",
+                "instanceTerminationAction": self.spot_termination_action,
+                "onHostMaintenance": "TERMINATE",
+                "automaticRestart": False,
+            }
+
+        # Add startup script, unpacking a prebuilt bundle if one is configured
         startup_script_path = instance_template["metadata"]["items"][0]["value"]
+        if self.bundle_url:
+            startup_script_path = FAST_STARTUP_SCRIPT
         with open(startup_script_path, "r") as f:
             startup_script = f.read()
+            startup_script = startup_script.replace("__BUNDLE_URL__", self.bundle_url)
             startup_script += f"\n{script}"
             instance_template["metadata"]["items"][0]["value"] = startup_script
 
@@ -0,0 +1,88 @@
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import List
+
+from google.cloud import storage
+
+
+class ObjectStore(ABC):
+    """Minimal flat key/file store"""
+
+    @abstractmethod
+    def put_file(self, local_path: str, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def get_file(self, key: str, local_path: str) -> None:
+        pass
+
+    @abstractmethod
+    def list(self, prefix: str = "") -> List[str]:
+        """Keys under prefix, sorted"""
+
+
+class LocalObjectStore(ObjectStore):
+    """Local directory stand-in for a bucket"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.root})"
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put_file(self, local_path: str, key: str) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        shutil.copyfile(local_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def get_file(self, key: str, local_path: str) -> None:
+        shutil.copyfile(self.path(key), local_path)
+
+    def list(self, prefix: str = "") -> List[str]:
+        keys = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                rel_path = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                key = rel_path.replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+
+class GCSObjectStore(ObjectStore):
+    def __init__(self, bucket: str, prefix: str = ""):
+        self.bucket_name = bucket
+        self.prefix = f"{prefix.strip('/')}/" if prefix.strip("/") else ""
+        self.bucket = storage.Client().bucket(bucket)
+
+    def __repr__(self):
+        return f"{__class__.__name__}(gs://{self.bucket_name}/{self.prefix})"
+
+    def put_file(self, local_path: str, key: str) -> None:
+        self.bucket.blob(self.prefix + key).upload_from_filename(local_path)
+
+    def get_file(self, key: str, local_path: str) -> None:
+        self.bucket.blob(self.prefix + key).download_to_filename(local_path)
+
+    def list(self, prefix: str = "") -> List[str]:
+        blobs = self.bucket.list_blobs(prefix=self.prefix + prefix)
+        return sorted(blob.name[len(self.prefix) :] for blob in blobs)
+
+
+def connect_object_store(uri: str) -> ObjectStore:
+    """Open store from a 'gs://bucket/prefix' or 'file:///path' uri"""
+    scheme, sep, location = uri.partition("://")
+    if scheme == "gs" and sep:
+        bucket, _, prefix = location.partition("/")
+        return GCSObjectStore(bucket, prefix)
+    if scheme == "file" and sep:
+        return LocalObjectStore(location)
+    raise ValueError(f"Unsupported object store uri: {uri}")
@@ -0,0 +1,53 @@
+import os
+import signal
+import threading
+import urllib.request
+
+import src.utils.logger as logs
+
+log = logs.CustomLogger(__name__)
+
+"""
+Spot VMs get about 30s notice before they are stopped. The guest OS shutdown
+already sends SIGTERM to every process, and the metadata server flips
+instance/preempted at the same moment, so watching it as well covers a
+process that misses the signal. Either way the scraper sees one SIGTERM,
+which is also how preemption is simulated locally:
+
+kill -TERM <supervisor pid>
+"""
+
+PREEMPTED_URL = (
+    "http://metadata.google.internal/computeMetadata/v1/instance/preempted"
+    "?wait_for_change=true"
+)
+METADATA_HEADERS = {"Metadata-Flavor": "Google"}
+
+
+def wait_for_preemption() -> bool:
+    """Block until the metadata server reports this instance preempted"""
+    request = urllib.request.Request(PREEMPTED_URL, headers=METADATA_HEADERS)
+    while True:
+        with urllib.request.urlopen(request) as response:
+            if response.read().decode().strip() == "TRUE":
+                return True
+
+
+def watch_preemption() -> threading.Thread:
+    """
+    Send SIGTERM to this process once the instance is preempted. Off GCE the
+    metadata server is unreachable and the watcher stops straight away.
+    """
+
+    def watch() -> None:
+        try:
+            wait_for_preemption()
+        except OSError as e:
+            log.debug(f"Not watching for preemption, no metadata server ({e})")
+            return
+        log.warning("Instance preempted")
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
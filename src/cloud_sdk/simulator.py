@@ -0,0 +1,255 @@
+import argparse
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import src.utils.logger as logs
+from src.cloud_sdk.autoscaler import FleetController
+from src.cloud_sdk.object_store import LocalObjectStore, ObjectStore
+from src.configs.config import load_config
+from src.webscraper.collect import partition_key, publish_status
+from src.webscraper.partition import plan_date_groups
+
+log = logs.CustomLogger(__name__)
+
+"""
+Run the fleet controller against simulated instances and workers in
+simulated time, to check scaling decisions without touching GCP:
+
+python -m src.cloud_sdk.simulator --days 90 --deadline-hours 24 --budget 10
+    --articles-per-second 0.25 --preemptions-per-hour 0.05
+
+Simulated workers publish partitions and status reports to a real local
+results store, so the controller reads them exactly as it would on GCP.
+"""
+
+STEP_SECONDS = 10
+STATUS_SECONDS = 60
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+        self.compute: Optional["SimulatedCompute"] = None
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """Advance time, stepping every simulated instance along the way"""
+        end = self.now + seconds
+        while self.now < end:
+            step = min(STEP_SECONDS, end - self.now)
+            self.now += step
+            self.compute.step(step)
+
+
+class SimulatedWorker:
+    """One instance's scraper, working through its dates in order"""
+
+    def __init__(self, worker_id: str, dates: List[date], articles_per_second: float):
+        self.worker_id = worker_id
+        self.dates = list(dates)
+        self.articles_per_second = articles_per_second
+        self.started_at: Optional[float] = None
+        self.articles = 0.0
+        self.reported_at = 0.0
+
+    def step(self, compute: "SimulatedCompute", seconds: float) -> bool:
+        """Scrape for seconds, returning False once every date is published"""
+        budget = self.articles_per_second * seconds
+        while self.dates and budget > 0:
+            date_ = self.dates[0]
+            if date_ in compute.published:
+                self.dates.pop(0)
+                continue
+            # Progress on a date survives preemption, as real workers save it
+            left = compute.date_articles[date_] - compute.progress.get(date_, 0)
+            done = min(left, budget)
+            compute.progress[date_] = compute.progress.get(date_, 0) + done
+            self.articles += done
+            budget -= done
+            if done == left:
+                compute.publish(self.worker_id, date_)
+                self.dates.pop(0)
+
+        if compute.clock.now - self.reported_at >= STATUS_SECONDS:
+            self.report(compute)
+        return bool(self.dates)
+
+    def report(self, compute: "SimulatedCompute") -> None:
+        self.reported_at = compute.clock.now
+        status = {
+            "worker_id": self.worker_id,
+            "started_at": self.started_at,
+            "updated_at": compute.clock.now,
+            "articles": int(self.articles),
+        }
+        publish_status(compute.results, self.worker_id, status)
+
+
+class SimulatedCompute:
+    """
+    Stand-in for GCPClient: instances boot after startup_seconds, then run a
+    simulated worker at a jittered throughput. Spot instances are preempted
+    at random and disappear, as with the DELETE termination action.
+    """
+
+    def __init__(
+        self,
+        results: ObjectStore,
+        date_articles: Dict[date, int],
+        clock: SimulatedClock,
+        startup_seconds: float,
+        articles_per_second: float,
+        preemptions_per_hour: float = 0,
+        seed: int = 0,
+    ):
+        self.results = results
+        self.date_articles = date_articles
+        self.clock = clock
+        clock.compute = self
+        self.startup_seconds = startup_seconds
+        self.articles_per_second = articles_per_second
+        self.preemptions_per_hour = preemptions_per_hour
+        self.random = random.Random(seed)
+        self.statuses: Dict[str, str] = {}
+        self.boot_at: Dict[str, float] = {}
+        self.workers: Dict[str, SimulatedWorker] = {}
+        self.published = set()
+        self.progress: Dict[date, float] = {}
+        self.startups: Dict[str, float] = {}
+        self.n_launched = 0
+        self.n_preempted = 0
+
+    def launch(self, scripts: List[str]) -> List[Tuple[str, Optional[dict]]]:
+        launched = []
+        for script in scripts:
+            self.n_launched += 1
+            name = f"sim-{self.n_launched}"
+            dates = [date.fromisoformat(d) for d in script.split(",")]
+            rate = self.articles_per_second * self.random.uniform(0.8, 1.2)
+            self.workers[name] = SimulatedWorker(f"{name}-1-p0", dates, rate)
+            self.statuses[name] = "PROVISIONING"
+            self.boot_at[name] = self.clock.now + self.startup_seconds
+            launched.append((name, {"name": f"operation-{name}"}))
+        return launched
+
+    def get_instance_statuses(self) -> Dict[str, str]:
+        return dict(self.statuses)
+
+    def delete_vm_instances(self, names: List[str]) -> None:
+        for name in names:
+            self.statuses.pop(name, None)
+            self.workers.pop(name, None)
+
+    def record_startup(self, ready: Dict[str, float]) -> None:
+        self.startups.update(ready)
+
+    def publish(self, worker_id: str, date_: date) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            local_path = os.path.join(tmp, "partition.parquet")
+            open(local_path, "w").close()
+            self.results.put_file(local_path, partition_key(worker_id, date_))
+        self.published.add(date_)
+
+    def step(self, seconds: float) -> None:
+        preempt_chance = self.preemptions_per_hour * seconds / 3600
+        for name in list(self.workers):
+            if self.random.random() < preempt_chance:
+                self.n_preempted += 1
+                self.delete_vm_instances([name])
+                continue
+            if self.clock.now < self.boot_at[name]:
+                continue
+
+            worker = self.workers[name]
+            if self.statuses[name] == "PROVISIONING":
+                self.statuses[name] = "RUNNING"
+                worker.started_at = self.clock.now
+            if not worker.step(self, seconds):
+                # Finished instances idle, still billed, until deleted
+                self.workers.pop(name)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--articles-per-day", type=int, default=1750)
+    parser.add_argument("--deadline-hours", type=float, required=False)
+    parser.add_argument("--budget", type=float, required=False)
+    parser.add_argument("--instances", type=int, default=1)
+    parser.add_argument(
+        "--articles-per-second",
+        type=float,
+        required=False,
+        help="True per-instance throughput, default the controller's estimate",
+    )
+    parser.add_argument("--preemptions-per-hour", type=float, default=0)
+    parser.add_argument("--spot", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def simulate(args: argparse.Namespace) -> dict:
+    config = load_config("cloud_sdk/cloud_config.yaml")
+    coordinator_config = config["coordinator"]
+    rng = random.Random(args.seed)
+    start_date = date(2023, 1, 1)
+    dates = [start_date + timedelta(days=i) for i in range(args.days)]
+    date_articles = {
+        d: int(args.articles_per_day * rng.uniform(0.7, 1.3)) for d in dates
+    }
+
+    clock = SimulatedClock()
+    with tempfile.TemporaryDirectory() as tmp:
+        results = LocalObjectStore(tmp)
+        compute = SimulatedCompute(
+            results,
+            date_articles,
+            clock,
+            startup_seconds=coordinator_config["startup_seconds"],
+            articles_per_second=(
+                args.articles_per_second or coordinator_config["articles_per_second"]
+            ),
+            preemptions_per_hour=args.preemptions_per_hour,
+            seed=args.seed,
+        )
+        price_key = "spot_price_per_hour" if args.spot else "price_per_hour"
+        controller = FleetController(
+            compute,
+            results,
+            make_script=lambda group: ",".join(d.isoformat() for d in group),
+            date_articles=date_articles,
+            config=coordinator_config,
+            price_per_hour=coordinator_config[price_key],
+            deadline=args.deadline_hours * 3600 if args.deadline_hours else None,
+            budget=args.budget,
+            clock=clock.time,
+            sleep=clock.sleep,
+        )
+        n_instances = controller.initial_instances(args.instances)
+        costs = {d: float(n) for d, n in date_articles.items()}
+        controller.launch(
+            plan_date_groups(dates, costs, n_groups=n_instances, contiguous=True)
+        )
+        cost, dropped = controller.run()
+
+    result = {
+        "hours": round(clock.now / 3600, 2),
+        "cost": round(cost, 2),
+        "instances_launched": compute.n_launched,
+        "preempted": compute.n_preempted,
+        "dates_published": len(compute.published),
+        "dates_dropped": len(dropped),
+    }
+    if args.deadline_hours:
+        result["deadline_met"] = clock.now <= args.deadline_hours * 3600
+    log.info(f"Simulation finished - {result}")
+    return result
+
+
+if __name__ == "__main__":
+    simulate(parse_args())
@@ -1,5 +1,17 @@
 #!/bin/bash
 
+STARTUP_START=$(date +%s.%N)
+PHASE_START=$STARTUP_START
+
+# Report time since the previous phase ended on the serial console
+end_phase() {
+  local now
+  now=$(date +%s.%N)
+  awk -v name="$1" -v start="$PHASE_START" -v end="$now" \
+    'BEGIN { printf "Startup phase %s: %.1fs\n", name, end - start }'
+  PHASE_START=$now
+}
+
 # Install base tools
 sudo apt-get update && sudo apt-get upgrade
 sudo apt-get install -y git
@@ -8,9 +20,11 @@ sudo apt-get install wget
 sudo apt-get install unzip
 sudo apt install --fix-broken
 sudo apt-get install python3 build-essential libssl-dev libffi-dev python-dev
+end_phase base_tools
 
 # Set timezone
 sudo timedatectl set-timezone Europe/London
+end_phase timezone
 
 # Install selenium and Chromedriver
 wget https://dl.google.com/linux/direct/google-chrome-stable_current_amd64.deb
@@ -21,21 +35,28 @@ unzip chromedriver_linux64.zip
 sudo mv chromedriver /usr/local/bin/
 sudo chown root:root /usr/local/bin/chromedriver
 sudo chmod +x /usr/local/bin/chromedriver
+end_phase browser
 
 # Clone the repo and install requirements
 mkdir /TopComment
 git clone https://github.com/callumfm/TopComment.git /TopComment
+end_phase code
 cd /TopComment/src || exit
 pip3 install --upgrade pip
 pip3 install -r requirements.txt
+end_phase python
 
 # Set repo privileges
 mv /TopComment /usr/local/
 find /usr/local/TopComment -type d -exec chmod 777 {} \;
 find /usr/local/TopComment -type f -exec chmod 777 {} \;
+end_phase permissions
 
 # Stop cert refreshes
 sudo systemctl disable --now gce-workload-cert-refresh.{service,timer}
 sudo systemctl mask gce-workload-cert-refresh.{service,timer}
+end_phase system
 
+awk -v start="$STARTUP_START" -v end="$(date +%s.%N)" \
+  'BEGIN { printf "Startup total: %.1fs\n", end - start }'
 echo "Setup complete"
@@ -0,0 +1,73 @@
+#!/bin/bash
+
+# Fast-path startup: unpack a bundle built by cloud_sdk/bundle.py instead of
+# installing everything from the network. BUNDLE_URL may be gs://, https:// or
+# file:// so the same script can be timed locally in a container.
+BUNDLE_URL="${BUNDLE_URL:-__BUNDLE_URL__}"
+INSTALL_DIR=/usr/local/TopComment
+WORK_DIR=$(mktemp -d)
+BUNDLE_DIR="$WORK_DIR/topcomment-bundle"
+STARTUP_START=$(date +%s.%N)
+
+# Run a named phase and report its duration on the serial console
+phase() {
+  local name=$1
+  shift
+  local start
+  start=$(date +%s.%N)
+  "$@"
+  local status=$?
+  awk -v name="$name" -v start="$start" -v end="$(date +%s.%N)" \
+    'BEGIN { printf "Startup phase %s: %.1fs\n", name, end - start }'
+  return $status
+}
+
+fetch_bundle() {
+  case "$BUNDLE_URL" in
+    gs://*) gsutil -q cp "$BUNDLE_URL" "$WORK_DIR/bundle.tar.gz" ;;
+    *) curl -fsSL "$BUNDLE_URL" -o "$WORK_DIR/bundle.tar.gz" ;;
+  esac
+}
+
+install_browser() {
+  # apt resolves only Chrome's own runtime dependencies, no upgrade. A fresh
+  # image has no package lists, so they are fetched first
+  sudo apt-get update -q
+  sudo apt-get install -y --no-install-recommends "$BUNDLE_DIR"/browser/google-chrome-stable_*.deb
+  # The base image has no unzip, python3 does the same job
+  python3 -m zipfile -e "$BUNDLE_DIR"/browser/chromedriver_linux64.zip "$WORK_DIR"
+  sudo install -o root -g root -m 0755 "$WORK_DIR/chromedriver" /usr/local/bin/chromedriver
+}
+
+install_python() {
+  local pip_wheel
+  pip_wheel=$(ls "$BUNDLE_DIR"/wheelhouse/pip-*.whl)
+  python3 "$pip_wheel/pip" install --no-index --find-links "$BUNDLE_DIR/wheelhouse" pip
+  python3 -m pip install --no-index --find-links "$BUNDLE_DIR/wheelhouse" \
+    -r "$BUNDLE_DIR/requirements.txt"
+}
+
+install_code() {
+  rm -rf "$INSTALL_DIR"
+  mv "$BUNDLE_DIR/TopComment" "$INSTALL_DIR"
+  chmod -R 777 "$INSTALL_DIR"
+}
+
+configure_system() {
+  sudo timedatectl set-timezone Europe/London
+  sudo systemctl disable --now gce-workload-cert-refresh.{service,timer}
+  sudo systemctl mask gce-workload-cert-refresh.{service,timer}
+}
+
+phase fetch fetch_bundle || exit 1
+phase unpack tar -xzf "$WORK_DIR/bundle.tar.gz" -C "$WORK_DIR" || exit 1
+cat "$BUNDLE_DIR/manifest.json"
+phase browser install_browser || exit 1
+phase python install_python || exit 1
+phase code install_code || exit 1
+phase system configure_system
+rm -rf "$WORK_DIR"
+
+awk -v start="$STARTUP_START" -v end="$(date +%s.%N)" \
+  'BEGIN { printf "Startup total: %.1fs\n", end - start }'
+echo "Setup complete"
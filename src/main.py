@@ -1,57 +1,265 @@
 import argparse
-from datetime import datetime
+import os
+import time
+from datetime import date, datetime
 from typing import List
 
 import numpy as np
 
 import src.utils.logger as logs
+from src import DATA_DIR
+from src.cloud_sdk.autoscaler import FleetController
+from src.cloud_sdk.capacity import load_article_seconds, load_summaries, plan_capacity
 from src.cloud_sdk.gcp_client import GCPClient
+from src.cloud_sdk.object_store import ObjectStore, connect_object_store
 from src.configs.config import load_config
+from src.webscraper.collect import collect_results, published_dates
 from src.webscraper.dates import get_dates
+from src.webscraper.ledger import LEDGER_PATH, ArticleLedger
+from src.webscraper.partition import (
+    get_article_counts,
+    get_date_costs,
+    plan_date_groups,
+)
+from src.webscraper.run import output_path
+from src.webscraper.task_queue import connect_task_queue, task_queue_backend
 
 log = logs.CustomLogger(__name__)
 
 """
-1 VM instance ~= £0.80 per day
-1 article ~= 5 seconds compute time
-1 day ~= 1,750 articles ~= 0.1 days compute time
+Predicted time and cost of a date range on every candidate fleet, from
+measured per-article and instance startup times, with --plan:
 
-3 months articles ~= 9 days compute time (1 instance, £7.20)
-                  ~= 1 day compute time (9 instances, £7.20)
+python main.py --start-date 01/01/2023 --end-date 31/03/2023 --plan
+    --deadline-hours 24
+
+Spot instances cost 60-90% less but can be preempted at any time. With
+--spot, preempted instances are replaced with new ones assigned only the
+dates they had not yet published to the results store.
+
+With --deadline-hours and/or --budget the fleet is sized by a controller
+instead of num_instances, e.g. finish 3 months within a day for under £10:
+
+python main.py --start-date 01/01/2023 --end-date 31/03/2023
+    --deadline-hours 24 --budget 10 --spot
 """
 
 
 def parse_args(argv=None) -> argparse.Namespace:
     """Arguments for root pipeline call"""
     parser = argparse.ArgumentParser()
-    parser.add_argument("--start-date", type=str, required=True)
-    parser.add_argument("--end-date", type=str, required=True)
+    parser.add_argument("--start-date", type=str, required=False)
+    parser.add_argument("--end-date", type=str, required=False)
     parser.add_argument("--n-top-comments", type=int, default=1, required=False)
+    parser.add_argument("--queue", type=str, required=False)
+    parser.add_argument("--results-uri", type=str, required=False)
+    parser.add_argument("--collect", action="store_true")
+    parser.add_argument("--spot", action="store_true")
+    parser.add_argument("--deadline-hours", type=float, required=False)
+    parser.add_argument("--budget", type=float, required=False)
+    parser.add_argument("--plan", action="store_true")
+
+    args = parser.parse_args(argv)
+    if not args.collect and not (args.start_date and args.end_date):
+        parser.error("--start-date and --end-date are required unless --collect")
+    if args.queue and not task_queue_backend(args.queue).shared:
+        parser.error("--queue must be shared by instances, e.g. gs://bucket/queue")
+
+    return args
+
 
-    return parser.parse_args(argv)
+def run_command(scraper_args: str, results_uri: str = None) -> str:
+    """Shell command for an instance to run the scraper with given args"""
+    if results_uri:
+        scraper_args += f" --results-uri {results_uri}"
+    return (
+        "export PYTHONPATH=/usr/local/TopComment\n"
+        + "cd /usr/local/TopComment/src\n"
+        + f"python3 webscraper/supervisor.py {scraper_args}"
+    )
 
 
-def create_instance_scripts(
-    n_instances: int, start_date: str, end_date: str, n_top_comments: int
+def create_queue_scripts(
+    n_instances: int,
+    start_date: str,
+    end_date: str,
+    n_top_comments: int,
+    queue: str,
+    results_uri: str = None,
 ) -> List[str]:
-    """Create Python scraper script for each instance to run"""
+    """
+    Fill shared task queue with every date in range. Each instance then leases
+    dates until the queue is drained, so no instance idles while work is left.
+    """
     start_date = datetime.strptime(start_date, "%d/%m/%Y").date()
     end_date = datetime.strptime(end_date, "%d/%m/%Y").date()
     dates = get_dates(start_date=start_date, end_date=end_date)
-    date_groups = [dates] if len(dates) < n_instances * 2 else np.array_split(dates, n_instances)
-
-    scripts = []
-    for dates_seg in date_groups:
-        start_date = datetime.strftime(dates_seg[0], "%d/%m/%Y")
-        end_date = datetime.strftime(dates_seg[-1], "%d/%m/%Y")
-        script = (
-            "export PYTHONPATH=/usr/local/TopComment\n"
-            + "cd /usr/local/TopComment/src\n"
-            + f"python3 webscraper/run.py --start-date {start_date} --end-date {end_date} --n-top-comments {n_top_comments}"
+
+    task_queue = connect_task_queue(queue)
+    task_queue.put([d.isoformat() for d in dates])
+    log.info(f"Task queue {queue} - {task_queue.counts()}")
+    task_queue.close()
+
+    script = run_command(
+        f"--queue {queue} --n-top-comments {n_top_comments}", results_uri
+    )
+    return [script] * n_instances
+
+
+def plan_instance_dates(
+    dates: List[date],
+    n_instances: int,
+    planner_config: dict,
+    results: ObjectStore = None,
+) -> List[List[date]]:
+    """
+    Split dates across instances by calendar days or by expected work. Work
+    is timed from the summaries past instances published to results, else
+    from the ledger of runs on this machine.
+    """
+    strategy = planner_config["strategy"]
+    if strategy == "calendar":
+        if len(dates) < n_instances * 2:
+            return [dates]
+        return [list(group) for group in np.array_split(dates, n_instances)]
+
+    if strategy not in ("contiguous", "packed"):
+        raise ValueError(f"Unknown partition strategy: {strategy}")
+
+    scraper_config = load_config("webscraper/scraper_config.yaml")
+    article_seconds = load_article_seconds(load_summaries(results))
+    ledger = None
+    if article_seconds is None and os.path.exists(LEDGER_PATH):
+        ledger = ArticleLedger()
+    costs = get_date_costs(
+        dates,
+        seconds_per_article=article_seconds or planner_config["seconds_per_article"],
+        default_articles=planner_config["default_articles"],
+        sitemap_config=scraper_config["sitemaps"],
+        ledger=ledger,
+    )
+    if ledger is not None:
+        ledger.close()
+    return plan_date_groups(
+        dates, costs, n_groups=n_instances, contiguous=strategy == "contiguous"
+    )
+
+
+def instance_script(
+    dates: List[date],
+    n_top_comments: int,
+    results_uri: str = None,
+    skip_published: bool = False,
+) -> str:
+    """
+    Scraper script for an instance assigned dates. With skip_published, dates
+    other instances of the fleet already published are copied instead of
+    scraped again. Only a fleet controller sets it, as it tracks its run's
+    dates by what is published to the results store.
+    """
+    start_date = datetime.strftime(dates[0], "%d/%m/%Y")
+    end_date = datetime.strftime(dates[-1], "%d/%m/%Y")
+    if len(dates) == (dates[-1] - dates[0]).days + 1:
+        date_args = f"--start-date {start_date} --end-date {end_date}"
+    else:
+        date_args = "--dates " + ",".join(
+            datetime.strftime(d, "%d/%m/%Y") for d in dates
         )
-        scripts.append(script)
+    if skip_published:
+        date_args += " --skip-published"
+    return run_command(f"{date_args} --n-top-comments {n_top_comments}", results_uri)
 
-    return scripts
+
+def create_instance_dates(
+    n_instances: int,
+    start_date: str,
+    end_date: str,
+    planner_config: dict,
+    results_uri: str = None,
+) -> List[List[date]]:
+    """Dates for each instance to scrape"""
+    start_date = datetime.strptime(start_date, "%d/%m/%Y").date()
+    end_date = datetime.strptime(end_date, "%d/%m/%Y").date()
+    dates = get_dates(start_date=start_date, end_date=end_date)
+    results = connect_object_store(results_uri) if results_uri else None
+    return plan_instance_dates(dates, n_instances, planner_config, results)
+
+
+def run_fleet(
+    client: GCPClient,
+    config: dict,
+    args: argparse.Namespace,
+    results_uri: str,
+    spot: bool,
+) -> None:
+    """
+    Launch instances and keep them under a fleet controller until every date
+    is published. With a deadline the fleet starts at the size the configured
+    throughput estimate needs, and grows if measured throughput falls short.
+    """
+    coordinator_config = config["coordinator"]
+    start_date = datetime.strptime(args.start_date, "%d/%m/%Y").date()
+    end_date = datetime.strptime(args.end_date, "%d/%m/%Y").date()
+    dates = get_dates(start_date=start_date, end_date=end_date)
+    scraper_config = load_config("webscraper/scraper_config.yaml")
+    date_articles = get_article_counts(
+        dates,
+        default_articles=config["planner"]["default_articles"],
+        sitemap_config=scraper_config["sitemaps"],
+    )
+
+    deadline = None
+    if args.deadline_hours is not None:
+        deadline = time.time() + args.deadline_hours * 3600
+    price_key = "spot_price_per_hour" if spot else "price_per_hour"
+    results = connect_object_store(results_uri)
+    controller = FleetController(
+        client,
+        results=results,
+        make_script=lambda group: instance_script(
+            group, args.n_top_comments, results_uri, skip_published=True
+        ),
+        date_articles=date_articles,
+        config=coordinator_config,
+        price_per_hour=coordinator_config[price_key],
+        deadline=deadline,
+        budget=args.budget,
+    )
+
+    n_instances = controller.initial_instances(config["vm_instances"]["num_instances"])
+    log.info(f"Starting fleet of {n_instances} instances")
+    controller.launch(
+        plan_instance_dates(dates, n_instances, config["planner"], results)
+    )
+    controller.run()
+
+
+def plan(config: dict, args: argparse.Namespace, results_uri: str = None) -> None:
+    """Log predicted time and cost of the date range for candidate fleets"""
+    start_date = datetime.strptime(args.start_date, "%d/%m/%Y").date()
+    end_date = datetime.strptime(args.end_date, "%d/%m/%Y").date()
+    plan_capacity(
+        get_dates(start_date=start_date, end_date=end_date),
+        planner_config=config["planner"],
+        scraper_config=load_config("webscraper/scraper_config.yaml"),
+        default_startup_seconds=config["coordinator"]["startup_seconds"],
+        bundle=bool(config["vm_instances"]["bundle_url"]),
+        deadline_hours=args.deadline_hours,
+        results=connect_object_store(results_uri) if results_uri else None,
+    )
+
+
+def collect(results_uri: str) -> None:
+    """Merge every published partition into one output csv for their dates"""
+    if not results_uri:
+        raise ValueError("No results uri to collect from")
+    object_store = connect_object_store(results_uri)
+    dates = sorted(published_dates(object_store))
+    if not dates:
+        log.warning(f"No partitions published to {object_store} - Nothing to collect")
+        return
+    os.makedirs(DATA_DIR, exist_ok=True)
+    collect_results(object_store, output_path(dates))
 
 
 def full_pipeline(argv: List = None) -> None:
@@ -62,18 +270,56 @@ def full_pipeline(argv: List = None) -> None:
     args = parse_args(argv)
     config = load_config("cloud_sdk/cloud_config.yaml")
     n_instances = config["vm_instances"]["num_instances"]
+    results_uri = args.results_uri or config["results"]["uri"]
+    spot = args.spot or config["vm_instances"]["spot"]
+    config["vm_instances"]["spot"] = spot
+
+    if args.collect:
+        collect(results_uri)
+        return
+    if args.plan:
+        plan(config, args, results_uri)
+        return
+    controlled = spot or args.deadline_hours is not None or args.budget is not None
+    if controlled and not results_uri:
+        raise ValueError("A controlled fleet needs a results uri to track its dates")
 
     log.info("Starting new pipeline run")
     log.info(f"Date range: {args.start_date} - {args.end_date}")
     log.info(f"Number of instances: {n_instances}")
 
-    scripts = create_instance_scripts(
+    client = GCPClient(config)
+    if args.queue:
+        if controlled:
+            log.warning("Fleet is not controlled in queue mode")
+        scripts = create_queue_scripts(
+            n_instances=n_instances,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            n_top_comments=args.n_top_comments,
+            queue=args.queue,
+            results_uri=results_uri,
+        )
+        client.run(num_instances=len(scripts), scripts=scripts)
+        return
+
+    if controlled:
+        run_fleet(client, config, args, results_uri, spot)
+        collect(results_uri)
+        return
+
+    date_groups = create_instance_dates(
         n_instances=n_instances,
         start_date=args.start_date,
         end_date=args.end_date,
-        n_top_comments=args.n_top_comments,
+        planner_config=config["planner"],
+        results_uri=results_uri,
     )
-    GCPClient(config).run(num_instances=n_instances, scripts=scripts)
+    scripts = [
+        instance_script(dates, args.n_top_comments, results_uri)
+        for dates in date_groups
+    ]
+    client.run(num_instances=len(scripts), scripts=scripts)
 
 
 if __name__ == "__main__":
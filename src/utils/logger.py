@@ -1,14 +1,22 @@
+import atexit
 import datetime
+import json
 import logging
+import os
+import queue
 import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 
 import pytz
 
-PREFIX = None
 LOG_LEVEL = "INFO"
 TIMEZONE = pytz.timezone("Europe/London")
 FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 FORMAT_WITH_PREFIX = "%(asctime)s - %(name)s - %(levelname)s - %(prefix)s - %(message)s"
+# Also write every record as a JSON line to this path, if set
+JSON_LOG_PATH = os.environ.get("TOPCOMMENT_JSON_LOG")
 
 severity = {
     "DEBUG": logging.DEBUG,
@@ -18,22 +26,134 @@ severity = {
     "CRITICAL": logging.CRITICAL,
 }
 
+# Each asyncio task works on its own copy of the context, so concurrent
+# scrapers can each set a prefix without clobbering one another
+_prefix: ContextVar[Optional[str]] = ContextVar("log_prefix", default=None)
+
+
+def set_prefix(prefix: Optional[str]) -> None:
+    """Prefix all records logged from the current task or thread"""
+    _prefix.set(prefix)
+
+
+def get_prefix() -> Optional[str]:
+    return _prefix.get()
+
+
+class LocalTimeCache:
+    """Local time string, recomputed only when the second changes"""
+
+    def __init__(self):
+        self.second = None
+        self.str_time = None
+        self.timezone_name = None
+
+    def __call__(self, created: float, fmt: str) -> str:
+        second = int(created)
+        if second != self.second:
+            local_time = datetime.datetime.fromtimestamp(second, TIMEZONE)
+            self.str_time = local_time.strftime(fmt)
+            self.timezone_name = local_time.tzname()
+            self.second = second
+        return self.str_time
+
 
 class CustomFormatter(logging.Formatter):
+    """Text formatter, built once per handler rather than once per record"""
+
+    def __init__(self):
+        super().__init__(FORMAT)
+        self.prefix_style = logging.PercentStyle(FORMAT_WITH_PREFIX)
+        self.local_time = LocalTimeCache()
+
     def formatTime(self, record, datefmt=None) -> str:
-        utc_time = datetime.datetime.fromtimestamp(record.created)
-        local_time = utc_time.astimezone(TIMEZONE)
-        str_time = local_time.strftime("%Y-%m-%d %H:%M:%S")
-        timezone_name = local_time.tzname()
+        str_time = self.local_time(record.created, "%Y-%m-%d %H:%M:%S")
+        timezone_name = self.local_time.timezone_name
         time_formatted = "%s.%03d %s" % (str_time, record.msecs, timezone_name)
         return time_formatted
 
+    def formatMessage(self, record) -> str:
+        if getattr(record, "prefix", None) is not None:
+            return self.prefix_style.format(record)
+        return self._style.format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for log search and per-article analysis"""
+
+    def __init__(self):
+        super().__init__()
+        self.local_time = LocalTimeCache()
+
     def format(self, record) -> str:
-        if hasattr(record, "prefix"):
-            formatter = logging.Formatter(FORMAT_WITH_PREFIX)
-        else:
-            formatter = logging.Formatter(FORMAT)
-        return formatter.format(record)
+        str_time = self.local_time(record.created, "%Y-%m-%dT%H:%M:%S%z")
+        entry = {
+            "time": str_time,
+            "msecs": int(record.msecs),
+            "logger": record.name,
+            "level": record.levelname,
+            "prefix": getattr(record, "prefix", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue records without formatting them. Message args are merged and
+    exceptions rendered here, as both may not survive the hand-off, while
+    the formatting itself happens on the listener thread.
+    """
+
+    exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_queue = queue.SimpleQueue()
+_queue_handler = DeferredQueueHandler(_queue)
+_listener = None
+
+
+def _get_listener() -> QueueListener:
+    """Start the single background thread writing records for every logger"""
+    global _listener
+    if _listener is None:
+        stdout_handler = logging.StreamHandler(sys.stdout)
+        stdout_handler.setFormatter(CustomFormatter())
+        _listener = QueueListener(_queue, stdout_handler)
+        _listener.start()
+        atexit.register(_stop_listener)
+        if JSON_LOG_PATH:
+            enable_json_lines(JSON_LOG_PATH)
+    return _listener
+
+
+def _stop_listener() -> None:
+    """Flush queued records before the interpreter exits"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def enable_json_lines(path: str) -> None:
+    """Additionally write all records as JSON lines to path"""
+    listener = _get_listener()
+    if any(getattr(h, "baseFilename", None) == path for h in listener.handlers):
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    json_handler = logging.FileHandler(path)
+    json_handler.setFormatter(JsonFormatter())
+    listener.handlers = listener.handlers + (json_handler,)
 
 
 class CustomLogger(logging.Logger):
@@ -46,16 +166,19 @@ class CustomLogger(logging.Logger):
         self.__set_handlers()
 
     def debug(self, msg, *args, prefix: str = None, **kwargs):
-        kwargs = _add_prefix_to_extra(prefix, kwargs)
-        self._log(logging.DEBUG, msg, args, **kwargs)
+        if self.isEnabledFor(logging.DEBUG):
+            kwargs = _add_prefix_to_extra(prefix, kwargs)
+            self._log(logging.DEBUG, msg, args, **kwargs)
 
     def info(self, msg, *args, prefix: str = None, **kwargs):
-        kwargs = _add_prefix_to_extra(prefix, kwargs)
-        self._log(logging.INFO, msg, args, **kwargs)
+        if self.isEnabledFor(logging.INFO):
+            kwargs = _add_prefix_to_extra(prefix, kwargs)
+            self._log(logging.INFO, msg, args, **kwargs)
 
     def warning(self, msg, *args, prefix: str = None, **kwargs):
-        kwargs = _add_prefix_to_extra(prefix, kwargs)
-        self._log(logging.WARNING, msg, args, **kwargs)
+        if self.isEnabledFor(logging.WARNING):
+            kwargs = _add_prefix_to_extra(prefix, kwargs)
+            self._log(logging.WARNING, msg, args, **kwargs)
 
     def error(self, msg, *args, prefix: str = None, **kwargs):
         kwargs = _add_prefix_to_extra(prefix, kwargs)
@@ -76,8 +199,8 @@ class CustomLogger(logging.Logger):
         self._log(logging.CRITICAL, msg, args, **kwargs)
 
     def addHandler(self, handler: logging.Handler) -> None:
-        formatter = CustomFormatter()
-        handler.setFormatter(formatter)
+        if handler is not _queue_handler:
+            handler.setFormatter(CustomFormatter())
 
         if handler.level == logging.NOTSET:
             handler.setLevel(self.level)
@@ -85,12 +208,14 @@ class CustomLogger(logging.Logger):
         super().addHandler(handler)
 
     def __set_handlers(self):
-        stdout_handler = logging.StreamHandler(sys.stdout)
-        stdout_handler.setLevel(self.level)
-        self.addHandler(stdout_handler)
+        # Records are written by the listener thread, never the caller's
+        _get_listener()
+        self.addHandler(_queue_handler)
 
 
 def _add_prefix_to_extra(prefix, kwargs):
+    if prefix is None:
+        prefix = _prefix.get()
     if prefix is None:
         return kwargs
 
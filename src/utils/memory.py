@@ -0,0 +1,71 @@
+import os
+from collections import defaultdict
+from typing import Dict, List
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+MB = 1024 * 1024
+
+
+def process_rss(pid: int) -> int:
+    """Resident set size of a process in bytes, 0 if it has exited"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def child_pids() -> Dict[int, List[int]]:
+    """Map of parent pid to child pids for every running process"""
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Process name may contain spaces, so fields are read after its ')'
+        ppid = int(stat[stat.rfind(")") + 2 :].split()[1])
+        children[ppid].append(int(entry))
+    return children
+
+
+def descendant_pids(pid: int) -> List[int]:
+    children = child_pids()
+    pids, stack = [], list(children[pid])
+    while stack:
+        child = stack.pop()
+        pids.append(child)
+        stack.extend(children[child])
+    return pids
+
+
+def descendants_rss(pid: int = None) -> int:
+    """
+    Combined RSS in bytes of every process started under pid, i.e. the
+    chromedriver and Chrome processes of a scraper. Shared pages are counted
+    once per process, so this is an upper bound.
+    """
+    pid = pid or os.getpid()
+    return sum(process_rss(child) for child in descendant_pids(pid))
+
+
+def available_memory() -> int:
+    """Memory in bytes that new processes can use without swapping"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_PHYS_PAGES") * PAGE_SIZE
+
+
+def cpu_count() -> int:
+    """CPUs this process may run on, which can be fewer than the machine has"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
@@ -0,0 +1,198 @@
+import heapq
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from itertools import groupby
+from typing import Dict, Iterator, List, Set, Tuple
+
+import pyarrow.parquet as pq
+
+from src.cloud_sdk.object_store import ObjectStore
+from src.utils import logger as logs
+from src.webscraper.ledger import ArticleLedger
+from src.webscraper.store import PARTITION_PREFIX, PARTITION_SUFFIX, ResultStore
+
+log = logs.CustomLogger(__name__)
+
+RESULTS_PREFIX = "results/"
+PROGRESS_PREFIX = "progress/"
+STATUS_PREFIX = "status/"
+SUMMARY_PREFIX = "summaries/"
+
+
+def partition_key(worker_id: str, date_: date) -> str:
+    filename = f"{PARTITION_PREFIX}{date_.isoformat()}{PARTITION_SUFFIX}"
+    return f"{RESULTS_PREFIX}{worker_id}/{filename}"
+
+
+def parse_partition_key(key: str) -> Tuple[str, date]:
+    worker_id, filename = key[len(RESULTS_PREFIX) :].rsplit("/", 1)
+    date_str = filename[len(PARTITION_PREFIX) : -len(PARTITION_SUFFIX)]
+    return worker_id, datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
+def publish_partition(
+    store: ResultStore, object_store: ObjectStore, worker_id: str, date_: date
+) -> None:
+    """Upload a finished date partition under the worker's prefix"""
+    key = partition_key(worker_id, date_)
+    object_store.put_file(store.partition_path(date_), key)
+    log.info(f"Partition {date_} published to {object_store}")
+
+
+def published_dates(object_store: ObjectStore) -> Set[date]:
+    """Dates any worker has published a partition for"""
+    return {
+        parse_partition_key(key)[1]
+        for key in object_store.list(RESULTS_PREFIX)
+        if key.endswith(PARTITION_SUFFIX)
+    }
+
+
+def published_partitions(object_store: ObjectStore) -> Dict[date, str]:
+    """Key of one published partition per date, from a single listing"""
+    return dict(merge_partition_keys(object_store))
+
+
+def fetch_partition(
+    store: ResultStore, object_store: ObjectStore, key: str, date_: date
+) -> None:
+    """Copy a partition another worker published into the local store"""
+    os.makedirs(store.root, exist_ok=True)
+    path = store.partition_path(date_)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    object_store.get_file(key, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def put_json(object_store: ObjectStore, key: str, obj: dict) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        local_path = os.path.join(tmp, "object.json")
+        with open(local_path, "w") as f:
+            json.dump(obj, f)
+        object_store.put_file(local_path, key)
+
+
+def read_json(object_store: ObjectStore, prefix: str) -> List[dict]:
+    objects = []
+    with tempfile.TemporaryDirectory() as tmp:
+        local_path = os.path.join(tmp, "object.json")
+        for key in object_store.list(prefix):
+            object_store.get_file(key, local_path)
+            with open(local_path) as f:
+                objects.append(json.load(f))
+    return objects
+
+
+def publish_status(object_store: ObjectStore, worker_id: str, status: dict) -> None:
+    """Overwrite worker's status, read by the fleet controller for throughput"""
+    put_json(object_store, f"{STATUS_PREFIX}{worker_id}.json", status)
+
+
+def read_statuses(object_store: ObjectStore) -> List[dict]:
+    return read_json(object_store, STATUS_PREFIX)
+
+
+def publish_summary(object_store: ObjectStore, worker_id: str, summary: dict) -> None:
+    """
+    Upload a day's metrics summary, which the capacity planner reads back on
+    the coordinator. A revisit of the day overwrites it.
+    """
+    filename = f"{PARTITION_PREFIX}{summary['date']}.json"
+    put_json(object_store, f"{SUMMARY_PREFIX}{worker_id}/{filename}", summary)
+
+
+def read_summaries(object_store: ObjectStore) -> List[dict]:
+    return read_json(object_store, SUMMARY_PREFIX)
+
+
+def progress_prefix(date_: date) -> str:
+    return f"{PROGRESS_PREFIX}{PARTITION_PREFIX}{date_.isoformat()}/"
+
+
+def publish_progress(
+    ledger: ArticleLedger, object_store: ObjectStore, worker_id: str, date_: date
+) -> int:
+    """
+    Upload the articles finished so far on an unfinished date, so whichever
+    machine takes the date over skips them. Returns number of articles.
+    """
+    rows = ledger.export_date(date_)
+    with tempfile.TemporaryDirectory() as tmp:
+        local_path = os.path.join(tmp, "progress.json")
+        with open(local_path, "w") as f:
+            json.dump(rows, f)
+        object_store.put_file(local_path, f"{progress_prefix(date_)}{worker_id}.json")
+    log.info(f"Progress on {date_} ({len(rows)} articles) published to {object_store}")
+    return len(rows)
+
+
+def restore_progress(
+    ledger: ArticleLedger, object_store: ObjectStore, date_: date
+) -> int:
+    """Import progress any worker published for date, returning articles read"""
+    n_rows = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        local_path = os.path.join(tmp, "progress.json")
+        for key in object_store.list(progress_prefix(date_)):
+            object_store.get_file(key, local_path)
+            with open(local_path) as f:
+                rows = json.load(f)
+            ledger.import_rows(rows)
+            n_rows += len(rows)
+
+    if n_rows:
+        log.info(f"Restored {n_rows} articles on {date_} from {object_store}")
+    return n_rows
+
+
+def worker_streams(object_store: ObjectStore) -> List[Iterator[Tuple[date, str]]]:
+    """One date-ordered stream of partition keys per worker"""
+    keys = [
+        key
+        for key in object_store.list(RESULTS_PREFIX)
+        if key.endswith(PARTITION_SUFFIX)
+    ]
+    parsed = sorted((parse_partition_key(key), key) for key in keys)
+    return [
+        iter([(date_, key) for (_, date_), key in worker_keys])
+        for _, worker_keys in groupby(parsed, key=lambda p: p[0][0])
+    ]
+
+
+def merge_partition_keys(object_store: ObjectStore) -> Iterator[Tuple[date, str]]:
+    """
+    k-way merge of every worker's stream by date. A date published by more
+    than one worker (e.g. after a lost lease) is only taken once.
+    """
+    last_date = None
+    for date_, key in heapq.merge(*worker_streams(object_store)):
+        if date_ == last_date:
+            continue
+        last_date = date_
+        yield date_, key
+
+
+def collect_results(object_store: ObjectStore, filepath: str) -> int:
+    """
+    Stream every published partition, in date order, into one csv. Only one
+    partition is held in memory at a time. Returns number of rows written.
+    """
+    tmp_path = f"{filepath}.tmp"
+    n_rows = 0
+    n_partitions = 0
+    with tempfile.TemporaryDirectory() as download_dir, open(
+        tmp_path, "w", newline=""
+    ) as f:
+        local_path = os.path.join(download_dir, "partition.parquet")
+        for _, key in merge_partition_keys(object_store):
+            object_store.get_file(key, local_path)
+            df = pq.read_table(local_path).to_pandas()
+            df.to_csv(f, header=f.tell() == 0, index=False)
+            n_rows += len(df)
+            n_partitions += 1
+
+    os.replace(tmp_path, filepath)
+    log.info(f"Collected {n_partitions} partitions ({n_rows} rows) to {filepath}")
+    return n_rows
@@ -0,0 +1,47 @@
+import json
+import os
+import time
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from src import CACHE_DIR
+
+CONSENT_DIR = os.path.join(CACHE_DIR, "consent")
+# Fields of a DevTools cookie that Network.setCookies accepts back
+COOKIE_PARAMS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite")
+
+
+def consent_path(url: str) -> str:
+    """Cookies are kept per host, so replay servers never clobber live ones"""
+    return os.path.join(CONSENT_DIR, f"{urlsplit(url).hostname}.json")
+
+
+def load_consent_cookies(url: str) -> Optional[List[dict]]:
+    """Unexpired cookies saved after dismissing the consent pop-up, if any"""
+    path = consent_path(url)
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        cookies = json.load(f)
+    now = time.time()
+    cookies = [cookie for cookie in cookies if cookie.get("expires", now + 1) > now]
+    return cookies or None
+
+
+def save_consent_cookies(url: str, cookies: List[dict]) -> None:
+    """Write atomically, as pool workers may all save on their first start"""
+    saved = []
+    for cookie in cookies:
+        params = {key: cookie[key] for key in COOKIE_PARAMS if key in cookie}
+        # Session cookies are kept too, as the next session is the same run
+        if not cookie.get("session"):
+            params["expires"] = cookie["expires"]
+        saved.append(params)
+
+    os.makedirs(CONSENT_DIR, exist_ok=True)
+    path = consent_path(url)
+    tmp_path = f"{path}.{os.getpid()}.{id(cookies)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(saved, f)
+    os.replace(tmp_path, path)
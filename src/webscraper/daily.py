@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import src.utils.logger as logs
+from src import DATA_DIR
+from src.cloud_sdk.object_store import ObjectStore, connect_object_store
+from src.configs.config import load_config
+from src.webscraper.ledger import ArticleLedger
+from src.webscraper.run import ScrapeSession, preemptible
+from src.webscraper.store import ResultStore
+
+log = logs.CustomLogger(__name__)
+
+"""
+Keep recent days fresh instead of re-running backfills over them:
+
+python webscraper/daily.py --n-top-comments 1 --results-uri gs://bucket/results
+
+Each new day is scraped as soon as its sitemap archive is complete, i.e. from
+the next day on. Top comments keep gaining votes for a few days, so a day is
+then revisited on a decaying schedule (first_revisit_hours, then backoff times
+further apart each visit) until it is cache.settle_days old. A last visit at
+that age records every article as settled, after which the day is skipped.
+
+Settled articles are reused from the ledger on every revisit, so only those
+still gaining votes are scraped again. Partitions are overwritten in place,
+locally and in the results store, where the worker id defaults to the
+hostname so a restart keeps writing the same keys. With one daily scraper per
+results store, --collect then always sees the latest visit.
+With --once every due day is visited and the process exits, e.g. under cron.
+"""
+
+SCHEDULE_PATH = os.path.join(DATA_DIR, "daily_schedule.json")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-top-comments", type=int, default=1)
+    parser.add_argument("--results-uri", type=str, required=False)
+    parser.add_argument("--json-log", type=str, required=False)
+    # Stable across restarts, unlike run.py's, as visits overwrite partitions
+    parser.add_argument("--worker-id", type=str, default=socket.gethostname())
+    parser.add_argument("--once", action="store_true")
+    return parser.parse_args(argv)
+
+
+class VisitSchedule:
+    """
+    When each recent day was last scraped and how often, persisted so a
+    restart picks the schedule up where it left off
+    """
+
+    def __init__(
+        self,
+        settle_days: float,
+        first_revisit_hours: float,
+        backoff: float,
+        path: str = SCHEDULE_PATH,
+    ):
+        self.settle_days = settle_days
+        self.first_revisit_hours = first_revisit_hours
+        self.backoff = backoff
+        self.path = path
+        self.visits: Dict[date, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.visits = {
+                    date.fromisoformat(d): visit for d, visit in json.load(f).items()
+                }
+
+    def __repr__(self):
+        return f"{__class__.__name__}({len(self.visits)} days)"
+
+    def save(self) -> None:
+        """Write atomically so an interrupted run never loses the schedule"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({d.isoformat(): v for d, v in self.visits.items()}, f)
+        os.replace(tmp_path, self.path)
+
+    def settled_at(self, date_: date) -> datetime:
+        """When articles scraped for date stop counting as unsettled in the ledger"""
+        return datetime.combine(date_, datetime.min.time()) + timedelta(
+            days=self.settle_days
+        )
+
+    def next_visit(self, date_: date) -> Optional[datetime]:
+        """Due time of date's next visit, None once it has settled"""
+        visit = self.visits.get(date_)
+        if visit is None:
+            return datetime.min
+        visited_at = datetime.fromisoformat(visit["visited_at"])
+        settled_at = self.settled_at(date_)
+        if visited_at >= settled_at:
+            return None
+        interval = self.first_revisit_hours * self.backoff ** (visit["n_visits"] - 1)
+        return min(visited_at + timedelta(hours=interval), settled_at)
+
+    def due(self, dates: List[date], now: datetime) -> List[date]:
+        """Dates due a visit, never visited first and then oldest first"""
+        due = [d for d in dates if (self.next_visit(d) or datetime.max) <= now]
+        return sorted(due, key=lambda d: (d in self.visits, d))
+
+    def next_due(self, dates: List[date]) -> Optional[datetime]:
+        times = [t for t in map(self.next_visit, dates) if t is not None]
+        return min(times) if times else None
+
+    def visited(self, date_: date, at: datetime) -> None:
+        n_visits = self.visits.get(date_, {}).get("n_visits", 0) + 1
+        self.visits[date_] = {"n_visits": n_visits, "visited_at": at.isoformat()}
+        self.save()
+
+    def forget_before(self, date_: date) -> None:
+        """Drop days that fell out of the lookback window"""
+        self.visits = {d: v for d, v in self.visits.items() if d >= date_}
+
+
+def recent_dates(lookback_days: int, today: date = None) -> List[date]:
+    """Days whose archives are complete, back to lookback_days before today"""
+    today = today or date.today()
+    return [today - timedelta(days=n) for n in range(lookback_days, 0, -1)]
+
+
+async def archive_ready(session: ScrapeSession, date_: date) -> bool:
+    """Whether date's sitemap archive can be fetched yet"""
+    try:
+        await session.sitemaps.get(date_)
+    except (ValueError, OSError) as e:
+        log.info(f"Sitemap archive for {date_} not available yet - {e}")
+        return False
+    return True
+
+
+async def visit_due_dates(
+    schedule: VisitSchedule,
+    dates: List[date],
+    scraper_config: dict,
+    store: ResultStore,
+    ledger: ArticleLedger,
+    results: ObjectStore = None,
+    worker_id: str = None,
+) -> int:
+    """Scrape every date due a visit, returning how many were visited"""
+    due = schedule.due(dates, datetime.utcnow())
+    if not due:
+        return 0
+
+    n_visited = 0
+    # Browsers are only held while there is work, not through the waits
+    async with ScrapeSession(scraper_config, ledger, results, worker_id) as session:
+        session.sitemaps.prefetch(due)
+        for date_ in due:
+            if not await archive_ready(session, date_):
+                continue
+            visited_at = datetime.utcnow()
+            n_visits = schedule.visits.get(date_, {}).get("n_visits", 0)
+            log.info(f"Visiting {date_} ({n_visits} previous visits)")
+            await session.scrape_date(date_, store)
+            schedule.visited(date_, visited_at)
+            n_visited += 1
+    return n_visited
+
+
+async def run_daily(
+    daily_config: dict,
+    schedule: VisitSchedule,
+    scraper_config: dict,
+    store: ResultStore,
+    ledger: ArticleLedger,
+    results: ObjectStore = None,
+    worker_id: str = None,
+    once: bool = False,
+) -> None:
+    """Visit due dates, then sleep until the next one is due, indefinitely"""
+    while True:
+        dates = recent_dates(daily_config["lookback_days"])
+        schedule.forget_before(dates[0])
+        n_visited = await visit_due_dates(
+            schedule, dates, scraper_config, store, ledger, results, worker_id
+        )
+        n_settled = sum(schedule.next_visit(d) is None for d in dates)
+        log.info(
+            f"{n_visited} days visited, {n_settled}/{len(dates)} recent days settled"
+        )
+        if once:
+            return
+
+        wait_seconds = daily_config["poll_minutes"] * 60
+        next_due = schedule.next_due(dates)
+        if next_due is not None:
+            until_due = (next_due - datetime.utcnow()).total_seconds()
+            # Still overdue means its archive was not ready, so poll for it
+            if until_due > 0:
+                wait_seconds = min(wait_seconds, until_due)
+        log.info(f"Next check in {wait_seconds / 60:.0f} minutes")
+        await asyncio.sleep(wait_seconds)
+
+
+if __name__ == "__main__":
+    log.info("Starting daily scraper")
+    args = parse_args()
+    if args.json_log:
+        logs.enable_json_lines(args.json_log)
+    scraper_config = load_config("webscraper/scraper_config.yaml")
+    scraper_config["n_top_comments"] = args.n_top_comments
+    daily_config = scraper_config["daily"]
+    cache_config = scraper_config["cache"]
+    ledger = ArticleLedger(
+        settle_days=cache_config["settle_days"],
+        reuse_hours=daily_config["reuse_hours"],
+        n_top_comments=args.n_top_comments,
+    )
+    schedule = VisitSchedule(
+        settle_days=cache_config["settle_days"],
+        first_revisit_hours=daily_config["first_revisit_hours"],
+        backoff=daily_config["backoff"],
+    )
+    results = connect_object_store(args.results_uri) if args.results_uri else None
+    completed = asyncio.run(
+        preemptible(
+            run_daily(
+                daily_config=daily_config,
+                schedule=schedule,
+                scraper_config=scraper_config,
+                store=ResultStore(),
+                ledger=ledger,
+                results=results,
+                worker_id=args.worker_id,
+                once=args.once,
+            )
+        )
+    )
+    log.info(f"Article cache for run - {ledger.hits} hits, {ledger.misses} misses")
+    ledger.close()
+    if not completed:
+        log.info("Daily scraper stopped - Rerun to resume the schedule")
@@ -2,9 +2,13 @@ from datetime import date, timedelta
 from typing import List
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from dateutil.relativedelta import relativedelta
 
+BASE_URL = "https://www.dailymail.co.uk"
+# Seconds to wait for an archive page, so a stalled request cannot hang a run
+ARCHIVE_TIMEOUT = 30
+
 
 def get_dates(start_date: date = None, end_date: date = None) -> List[date]:
     if not end_date:
@@ -20,11 +24,15 @@ def get_dates(start_date: date = None, end_date: date = None) -> List[date]:
     return all_dates
 
 
-def get_dates_article_urls(d: date) -> List[str]:
+def get_archive_url(d: date, base_url: str = BASE_URL) -> str:
     str_date = d.strftime("%Y%m%d")
-    archive_url = f"https://www.dailymail.co.uk/home/sitemaparchive/day_{str_date}.html"
-    res = requests.get(archive_url)
-    soup = BeautifulSoup(res.content, "html.parser")
+    return f"{base_url}/home/sitemaparchive/day_{str_date}.html"
+
+
+def parse_article_urls(content: bytes, base_url: str = BASE_URL) -> List[str]:
+    """Parse only the sitemap container out of an archive page"""
+    strainer = SoupStrainer("div", {"class": "alpha debate sitemap"})
+    soup = BeautifulSoup(content, "lxml", parse_only=strainer)
 
     container = soup.find_all("div", {"class": "alpha debate sitemap"})
 
@@ -32,10 +40,21 @@ def get_dates_article_urls(d: date) -> List[str]:
         raise ValueError("Container not found")
 
     links = container[0].find_all("a")
-    base_url = "https://www.dailymail.co.uk"
     article_urls = [base_url + link.get("href") + "#comments" for link in links]
     return article_urls[3:]
 
 
+def get_dates_article_urls(
+    d: date,
+    session: requests.Session = None,
+    base_url: str = BASE_URL,
+    timeout: float = ARCHIVE_TIMEOUT,
+) -> List[str]:
+    res = (session or requests).get(get_archive_url(d, base_url), timeout=timeout)
+    # An error page would otherwise parse as an archive
+    res.raise_for_status()
+    return parse_article_urls(res.content, base_url)
+
+
 def get_week_num(date_: date) -> int:
     return date_.isocalendar()[1]
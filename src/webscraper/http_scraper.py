@@ -0,0 +1,169 @@
+import asyncio
+import re
+from datetime import date
+from typing import Dict, List, Optional, Set, Union
+
+import aiohttp
+import pandas as pd
+
+from src.utils import logger as logs
+from src.webscraper.dates import get_dates_article_urls, get_week_num
+from src.webscraper.top_articles import resume_top_articles
+
+log = logs.CustomLogger(__name__)
+
+ARTICLE_ID_PATTERN = re.compile(r"article-(\d+)")
+
+
+def get_article_id(url: str) -> Optional[str]:
+    match = ARTICLE_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def parse_comment(comment: dict) -> Dict[str, Union[str, int]]:
+    """
+    Map raw comment payload onto the Selenium scraper output. voteRating is the
+    net score and voteCount the total, so upvotes are the mean of the two.
+    """
+    vote_rating = int(comment.get("voteRating") or 0)
+    vote_count = int(comment.get("voteCount") or 0)
+    upvotes = (vote_count + vote_rating) // 2
+    return {"comment": comment["message"], "rating-button-up": upvotes}
+
+
+class DailyMailHttpScraper:
+    """
+    Fetch top comments straight from the reader comments endpoint over a pooled
+    HTTP session, skipping the browser entirely
+    """
+
+    def __init__(
+        self,
+        n_top_comments: int,
+        top_k: int,
+        log_n_iter: int,
+        retry_attempts: int,
+        comments_url: str,
+        max_connections: int,
+        request_timeout: int,
+        ledger=None,
+    ):
+        self.session = None
+        self.ledger = ledger
+        self.n_top_comments = n_top_comments
+        self.top_k = top_k
+        self.log_n_iter = log_n_iter
+        self.retry_attempts = retry_attempts
+        self.comments_url = comments_url
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+        )
+        log.info("HTTP scraper initialised")
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.session.close()
+        self.session = None
+        log.info("HTTP scraper safely closed")
+        if exc_type is not None:
+            log.error(f"{exc_type}\n{exc_val}\n{exc_tb}")
+
+    async def fetch_comments(self, article_id: str) -> Optional[List[dict]]:
+        """
+        Request best rated comments for article, empty if none available and
+        None if every attempt failed
+        """
+        url = self.comments_url.format(article_id=article_id)
+        params = {
+            "max": self.n_top_comments,
+            "offset": 0,
+            "order": "desc",
+            "sort": "voteRating",
+        }
+        for _ in range(self.retry_attempts + 1):
+            try:
+                async with self.session.get(url, params=params) as res:
+                    if res.status == 404:
+                        return []
+                    res.raise_for_status()
+                    data = await res.json(content_type=None)
+                    if not isinstance(data, dict):
+                        raise ValueError(f"Unexpected response {str(data)[:100]}")
+                    return (data.get("payload") or {}).get("page") or []
+            # A body that is not a JSON object counts as a failed attempt
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                log.info(f"Comment request failed ({e}). Retrying...", prefix=url)
+
+        log.warning("Comment request failed, skipping article", prefix=url)
+        return None
+
+    async def get_top_comments(
+        self, url: str
+    ) -> Optional[List[Dict[str, Union[str, int]]]]:
+        article_id = get_article_id(url)
+        if article_id is None:
+            return []
+
+        comments = await self.fetch_comments(article_id)
+        if comments is None:
+            return None
+        return [parse_comment(c) for c in comments[: self.n_top_comments]]
+
+    def record(
+        self, date_: date, i: int, url: str, top_comments: Optional[List[dict]]
+    ) -> None:
+        if self.ledger is None:
+            return
+        if top_comments is None:
+            self.ledger.record_failed(date_, i, url)
+            return
+        self.ledger.record(date_, i, url, top_comments)
+
+    async def process_date(
+        self,
+        date_: date,
+        article_urls: List[str] = None,
+        skip_urls: Set[str] = frozenset(),
+    ) -> pd.DataFrame:
+        """Process all articles on date concurrently"""
+        if article_urls is None:
+            article_urls = get_dates_article_urls(date_)
+        n_articles = len(article_urls)
+        week_num = get_week_num(date_)
+        logs.set_prefix(f"Week {week_num} | {date_} | {n_articles} articles")
+
+        done_urls, top_articles = resume_top_articles(
+            self.ledger, date_, self.top_k, article_urls
+        )
+        done_urls |= skip_urls
+
+        async def fetch(i: int, url: str):
+            return i, url, await self.get_top_comments(url)
+
+        results = {}
+        tasks = [
+            fetch(i, url)
+            for i, url in enumerate(article_urls)
+            if url not in done_urls
+        ]
+        for n_done, task in enumerate(asyncio.as_completed(tasks), start=1):
+            i, url, top_comments = await task
+            results[i] = (url, top_comments)
+            self.record(date_, i, url, top_comments)
+            if n_done % self.log_n_iter == 0:
+                log.info(f"Week {week_num} | {date_} | {n_done}/{n_articles} articles")
+
+        # Reduce in article order so ties resolve as in the Selenium scraper
+        for i in sorted(results):
+            url, top_comments = results[i]
+            if top_comments:
+                upvotes = top_comments[0]["rating-button-up"]
+                top_articles.push(upvotes, i, url, top_comments)
+
+        log.info(f"Top articles: {top_articles}")
+        return top_articles.to_df(date_)
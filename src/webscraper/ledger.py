@@ -0,0 +1,209 @@
+import json
+import os
+import sqlite3
+from datetime import date
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from src import DATA_DIR
+
+LEDGER_PATH = os.path.join(DATA_DIR, "ledger.sqlite")
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    article_num INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    upvotes INTEGER NOT NULL DEFAULT 0,
+    comments TEXT,
+    n_top_comments INTEGER NOT NULL DEFAULT 1,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+CREATE_INDEX = "CREATE INDEX IF NOT EXISTS articles_date ON articles (date, status)"
+# Ledgers written before comment counts were recorded scraped the top comment
+ADD_N_TOP_COMMENTS = (
+    "ALTER TABLE articles ADD COLUMN n_top_comments INTEGER NOT NULL DEFAULT 1"
+)
+
+COLUMNS = (
+    "url",
+    "date",
+    "article_num",
+    "status",
+    "upvotes",
+    "comments",
+    "n_top_comments",
+    "updated_at",
+)
+
+DONE = "done"
+FAILED = "failed"
+# Longer gaps between a date's articles are resumes, reruns or idle time
+MAX_ARTICLE_GAP_SECONDS = 120
+
+# Completed entry that can stand in for scraping the article again: scraped
+# with at least as many comments, and either once the article's votes had
+# settled or recently enough to be this run resuming
+REUSABLE = (
+    f"status = '{DONE}' AND n_top_comments >= :n_top_comments AND ("
+    "julianday(updated_at) >= julianday(date) + :settle_days OR "
+    "julianday(updated_at) >= julianday('now') - :reuse_hours / 24.0)"
+)
+
+
+class ArticleLedger:
+    """
+    Durable per-article record of scrape status and top comments, so a
+    restarted run skips finished articles and rebuilds the day's top articles
+    without rendering anything again. Across runs it acts as a cache: an
+    article is only scraped again if its votes were still settling.
+    """
+
+    def __init__(
+        self,
+        path: str = LEDGER_PATH,
+        settle_days: float = 3,
+        reuse_hours: float = 24,
+        n_top_comments: int = 1,
+    ):
+        self.path = path
+        self.settle_days = settle_days
+        self.reuse_hours = reuse_hours
+        self.n_top_comments = n_top_comments
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Processes of one supervisor share the ledger, so wait out their writes
+        self.conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+        # WAL keeps each per-article commit cheap and crash safe
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(CREATE_TABLE)
+        self.conn.execute(CREATE_INDEX)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(articles)")}
+        if "n_top_comments" not in columns:
+            self.conn.execute(ADD_N_TOP_COMMENTS)
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.path})"
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def record(
+        self,
+        date_: date,
+        article_num: int,
+        url: str,
+        comments: List[Dict[str, Union[str, int]]],
+        n_top_comments: int = None,
+    ) -> None:
+        """
+        Record completed article. n_top_comments is how many comments it was
+        scraped for, if fewer than the run's because extraction was cut short.
+        """
+        upvotes = comments[0]["rating-button-up"] if comments else 0
+        self.recorded += 1
+        self.conn.execute(
+            "INSERT OR REPLACE INTO articles "
+            "(url, date, article_num, status, upvotes, comments, n_top_comments) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                url,
+                date_.isoformat(),
+                article_num,
+                DONE,
+                upvotes,
+                json.dumps(comments),
+                self.n_top_comments if n_top_comments is None else n_top_comments,
+            ),
+        )
+
+    def record_failed(self, date_: date, article_num: int, url: str) -> None:
+        """Mark article as failed unless it already completed"""
+        self.recorded += 1
+        self.conn.execute(
+            "INSERT INTO articles (url, date, article_num, status) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET status = excluded.status, "
+            "updated_at = CURRENT_TIMESTAMP WHERE status != ?",
+            (url, date_.isoformat(), article_num, FAILED, DONE),
+        )
+
+    def reusable_params(self, date_: date) -> dict:
+        return {
+            "date": date_.isoformat(),
+            "n_top_comments": self.n_top_comments,
+            "settle_days": self.settle_days,
+            "reuse_hours": self.reuse_hours,
+        }
+
+    def completed_urls(self, date_: date) -> Set[str]:
+        """Urls on date whose recorded comments can be reused"""
+        rows = self.conn.execute(
+            f"SELECT url FROM articles WHERE date = :date AND {REUSABLE}",
+            self.reusable_params(date_),
+        )
+        return {url for (url,) in rows}
+
+    def count_lookups(self, article_urls: List[str], cached_urls: Set[str]) -> int:
+        """Add date's cache hits and misses to run totals, returning hits"""
+        hits = len(cached_urls.intersection(article_urls))
+        self.hits += hits
+        self.misses += len(article_urls) - hits
+        return hits
+
+    def best_articles(
+        self, date_: date, k: int
+    ) -> List[Tuple[int, int, str, List[dict]]]:
+        """Top k reusable articles by upvotes, earliest first on ties"""
+        rows = self.conn.execute(
+            "SELECT upvotes, article_num, url, comments FROM articles "
+            f"WHERE date = :date AND {REUSABLE} AND upvotes > 0 "
+            "ORDER BY upvotes DESC, article_num ASC LIMIT :k",
+            {**self.reusable_params(date_), "k": k},
+        )
+        return [
+            (upvotes, article_num, url, json.loads(comments))
+            for upvotes, article_num, url, comments in rows
+        ]
+
+    def export_date(self, date_: date) -> List[dict]:
+        """Completed rows for date, e.g. to hand a partial day to another machine"""
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM articles WHERE date = ? AND status = ?",
+            (date_.isoformat(), DONE),
+        )
+        return [dict(zip(COLUMNS, row)) for row in cursor]
+
+    def import_rows(self, rows: List[dict]) -> None:
+        """Merge exported rows, keeping whichever copy of an article is newer"""
+        updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[1:])
+        self.conn.executemany(
+            f"INSERT INTO articles ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join(':' + column for column in COLUMNS)}) "
+            f"ON CONFLICT(url) DO UPDATE SET {updates} "
+            "WHERE excluded.updated_at > articles.updated_at",
+            rows,
+        )
+
+    def seconds_per_article(
+        self, max_gap_seconds: float = MAX_ARTICLE_GAP_SECONDS
+    ) -> Optional[float]:
+        """
+        Mean wall-clock seconds between consecutive completed articles of a
+        date, leaving out gaps over max_gap_seconds as pauses between runs
+        """
+        n_intervals, seconds = self.conn.execute(
+            "SELECT COUNT(gap), SUM(gap) FROM ("
+            "SELECT (julianday(updated_at) - julianday(LAG(updated_at) OVER ("
+            "PARTITION BY date ORDER BY updated_at))) * 86400 AS gap "
+            "FROM articles WHERE status = ?"
+            ") WHERE gap <= ?",
+            (DONE, max_gap_seconds),
+        ).fetchone()
+        if not n_intervals or not seconds or seconds <= 0:
+            return None
+        return seconds / n_intervals
@@ -0,0 +1,181 @@
+import json
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from src import DATA_DIR
+from src.utils import logger as logs
+
+log = logs.CustomLogger(__name__)
+
+METRICS_DIR = os.path.join(DATA_DIR, "metrics")
+DAILY_SUMMARY_FILENAME = "daily_summary.jsonl"
+DEFAULT_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+METRIC_NAME = "topcomment_scraper"
+# Phase spanning a whole article, which every other phase is nested inside
+TOTAL_PHASE = "article"
+
+
+class Histogram:
+    """Fixed bucket latency histogram, cheap enough to observe on the hot path"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of bucket holding the q-th percentile observation"""
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "p50": self.quantile(50) if self.count else None,
+            "p95": self.quantile(95) if self.count else None,
+            "max": round(self.max, 3),
+        }
+
+
+class ScrapeMetrics:
+    """
+    Per-phase timings and event counts for browser scraping. Run totals are
+    exported as a Prometheus text file (node_exporter textfile format), and
+    each day's figures are appended to a JSON lines summary. Processes sharing
+    a machine each pass a worker name, which labels their series and file.
+    """
+
+    def __init__(
+        self,
+        buckets: List[float] = None,
+        filename: str = f"{METRIC_NAME}.prom",
+        metrics_dir: str = METRICS_DIR,
+        worker: str = None,
+    ):
+        self.buckets = buckets or DEFAULT_BUCKETS
+        self.worker = worker
+        if worker is not None:
+            stem, ext = os.path.splitext(filename)
+            filename = f"{stem}_{worker}{ext}"
+        self.filename = filename
+        self.metrics_dir = metrics_dir
+        self.phases: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.daily_phases: Dict[str, Histogram] = {}
+        self.daily_counters: Dict[str, int] = defaultdict(int)
+        self.last_summary: Optional[dict] = None
+
+    def observe(self, phase: str, seconds: float) -> None:
+        for histograms in (self.phases, self.daily_phases):
+            if phase not in histograms:
+                histograms[phase] = Histogram(self.buckets)
+            histograms[phase].observe(seconds)
+
+    @contextmanager
+    def time(self, phase: str):
+        """Time enclosed block, including any awaits, as one phase observation"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, perf_counter() - start)
+
+    def inc(self, event: str, n: int = 1) -> None:
+        self.counters[event] += n
+        self.daily_counters[event] += n
+
+    def labels(self, **labels: str) -> str:
+        if self.worker is not None:
+            labels["worker"] = self.worker
+        return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+    def to_prometheus(self) -> str:
+        lines = [f"# TYPE {METRIC_NAME}_phase_seconds histogram"]
+        for phase, hist in sorted(self.phases.items()):
+            cumulative = 0
+            for bound, count in zip(hist.buckets + ["+Inf"], hist.counts):
+                cumulative += count
+                labels = self.labels(phase=phase, le=bound)
+                lines.append(
+                    f"{METRIC_NAME}_phase_seconds_bucket{{{labels}}} {cumulative}"
+                )
+            labels = f"{{{self.labels(phase=phase)}}}"
+            lines.append(f"{METRIC_NAME}_phase_seconds_sum{labels} {hist.sum:.6f}")
+            lines.append(f"{METRIC_NAME}_phase_seconds_count{labels} {hist.count}")
+
+        lines.append(f"# TYPE {METRIC_NAME}_events_total counter")
+        for event, count in sorted(self.counters.items()):
+            labels = self.labels(event=event)
+            lines.append(f"{METRIC_NAME}_events_total{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self) -> str:
+        """Atomically rewrite metrics file, so scrapers never read it half written"""
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        filepath = os.path.join(self.metrics_dir, self.filename)
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, filepath)
+        return filepath
+
+    def summary(self) -> str:
+        """One line per-phase p50/p95 and share of article time for the day"""
+        if TOTAL_PHASE in self.daily_phases:
+            total = self.daily_phases[TOTAL_PHASE].sum or 1
+        else:
+            total = sum(hist.sum for hist in self.daily_phases.values()) or 1
+        phases = [
+            f"{phase} p50={hist.quantile(50):.2f}s p95={hist.quantile(95):.2f}s "
+            f"({hist.sum / total:.0%})"
+            for phase, hist in sorted(
+                self.daily_phases.items(), key=lambda p: -p[1].sum
+            )
+        ]
+        events = [f"{event}={n}" for event, n in sorted(self.daily_counters.items())]
+        return " | ".join(phases + events)
+
+    def end_day(self, date_: date, n_articles: int) -> None:
+        """
+        Write the day's summary, kept as last_summary for publishing, export
+        run totals and start a new day
+        """
+        summary = {
+            "date": date_.isoformat(),
+            "worker": self.worker,
+            "articles": n_articles,
+            "phases": {
+                phase: hist.stats() for phase, hist in self.daily_phases.items()
+            },
+            "events": dict(self.daily_counters),
+        }
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        summary_path = os.path.join(self.metrics_dir, DAILY_SUMMARY_FILENAME)
+        with open(summary_path, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+        self.last_summary = summary
+        self.export()
+
+        log.info(f"Phases: {self.summary()}")
+        self.daily_phases = {}
+        self.daily_counters = defaultdict(int)
@@ -0,0 +1,117 @@
+import heapq
+from datetime import date
+from typing import Dict, List
+
+from src.utils import logger as logs
+from src.webscraper.ledger import ArticleLedger
+from src.webscraper.sitemaps import SitemapPrefetcher, load_cached_article_urls
+
+log = logs.CustomLogger(__name__)
+
+
+def get_article_counts(
+    dates: List[date], default_articles: int, sitemap_config: dict = None
+) -> Dict[date, int]:
+    """
+    Article count per date from the sitemap cache. Missing archives are
+    fetched (and cached) if a sitemap config is given, else use the default.
+    """
+    counts = {}
+    missing = []
+    for d in dates:
+        article_urls = load_cached_article_urls(d)
+        if article_urls is None:
+            missing.append(d)
+        else:
+            counts[d] = len(article_urls)
+
+    if missing and sitemap_config is not None:
+        with SitemapPrefetcher(**sitemap_config) as sitemaps:
+            sitemaps.prefetch(missing)
+            for d in missing:
+                try:
+                    counts[d] = len(sitemaps.futures[d].result())
+                except Exception as e:
+                    log.warning(f"Could not fetch sitemap for {d} ({e})")
+
+    for d in dates:
+        counts.setdefault(d, default_articles)
+
+    return counts
+
+
+def get_date_costs(
+    dates: List[date],
+    seconds_per_article: float,
+    default_articles: int,
+    sitemap_config: dict = None,
+    ledger: ArticleLedger = None,
+) -> Dict[date, float]:
+    """Expected seconds of scraping per date, using measured latency if any"""
+    if ledger is not None:
+        measured = ledger.seconds_per_article()
+        if measured is not None:
+            seconds_per_article = measured
+
+    counts = get_article_counts(dates, default_articles, sitemap_config)
+    return {d: counts[d] * seconds_per_article for d in dates}
+
+
+def contiguous_groups(costs: List[float], n_groups: int) -> List[List[int]]:
+    """
+    Split ordered costs into at most n_groups contiguous runs minimising the
+    largest run total, by binary search on the run capacity.
+    """
+
+    def split(capacity: float) -> List[List[int]]:
+        groups, current, total = [], [], 0.0
+        for i, cost in enumerate(costs):
+            if current and total + cost > capacity:
+                groups.append(current)
+                current, total = [], 0.0
+            current.append(i)
+            total += cost
+        groups.append(current)
+        return groups
+
+    low, high = max(costs), sum(costs)
+    for _ in range(50):
+        mid = (low + high) / 2
+        if len(split(mid)) <= n_groups:
+            high = mid
+        else:
+            low = mid
+
+    return split(high)
+
+
+def packed_groups(costs: List[float], n_groups: int) -> List[List[int]]:
+    """Longest-processing-time-first bin packing, dates need not be adjacent"""
+    bins = [(0.0, n, []) for n in range(n_groups)]
+    heapq.heapify(bins)
+    for i in sorted(range(len(costs)), key=lambda i: costs[i], reverse=True):
+        total, n, items = heapq.heappop(bins)
+        items.append(i)
+        heapq.heappush(bins, (total + costs[i], n, items))
+
+    return [sorted(items) for _, _, items in sorted(bins, key=lambda b: b[1]) if items]
+
+
+def plan_date_groups(
+    dates: List[date], costs: Dict[date, float], n_groups: int, contiguous: bool
+) -> List[List[date]]:
+    """Group dates across instances to minimise the makespan"""
+    n_groups = max(min(n_groups, len(dates)), 1)
+    date_costs = [costs[d] for d in dates]
+    if contiguous:
+        index_groups = contiguous_groups(date_costs, n_groups)
+    else:
+        index_groups = packed_groups(date_costs, n_groups)
+
+    groups = [[dates[i] for i in group] for group in index_groups]
+    loads = [sum(costs[d] for d in group) / 3600 for group in groups]
+    log.info(
+        f"Planned {len(groups)} groups - makespan {max(loads):.1f}h, "
+        f"mean {sum(loads) / len(loads):.1f}h"
+    )
+    return groups
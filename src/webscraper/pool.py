@@ -0,0 +1,123 @@
+import asyncio
+from datetime import date
+from typing import List, Set
+
+import pandas as pd
+
+from src.utils import logger as logs
+from src.webscraper.dates import get_dates_article_urls, get_week_num
+from src.webscraper.metrics import ScrapeMetrics
+from src.webscraper.scraper import DailyMailScraper
+from src.webscraper.top_articles import resume_top_articles
+
+log = logs.CustomLogger(__name__)
+
+
+class DailyMailScraperPool:
+    """
+    Pool of independent browser sessions scraping a single date concurrently.
+    Each worker pulls article urls from a shared queue and feeds one shared
+    top articles heap.
+    """
+
+    def __init__(self, n_workers: int, **scraper_config):
+        self.n_workers = n_workers
+        self.log_n_iter = scraper_config["log_n_iter"]
+        self.top_k = scraper_config["top_k"]
+        self.ledger = scraper_config.get("ledger")
+        # Workers share one set of histograms, so the day's summary covers all
+        self.metrics = scraper_config.pop("metrics", None) or ScrapeMetrics()
+        self.scrapers = [
+            DailyMailScraper(**scraper_config, metrics=self.metrics)
+            for _ in range(n_workers)
+        ]
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.n_workers} workers)"
+
+    async def __aenter__(self):
+        # Each session dismisses its own pop-up, so start them together. Every
+        # start is awaited before closing, so none is left starting unowned
+        started = await asyncio.gather(
+            *(scraper.__aenter__() for scraper in self.scrapers),
+            return_exceptions=True,
+        )
+        errors = [e for e in started if isinstance(e, BaseException)]
+        if errors:
+            await self.close()
+            raise errors[0]
+        log.info(f"{self} initialised")
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await asyncio.gather(
+            *(
+                scraper.__aexit__(exc_type, exc_val, exc_tb)
+                for scraper in self.scrapers
+                if scraper.executor is not None
+            )
+        )
+
+    async def close(self) -> None:
+        await asyncio.gather(*(scraper.close() for scraper in self.scrapers))
+
+    async def process_date(
+        self,
+        date_: date,
+        article_urls: List[str] = None,
+        skip_urls: Set[str] = frozenset(),
+    ) -> pd.DataFrame:
+        """Process all articles on date across all workers"""
+        if article_urls is None:
+            article_urls = get_dates_article_urls(date_)
+        n_articles = len(article_urls)
+        week_num = get_week_num(date_)
+        logs.set_prefix(f"Week {week_num} | {date_} | {n_articles} articles")
+
+        done_urls, top_articles = resume_top_articles(
+            self.ledger, date_, self.top_k, article_urls
+        )
+        done_urls |= skip_urls
+        queue = asyncio.Queue()
+        for i, url in enumerate(article_urls):
+            if url not in done_urls:
+                queue.put_nowait((i, url))
+
+        n_done = {"articles": len(done_urls)}
+        worker_articles = [0] * self.n_workers
+
+        async def worker(n: int, scraper: DailyMailScraper) -> None:
+            while not queue.empty():
+                i, url = queue.get_nowait()
+                worker_articles[n] += 1
+                # Each worker runs as its own task, so prefixes don't collide
+                logs.set_prefix(
+                    f"Week {week_num} | {date_} | article {i + 1}/{n_articles} | "
+                    f"worker {n}"
+                )
+                # Workers share one heap, so each sees the latest threshold
+                await scraper.process_url(url, top_articles, date_, i)
+
+                n_done["articles"] += 1
+                if n_done["articles"] % self.log_n_iter == 0:
+                    log.info(f"{n_done['articles']}/{n_articles} articles done")
+
+        workers = [
+            asyncio.ensure_future(worker(n, scraper))
+            for n, scraper in enumerate(self.scrapers)
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            # A failed worker must not leave the others scraping in the background
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        for n, scraper in enumerate(self.scrapers):
+            log.info(
+                f"Worker {n} waits: {scraper.waiter.summary(worker_articles[n])}"
+            )
+            scraper.waiter.reset_decisions()
+        self.metrics.end_day(date_, n_articles)
+        return top_articles.to_df(date_)
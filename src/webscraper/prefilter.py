@@ -0,0 +1,93 @@
+import asyncio
+from typing import List, Optional, Set
+
+import aiohttp
+
+from src.utils import logger as logs
+from src.webscraper.http_scraper import get_article_id
+
+log = logs.CustomLogger(__name__)
+
+
+class CommentCountFilter:
+    """
+    Cheap pass over plain HTTP reading each article's comment count, so
+    articles with comments disabled or too few comments never reach the
+    browser. Articles whose count cannot be read are kept.
+    """
+
+    def __init__(
+        self,
+        count_url: str,
+        min_comments: int,
+        max_connections: int,
+        request_timeout: int,
+    ):
+        self.session = None
+        self.count_url = count_url
+        self.min_comments = min_comments
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self.n_checked = 0
+        self.n_skipped = 0
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.session.close()
+        self.session = None
+        log.info(
+            f"Pre-filter saved {self.n_skipped}/{self.n_checked} browser loads"
+        )
+
+    async def get_comment_count(self, url: str) -> Optional[int]:
+        """
+        Comment count of article, or at least min_comments if the response
+        only lists a page of them. None if the response cannot be read.
+        """
+        article_id = get_article_id(url)
+        if article_id is None:
+            return None
+
+        count_url = self.count_url.format(article_id=article_id)
+        # Without a total, a page of min_comments still tells whether it is met
+        params = {"max": max(self.min_comments, 1)}
+        try:
+            async with self.session.get(count_url, params=params) as res:
+                if res.status == 404:
+                    return 0
+                res.raise_for_status()
+                data = await res.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return None
+
+        payload = data.get("payload") if isinstance(data, dict) else None
+        if not isinstance(payload, dict):
+            return None
+        if "total" in payload:
+            return int(payload["total"])
+        page = payload.get("page")
+        return len(page) if isinstance(page, list) else None
+
+    async def low_comment_urls(self, article_urls: List[str]) -> Set[str]:
+        """Urls known to have fewer than min_comments comments"""
+        counts = await asyncio.gather(
+            *(self.get_comment_count(url) for url in article_urls)
+        )
+        skip_urls = {
+            url
+            for url, count in zip(article_urls, counts)
+            if count is not None and count < self.min_comments
+        }
+        self.n_checked += len(article_urls)
+        self.n_skipped += len(skip_urls)
+        log.info(
+            f"Pre-filter skipping {len(skip_urls)}/{len(article_urls)} articles "
+            f"with fewer than {self.min_comments} comments"
+        )
+        return skip_urls
@@ -1,103 +1,507 @@
 import argparse
 import asyncio
 import os
+import signal
+import socket
+import sys
+import time
+from contextlib import AsyncExitStack
 from datetime import date, datetime
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import pandas as pd
 
 import src.utils.logger as logs
+from src.cloud_sdk.object_store import ObjectStore, connect_object_store
 from src.configs.config import load_config
 from src import DATA_DIR
-from src.webscraper.dates import get_dates
+from src.webscraper.collect import (
+    fetch_partition,
+    publish_partition,
+    publish_progress,
+    publish_status,
+    publish_summary,
+    published_partitions,
+    restore_progress,
+)
+from src.webscraper.dates import get_dates, get_week_num
+from src.webscraper.http_scraper import DailyMailHttpScraper
+from src.webscraper.ledger import ArticleLedger
+from src.webscraper.metrics import ScrapeMetrics
+from src.webscraper.pool import DailyMailScraperPool
+from src.webscraper.prefilter import CommentCountFilter
 from src.webscraper.scraper import DailyMailScraper
+from src.webscraper.sitemaps import SitemapPrefetcher
+from src.webscraper.store import ResultStore
+from src.webscraper.task_queue import Task, TaskQueue, connect_task_queue
+from src.webscraper.top_articles import weekly_top_articles
 
 log = logs.CustomLogger(__name__)
 
+# Exit status of a run stopped by SIGTERM, as a shell reports one (128 + 15)
+PREEMPTED_EXIT_CODE = 128 + signal.SIGTERM
+
 
 def parse_args(argv=None) -> argparse.Namespace:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--start-date", type=str, required=True)
-    parser.add_argument("--end-date", type=str, required=True)
+    parser.add_argument("--start-date", type=str, required=False)
+    parser.add_argument("--end-date", type=str, required=False)
+    parser.add_argument("--dates", type=str, required=False)
     parser.add_argument("--n-top-comments", type=int, default=1, required=True)
+    parser.add_argument("--weekly", action="store_true")
+    parser.add_argument("--queue", type=str, required=False)
+    parser.add_argument("--results-uri", type=str, required=False)
+    parser.add_argument("--json-log", type=str, required=False)
+    parser.add_argument(
+        "--worker-id", type=str, default=f"{socket.gethostname()}-{os.getpid()}"
+    )
+    parser.add_argument(
+        "--skip-published",
+        action="store_true",
+        help="Copy dates already in the results store instead of scraping them",
+    )
+    parser.add_argument(
+        "--process",
+        type=str,
+        required=False,
+        help="Name under a supervisor, which builds the combined output instead",
+    )
+
+    args = parser.parse_args(argv)
+    if not (args.queue or args.dates or (args.start_date and args.end_date)):
+        parser.error("one of --start-date/--end-date, --dates or --queue is required")
 
-    return parser.parse_args(argv)
+    return args
 
 
-def process_args(argv: List = None) -> Tuple[List[date], int]:
+def process_args(argv: List = None) -> Tuple[List[date], argparse.Namespace]:
+    """Dates to scrape, empty when dates are leased from a task queue instead"""
     args = parse_args(argv)
+    if args.queue:
+        log.info(f"Leasing dates from task queue {args.queue}")
+        return [], args
+
+    if args.dates:
+        dates = [datetime.strptime(d, "%d/%m/%Y").date() for d in args.dates.split(",")]
+        log.info(f"Dates: {len(dates)} days from {dates[0]} - {dates[-1]}")
+        return dates, args
+
     start_date = datetime.strptime(args.start_date, "%d/%m/%Y").date()
     end_date = datetime.strptime(args.end_date, "%d/%m/%Y").date()
     log.info(f"Date range: {start_date} - {end_date}")
     dates = get_dates(start_date=start_date, end_date=end_date)
 
-    return dates, args.n_top_comments
+    return dates, args
 
 
-def save_checkpoint(top_articles: List[pd.DataFrame], date_: date):
+def migrate_legacy_checkpoints(store: ResultStore) -> None:
+    """Split any old single-file csv checkpoints into per-date partitions"""
     if not os.path.exists(DATA_DIR):
-        os.mkdir(DATA_DIR)
+        return
 
+    completed_dates = set(store.completed_dates())
     for file in os.listdir(DATA_DIR):
-        if file.startswith("CHECKPOINT_"):
-            os.remove(os.path.join(DATA_DIR, file))
+        if not (file.startswith("CHECKPOINT_") and file.endswith(".csv")):
+            continue
 
-    date_str = datetime.strftime(date_, "%d%m%Y")
-    filename = f"CHECKPOINT_{date_str}.csv"
-    filepath = os.path.join(DATA_DIR, filename)
+        df = pd.read_csv(os.path.join(DATA_DIR, file))
+        df["date"] = pd.to_datetime(df["date"]).dt.date
+        new_dates = set(df["date"]) - completed_dates
+        for date_ in sorted(new_dates):
+            store.append(df[df["date"] == date_].set_index("date"), date_)
+        completed_dates |= new_dates
 
-    df = pd.concat(top_articles)
-    df.to_csv(filepath)
-    log.info("Day succesfully scraped - Saving new checkpoint", prefix=logs.PREFIX)
+        if new_dates:
+            log.info(f"Legacy checkpoint {file} migrated to {store}")
 
 
-def load_checkpoint(dates: List[date]) -> Tuple[List[pd.DataFrame], List[date]]:
-    checkpoints = os.listdir(DATA_DIR)
+def save_checkpoint(store: ResultStore, top_article: pd.DataFrame, date_: date):
+    store.append(top_article, date_)
+    log.info("Day succesfully scraped - Saving new checkpoint")
 
-    if not checkpoints:
-        return [], dates
 
-    file = os.path.join(DATA_DIR, checkpoints[0])
-    df = pd.read_csv(file)
-    completed_dates = df["date"].apply(lambda x: datetime.strptime(x, "%Y-%m-%d").date())
+def load_checkpoint(store: ResultStore, dates: List[date]) -> List[date]:
+    migrate_legacy_checkpoints(store)
+    completed_dates = set(store.completed_dates())
     new_dates = [d for d in dates if d not in completed_dates]
-    log.info(f"Previous checkpoint found - Resuming from {new_dates[0]}")
 
-    return [df], new_dates
+    if completed_dates and new_dates:
+        log.info(f"Previous checkpoint found - Resuming from {new_dates[0]}")
+
+    return new_dates
 
 
-def save_output(top_articles: List[pd.DataFrame], date_range: List[date]) -> None:
+def output_path(date_range: List[date], prefix: str = "OUTPUT") -> str:
+    """Output csv path named after the first and last date of the range"""
     start_date = datetime.strftime(date_range[0], "%d%m%Y")
-    end_date = datetime.strftime(date_range[1], "%d%m%Y")
-    filename = f"OUTPUT_{start_date}_{end_date}.csv"
-    filepath = os.path.join(DATA_DIR, filename)
+    end_date = datetime.strftime(date_range[-1], "%d%m%Y")
+    return os.path.join(DATA_DIR, f"{prefix}_{start_date}_{end_date}.csv")
+
+
+def save_output(store: ResultStore, date_range: List[date]) -> None:
+    filepath = output_path(date_range)
+    n_rows = store.compact(filepath, date_range)
+    log.info(f"Run complete - Saving output ({n_rows} rows)")
+
+
+def save_weekly_output(store: ResultStore, date_range: List[date], k: int) -> None:
+    """Top k articles per week, built from the stored daily top k one week at a time"""
+    filepath = output_path(date_range, prefix="OUTPUT_WEEKLY")
+
+    weeks = {}
+    for d in date_range:
+        weeks.setdefault((d.isocalendar()[0], get_week_num(d)), []).append(d)
+
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, "w", newline="") as f:
+        for week_dates in weeks.values():
+            df = store.load(week_dates)
+            if not df.empty:
+                weekly_top_articles(df, k).to_csv(f, header=f.tell() == 0)
+
+    os.replace(tmp_path, filepath)
+    log.info("Saving weekly output")
+
+
+def create_scraper(backend: str, n_workers: int, http: dict, **scraper_config):
+    """Select scraper backend. Browser scraper is pooled if more than one worker"""
+    if backend == "http":
+        return DailyMailHttpScraper(
+            n_top_comments=scraper_config["n_top_comments"],
+            top_k=scraper_config["top_k"],
+            log_n_iter=scraper_config["log_n_iter"],
+            retry_attempts=scraper_config["retry_attempts"],
+            ledger=scraper_config.get("ledger"),
+            **http,
+        )
+    if backend != "selenium":
+        raise ValueError(f"Unknown scraper backend: {backend}")
+    if n_workers > 1:
+        return DailyMailScraperPool(n_workers=n_workers, **scraper_config)
+    return DailyMailScraper(**scraper_config)
+
+
+class ScrapeSession:
+    """Sitemap prefetcher, scraper backend and optional pre-filter for one run"""
+
+    def __init__(
+        self,
+        scraper_config: dict,
+        ledger: ArticleLedger,
+        results: ObjectStore = None,
+        worker_id: str = None,
+        skip_published: bool = False,
+    ):
+        scraper_config = scraper_config.copy()
+        self.sitemap_config = scraper_config.pop("sitemaps")
+        self.prefilter_config = dict(scraper_config.pop("prefilter"))
+        scraper_config.pop("task_queue")
+        scraper_config.pop("cache")
+        scraper_config.pop("supervisor")
+        scraper_config.pop("daily")
+        results_config = scraper_config.pop("results")
+        self.status_seconds = results_config["status_seconds"]
+        self.published_seconds = results_config["published_seconds"]
+        scraper_config["metrics"] = ScrapeMetrics(**scraper_config["metrics"])
+        # The HTTP backend already reads comments without a browser
+        self.use_prefilter = (
+            self.prefilter_config.pop("enabled")
+            and scraper_config["backend"] == "selenium"
+        )
+        scraper_config["ledger"] = ledger
+        self.scraper_config = scraper_config
+        self.ledger = ledger
+        self.results = results
+        self.worker_id = worker_id
+        self.skip_published = skip_published
+        self.published = {}
+        self.published_at = float("-inf")
+        self.stack = None
+        self.sitemaps = None
+        self.scraper = None
+        self.prefilter = None
+
+    async def __aenter__(self):
+        self.stack = AsyncExitStack()
+        await self.stack.__aenter__()
+        try:
+            self.sitemaps = self.stack.enter_context(
+                SitemapPrefetcher(**self.sitemap_config)
+            )
+            self.scraper = await self.stack.enter_async_context(
+                create_scraper(**self.scraper_config)
+            )
+            if self.use_prefilter:
+                self.prefilter = await self.stack.enter_async_context(
+                    CommentCountFilter(**self.prefilter_config)
+                )
+            if self.results is not None:
+                reporter = asyncio.ensure_future(self.report_status())
+                self.stack.callback(reporter.cancel)
+        except BaseException as e:
+            await self.stack.__aexit__(type(e), e, e.__traceback__)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stack.__aexit__(exc_type, exc_val, exc_tb)
+        self.stack = None
 
-    df = pd.concat(top_articles)
-    df.to_csv(filepath)
-    log.info("Run complete - Saving output")
+    async def report_status(self) -> None:
+        """Publish articles processed so far, every status_seconds"""
+        loop = asyncio.get_event_loop()
+        started_at = time.time()
+        while True:
+            await asyncio.sleep(self.status_seconds)
+            status = {
+                "worker_id": self.worker_id,
+                "started_at": started_at,
+                "updated_at": time.time(),
+                "articles": self.ledger.recorded,
+            }
+            try:
+                await loop.run_in_executor(
+                    None, publish_status, self.results, self.worker_id, status
+                )
+            except Exception as e:
+                log.warning(f"Could not publish status - {e}")
+
+    async def scrape_date(self, date_: date, store: ResultStore) -> None:
+        """
+        Scrape date. With skip_published, a date already in the results store
+        is copied instead, e.g. one the fleet controller split off to another
+        instance that got to it first.
+        """
+        if self.results is not None:
+            key = self.published_key(date_)
+            if key is not None:
+                fetch_partition(store, self.results, key, date_)
+                log.info(f"{date_} already published by another worker - Skipping")
+                return
+            restore_progress(self.ledger, self.results, date_)
+        article_urls = await self.sitemaps.get(date_)
+        skip_urls = set()
+        if self.prefilter is not None:
+            skip_urls = await self.prefilter.low_comment_urls(article_urls)
+        try:
+            top_date_article = await self.scraper.process_date(
+                date_, article_urls, skip_urls=skip_urls
+            )
+        except asyncio.CancelledError:
+            # Articles already recorded survive this machine being preempted
+            if self.results is not None:
+                publish_progress(self.ledger, self.results, self.worker_id, date_)
+            raise
+        save_checkpoint(store, top_date_article, date_)
+        self.publish(date_, store)
+        self.publish_metrics(date_)
+
+    def published_key(self, date_: date) -> Optional[str]:
+        """
+        Key of date's partition if skip_published and any worker published it.
+        Listings are reused for published_seconds, as each lists every worker.
+        """
+        if not self.skip_published:
+            return None
+        now = time.monotonic()
+        if now - self.published_at > self.published_seconds:
+            self.published = published_partitions(self.results)
+            self.published_at = now
+        return self.published.get(date_)
+
+    def publish(self, date_: date, store: ResultStore) -> None:
+        """Stream finished partition to the shared results store, if any"""
+        if self.results is not None:
+            publish_partition(store, self.results, self.worker_id, date_)
+
+    def publish_metrics(self, date_: date) -> None:
+        """Share the day's metrics summary, if the backend recorded one"""
+        summary = self.scraper_config["metrics"].last_summary
+        if self.results is None or summary is None:
+            return
+        if summary["date"] == date_.isoformat():
+            publish_summary(self.results, self.worker_id, summary)
 
 
 async def get_top_articles(
-    dates: List[date], scraper_config: dict
-) -> List[pd.DataFrame]:
+    dates: List[date],
+    scraper_config: dict,
+    store: ResultStore,
+    ledger: ArticleLedger,
+    results: ObjectStore = None,
+    worker_id: str = None,
+    skip_published: bool = False,
+) -> None:
     """Get best daily articles for data range"""
-    top_articles, scrape_dates = load_checkpoint(dates)
+    scrape_dates = load_checkpoint(store, dates)
 
-    async with DailyMailScraper(**scraper_config) as dms:
+    async with ScrapeSession(
+        scraper_config, ledger, results, worker_id, skip_published
+    ) as session:
+        # Archives download in the background while earlier days are scraped
+        session.sitemaps.prefetch(scrape_dates)
         for date_ in scrape_dates:
-            top_date_article = await dms.process_date(date_)
-            top_articles.append(top_date_article)
-            save_checkpoint(top_articles, date_)
+            await session.scrape_date(date_, store)
 
-    return top_articles
 
+async def run_leased(queue: TaskQueue, task: Task, work, lease_config: dict) -> bool:
+    """
+    Run work for task, heartbeating its lease. Returns False if the lease was
+    lost to another worker, in which case the work is abandoned.
+    """
+    work = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {work}, timeout=lease_config["heartbeat_seconds"]
+            )
+            if done:
+                work.result()
+                return True
 
-if __name__ == "__main__":
-    log.info("Starting new pipeline run")
-    dates, n_top = process_args()
+            if not queue.heartbeat(task, lease_config["lease_seconds"]):
+                log.warning(f"Lease lost for task {task.task_id} - Abandoning")
+                # Never start the next date while this one still holds browsers
+                work.cancel()
+                await asyncio.wait({work})
+                return False
+    except asyncio.CancelledError:
+        # Let work save its progress before the session closes under it
+        work.cancel()
+        await asyncio.wait({work})
+        raise
+
+
+async def get_queued_top_articles(
+    queue: TaskQueue,
+    worker_id: str,
+    scraper_config: dict,
+    store: ResultStore,
+    ledger: ArticleLedger,
+    results: ObjectStore = None,
+    skip_published: bool = False,
+) -> None:
+    """Lease date tasks from a shared queue until none are left"""
+    lease_config = scraper_config["task_queue"]
+    completed_dates = set(store.completed_dates())
+
+    async with ScrapeSession(
+        scraper_config, ledger, results, worker_id, skip_published
+    ) as session:
+        while True:
+            task = queue.lease(worker_id, lease_config["lease_seconds"])
+            if task is None:
+                log.info(f"Task queue drained - {queue.counts()}")
+                return
+
+            date_ = datetime.strptime(task.task_id, "%Y-%m-%d").date()
+            if date_ in completed_dates:
+                session.publish(date_, store)
+                queue.complete(task)
+                continue
+
+            log.info(f"Leased task {task.task_id} as {worker_id}")
+            try:
+                work = session.scrape_date(date_, store)
+                if await run_leased(queue, task, work, lease_config):
+                    queue.complete(task)
+            except BaseException:
+                queue.release(task)
+                raise
+
+
+async def preemptible(work) -> bool:
+    """
+    Run work until done or the process gets SIGTERM, as a spot VM does about
+    30s before shutdown. Work is then cancelled, saving its progress on the
+    way out. Returns False if it was stopped.
+    """
+    work = asyncio.ensure_future(work)
+    loop = asyncio.get_event_loop()
+    stopped = []
+
+    def stop() -> None:
+        # A supervisor forwards the signal the whole process group also gets
+        if not stopped:
+            stopped.append(True)
+            log.warning("SIGTERM received - Saving progress and stopping")
+            work.cancel()
+
+    loop.add_signal_handler(signal.SIGTERM, stop)
+    try:
+        await work
+        return True
+    except asyncio.CancelledError:
+        if not stopped:
+            raise
+        return False
+    finally:
+        loop.remove_signal_handler(signal.SIGTERM)
+
+
+def run_pipeline(argv: List = None) -> None:
+    """
+    Scrape dates given on the command line or leased from --queue. Exits with
+    PREEMPTED_EXIT_CODE if stopped by SIGTERM, once progress is saved.
+    """
+    dates, args = process_args(argv)
+    if args.json_log:
+        logs.enable_json_lines(args.json_log)
     scraper_config = load_config("webscraper/scraper_config.yaml")
-    scraper_config["n_top_comments"] = n_top
-    top_articles = asyncio.run(
-        get_top_articles(dates=dates, scraper_config=scraper_config)
+    scraper_config["n_top_comments"] = args.n_top_comments
+    if args.process:
+        scraper_config["metrics"]["worker"] = args.process
+    store = ResultStore()
+    ledger = ArticleLedger(
+        **scraper_config["cache"], n_top_comments=args.n_top_comments
     )
-    save_output(top_articles=top_articles, date_range=dates)
+    results = connect_object_store(args.results_uri) if args.results_uri else None
+    if args.queue:
+        queue = connect_task_queue(args.queue)
+        completed = asyncio.run(
+            preemptible(
+                get_queued_top_articles(
+                    queue=queue,
+                    worker_id=args.worker_id,
+                    scraper_config=scraper_config,
+                    store=store,
+                    ledger=ledger,
+                    results=results,
+                    skip_published=args.skip_published,
+                )
+            )
+        )
+        queue.close()
+        dates = store.completed_dates()
+    else:
+        completed = asyncio.run(
+            preemptible(
+                get_top_articles(
+                    dates=dates,
+                    scraper_config=scraper_config,
+                    store=store,
+                    ledger=ledger,
+                    results=results,
+                    worker_id=args.worker_id,
+                    skip_published=args.skip_published,
+                )
+            )
+        )
+    log.info(f"Article cache for run - {ledger.hits} hits, {ledger.misses} misses")
+    ledger.close()
+    if not completed:
+        log.warning("Run stopped before finishing - Rerun to resume")
+        sys.exit(PREEMPTED_EXIT_CODE)
+
+    # Under a supervisor, output is built once every process has finished
+    if dates and not args.process:
+        save_output(store=store, date_range=dates)
+        if args.weekly:
+            save_weekly_output(
+                store=store, date_range=dates, k=scraper_config["top_k"]
+            )
+
+
+if __name__ == "__main__":
+    log.info("Starting new pipeline run")
+    run_pipeline()
@@ -1,237 +1,465 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from time import sleep
-from typing import Dict, List, Union
+from functools import partial
+from typing import Callable, Dict, List, Set, Tuple, Union
 
 import pandas as pd
 from selenium import webdriver
 from selenium.common import StaleElementReferenceException
-from selenium.common.exceptions import (
-    ElementClickInterceptedException,
-    TimeoutException,
-)
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 from typing_extensions import Literal
 
 from src.utils import logger as logs
+from src.utils.memory import MB, descendants_rss, process_rss
+from src.webscraper.consent import load_consent_cookies, save_consent_cookies
 from src.webscraper.dates import get_dates_article_urls, get_week_num
+from src.webscraper.metrics import ScrapeMetrics
+from src.webscraper.top_articles import (
+    TopArticles,
+    create_df_output,
+    resume_top_articles,
+)
+from src.webscraper.waits import AdaptiveWaiter
 
 log = logs.CustomLogger(__name__)
 
+# Any article will do, the consent pop-up is dismissed for the whole session
+CONSENT_URL = (
+    "https://www.dailymail.co.uk/wires/ap/article-11350651/"
+    "Australia-reveal-economic-plan-deteriorating-outlook.html#html"
+)
+# Bytes and requests the page reports through the Resource Timing API.
+# Cross-origin responses without Timing-Allow-Origin report 0 bytes, so this
+# is a lower bound that is comparable between runs.
+TRANSFER_SCRIPT = """
+const nav = performance.getEntriesByType("navigation")[0];
+const resources = performance.getEntriesByType("resource");
+return {
+    bytes: resources.reduce((n, r) => n + r.transferSize, nav ? nav.transferSize : 0),
+    requests: resources.length + 1,
+    dom_content_loaded: nav ? nav.domContentLoadedEventEnd : null,
+};
+"""
+# Text and votes of the first n comments in a single WebDriver round trip
+EXTRACT_COMMENTS_SCRIPT = """
+const [selector, button, n] = arguments;
+const comments = Array.from(document.querySelectorAll(selector)).slice(0, n);
+return comments.map((comment) => {
+    const text = comment.querySelector(".comment-text");
+    const votes = comment.querySelector("." + button);
+    return {
+        comment: text ? text.innerText.trim() : "",
+        votes: votes ? votes.innerText.trim() : "",
+    };
+});
+"""
+
+
+def parse_comment_content(comments: List[dict], button: str) -> List[dict]:
+    """Map extracted comments onto output dicts, empty vote counts being 0"""
+    return [
+        {"comment": comment["comment"], button: int(comment["votes"] or 0)}
+        for comment in comments
+    ]
+
 
 class DailyMailScraper:
     def __init__(
         self,
         n_top_comments: int,
+        top_k: int,
         log_n_iter: int,
         chrome_args: List[str],
         element_timeout: int,
         page_load_timeout: int,
         retry_attempts: int,
-        sleep_time: int,
+        waits: dict,
+        page: dict,
+        session: dict,
+        ledger=None,
+        metrics: ScrapeMetrics = None,
+        consent_url: str = CONSENT_URL,
     ):
         self.driver = None
+        self.ledger = ledger
+        self.metrics = metrics or ScrapeMetrics()
+        self.consent_url = consent_url
+        self.executor = None
         self.n_top_comments = n_top_comments
+        self.top_k = top_k
         self.log_n_iter = log_n_iter
         self.chrome_options = Options()
         for arg in chrome_args:
             self.chrome_options.add_argument(arg)
+        # Comments widget only needs the DOM, not every image and ad on the page
+        self.chrome_options.page_load_strategy = page["load_strategy"]
+        self.block_resources = page["block_resources"]
+        self.blocked_urls = page["blocked_urls"]
+        self.measure_transfer = page["measure_transfer"]
+        if self.block_resources:
+            self.chrome_options.add_experimental_option(
+                "prefs", {"profile.managed_default_content_settings.images": 2}
+            )
         self.element_timeout = element_timeout
         self.page_load_timeout = page_load_timeout
         self.retry_attempts = retry_attempts
-        self.sleep_time = sleep_time
+        self.waiter = AdaptiveWaiter(element_timeout=element_timeout, **waits)
+        self.recycle_articles = session["recycle_articles"]
+        self.max_rss_mb = session["max_rss_mb"]
+        self.rss_check_articles = session["rss_check_articles"]
+        self.persist_consent = session["persist_consent"]
+        self.n_session_articles = 0
 
     async def __aenter__(self):
-        self.driver = webdriver.Chrome(options=self.chrome_options)
-        self.driver.set_page_load_timeout(self.page_load_timeout)
-        self.driver.maximize_window()
-        log.info("Selenium scraper initialised", prefix=logs.PREFIX)
-        await self.remove_base_pop_up()
+        # WebDriver sessions are not thread-safe, so each one gets its own thread
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            await self.start_driver()
+        except BaseException:
+            # Not entered, so __aexit__ never runs for a half-started session
+            await self.close()
+            raise
+        log.info("Selenium scraper initialised")
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        self.driver.quit()
-        self.driver = None
-        log.info("Selenium scraper safely closed", prefix=logs.PREFIX)
+        await self.close()
+        log.info("Selenium scraper safely closed")
         if exc_type is not None:
-            log.error(f"{exc_type}\n{exc_val}\n{exc_tb}", prefix=logs.PREFIX)
+            log.error(f"{exc_type}\n{exc_val}\n{exc_tb}")
 
-    def load_webpage(self, url: str) -> bool:
+    async def run_blocking(self, func: Callable, *args, **kwargs):
+        """Run blocking Selenium call on the session's own thread"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def start_driver(self) -> None:
+        """Start browser session, restoring consent from an earlier one if saved"""
+        with self.metrics.time("driver_start"):
+            self.driver = await self.run_blocking(
+                webdriver.Chrome, options=self.chrome_options
+            )
+            await self.run_blocking(
+                self.driver.set_page_load_timeout, self.page_load_timeout
+            )
+            await self.run_blocking(self.driver.maximize_window)
+            if self.block_resources:
+                await self.block_urls()
+        self.n_session_articles = 0
+
+        if not await self.restore_consent():
+            # Cookies only stand in for consent once it was actually given
+            if await self.remove_base_pop_up():
+                await self.save_consent()
+            else:
+                log.warning("Consent pop-up not dismissed - Not saving cookies")
+
+    async def close(self) -> None:
+        """Quit browser and release its thread, whether or not it fully started"""
+        if self.executor is None:
+            return
+        await self.quit_driver()
+        self.executor.shutdown(wait=False)
+        self.executor = None
+
+    async def quit_driver(self) -> None:
+        if self.driver is None:
+            return
         try:
-            self.driver.get(url)
+            await self.run_blocking(self.driver.quit)
+        except WebDriverException:
+            # Browser already gone, nothing left to close
+            pass
+        self.driver = None
+
+    async def restart_driver(self, reason: str) -> None:
+        """Replace browser session. Day's progress lives in the heap and ledger."""
+        log.info(f"Restarting browser session - {reason}")
+        await self.quit_driver()
+        await self.start_driver()
+
+    async def session_alive(self) -> bool:
+        try:
+            await self.run_blocking(getattr, self.driver, "current_url")
             return True
-        except TimeoutException:
-            log.info("Timeout occurred loading url", prefix=logs.PREFIX)
+        except WebDriverException:
+            return False
+
+    def browser_rss(self) -> int:
+        """RSS in bytes of chromedriver and every Chrome process under it"""
+        pid = self.driver.service.process.pid
+        return process_rss(pid) + descendants_rss(pid)
+
+    async def maybe_recycle(self) -> None:
+        """Restart session every recycle_articles or once above max_rss_mb"""
+        self.n_session_articles += 1
+        n_articles = self.n_session_articles
+        if self.recycle_articles and n_articles >= self.recycle_articles:
+            self.metrics.inc("driver_recycle")
+            await self.restart_driver(f"recycling after {n_articles} articles")
+            return
+
+        if not self.max_rss_mb or n_articles % self.rss_check_articles:
+            return
+        rss_mb = await self.run_blocking(self.browser_rss) / MB
+        if rss_mb > self.max_rss_mb:
+            self.metrics.inc("driver_rss_recycle")
+            await self.restart_driver(f"browser RSS {rss_mb:.0f} MB")
+
+    async def restore_consent(self) -> bool:
+        """Inject cookies saved after an earlier consent, skipping the pop-up"""
+        if not self.persist_consent:
             return False
+        cookies = load_consent_cookies(self.consent_url)
+        if not cookies:
+            return False
+
+        await self.run_blocking(
+            self.driver.execute_cdp_cmd, "Network.setCookies", {"cookies": cookies}
+        )
+        return True
 
-    def sleep_(self) -> None:
-        sleep(self.sleep_time)
+    async def save_consent(self) -> None:
+        if not self.persist_consent:
+            return
+        cookies = await self.run_blocking(
+            self.driver.execute_cdp_cmd, "Network.getAllCookies", {}
+        )
+        save_consent_cookies(self.consent_url, cookies["cookies"])
+
+    async def block_urls(self) -> None:
+        """Block url patterns through DevTools for every page in the session"""
+        await self.run_blocking(self.driver.execute_cdp_cmd, "Network.enable", {})
+        await self.run_blocking(
+            self.driver.execute_cdp_cmd,
+            "Network.setBlockedURLs",
+            {"urls": self.blocked_urls},
+        )
+
+    async def record_transfer(self) -> None:
+        transfer = await self.run_blocking(self.driver.execute_script, TRANSFER_SCRIPT)
+        self.metrics.inc("page_bytes", int(transfer["bytes"]))
+        self.metrics.inc("page_requests", transfer["requests"])
+        if transfer["dom_content_loaded"] is not None:
+            self.metrics.observe(
+                "dom_content_loaded", transfer["dom_content_loaded"] / 1000
+            )
+
+    async def load_webpage(self, url: str) -> bool:
+        try:
+            with self.metrics.time("page_load"):
+                await self.run_blocking(self.driver.get, url)
+            return True
+        except TimeoutException:
+            self.metrics.inc("page_load_timeout")
+            log.info("Timeout occurred loading url")
+            return False
 
     async def refresh_driver(self) -> None:
-        self.driver.refresh()
-        await self.remove_base_pop_up()
+        # Consent cookies survive a refresh, so the pop-up needs no second visit
+        try:
+            await self.run_blocking(self.driver.refresh)
+        except TimeoutException:
+            pass
+        except WebDriverException as e:
+            await self.restart_driver(f"refresh failed: {e.msg}")
 
-    async def remove_base_pop_up(self):
-        """Load random article and remove 'Got it!' pop-up for session"""
+    async def remove_base_pop_up(self) -> bool:
+        """
+        Load random article and remove 'Got it!' pop-up for session, returning
+        whether it was clicked
+        """
         if self.driver is None:
             raise RuntimeError("webdriver instance not initialized")
 
-        sample_url = (
-            "https://www.dailymail.co.uk/wires/ap/article-11350651/"
-            "Australia-reveal-economic-plan-deteriorating-outlook.html#html"
-        )
-        if self.load_webpage(sample_url):
-            await self.click_dynamic_element(By.XPATH, "//button[text()='Got it']")
+        if not await self.load_webpage(self.consent_url):
+            return False
+        with self.metrics.time("popup"):
+            return await self.click_dynamic_element(
+                By.XPATH, "//button[text()='Got it']"
+            )
 
-    async def get_dynamic_elements_by_custom(self, search_type: By, string: str):
+    async def wait_for_element(self, search_type: By, string: str) -> bool:
         try:
-            self.sleep_()
-            condition = EC.presence_of_all_elements_located((search_type, string))
-            wait = WebDriverWait(self.driver, self.element_timeout)
-            element = wait.until(condition)
-            return element
+            await self.run_blocking(
+                self.waiter.presence_of, self.driver, (search_type, string)
+            )
+            return True
         except TimeoutException:
             log.warning(
-                f"Timeout error: could not retrieve {search_type} {string}",
-                prefix=logs.PREFIX,
+                f"Timeout error: could not retrieve {search_type} {string}"
             )
+            return False
+
+    async def get_comments(self, selector: str, button: str, n: int) -> List[dict]:
+        """Wait for the first comment, then read the first n in one call"""
+        if not await self.wait_for_element(By.CSS_SELECTOR, selector):
             return []
 
+        comments = await self.run_blocking(
+            self.driver.execute_script, EXTRACT_COMMENTS_SCRIPT, selector, button, n
+        )
+        return parse_comment_content(comments, button)
+
     async def click_dynamic_element(self, search_type: By, string: str) -> bool:
         try:
-            self.sleep_()
-            condition = EC.element_to_be_clickable((search_type, string))
-            element = WebDriverWait(self.driver, self.element_timeout).until(condition)
-            element.click()
-            return True
-        except ElementClickInterceptedException:
-            log.debug(
-                f"Pop up prevented {string} element from being clicked",
-                prefix=logs.PREFIX,
+            await self.run_blocking(
+                self.waiter.click, self.driver, (search_type, string)
             )
-            # # TODO: fix recursion error
-            # sleep(2)
-            # await self.click_dynamic_element(search_type, string)
-            return False
+            return True
         except TimeoutException:
             log.debug(
                 f"Timeout error: could not retrieve {search_type} {string} - "
-                "No comments available",
-                prefix=logs.PREFIX,
+                "No comments available"
             )
             return False
 
     async def get_button_comments(
-        self, comment_type: Literal["Best rated", "Worst rated"]
-    ) -> List[Dict[str, Union[str, int]]]:
+        self,
+        comment_type: Literal["Best rated", "Worst rated"],
+        would_keep: Callable[[int], bool] = None,
+    ) -> Tuple[List[Dict[str, Union[str, int]]], bool]:
         """
-        Retrieve comment body, upvotes and downvotes. Some articles have zero comments, hence just return empty list
+        Retrieve comment body, upvotes and downvotes. Some articles have zero comments, hence just return empty list.
+        If would_keep rejects the upvotes of the first best rated comment, only it
+        is returned and the "Show More" click and remaining extraction are skipped.
+        Also returns complete, False when the list was cut short, so the
+        ledger records the article as partial.
         """
-        comment_section = await self.click_dynamic_element(
-            By.XPATH, f"//a[text()='{comment_type}']"
-        )
+        with self.metrics.time("best_rated_click"):
+            comment_section = await self.click_dynamic_element(
+                By.XPATH, f"//a[text()='{comment_type}']"
+            )
         if not comment_section:
-            return []
+            return [], True
 
         button_cls = {
             "Best rated": "rating-button-up",
             "Worst rated": "rating-button-down",
         }
         button = button_cls[comment_type]
+        comment_selector = '[class^="comment comment-"]'
 
-        if comment_type == "Best rated" and self.n_top_comments > 1:
-            await self.click_dynamic_element(By.XPATH, "//button[text()='Show More']")
-
-        comment_divs = await self.get_dynamic_elements_by_custom(
-            By.CSS_SELECTOR, '[class^="comment comment-"]'
-        )
-        return self.get_comment_content(
-            comment_divs[: self.n_top_comments], button=button
-        )
+        if comment_type == "Best rated" and would_keep is not None:
+            with self.metrics.time("extraction"):
+                first_comment = await self.get_comments(comment_selector, button, 1)
+            if self.n_top_comments == 1 or not first_comment:
+                return first_comment, True
+            if not would_keep(first_comment[0][button]):
+                self.metrics.inc("show_more_skipped")
+                return first_comment, False
 
-    @staticmethod
-    def get_comment_content(comment_divs, button) -> List[dict]:
-        comment_content = []
-        for i, comment in enumerate(comment_divs):
-            comment_text = comment.find_element(By.CLASS_NAME, "comment-text").text
-            votes = comment.find_element(By.CLASS_NAME, button).text
-            if votes == "":
-                votes = 0
+        if comment_type == "Best rated" and self.n_top_comments > 1:
+            with self.metrics.time("show_more"):
+                await self.click_dynamic_element(
+                    By.XPATH, "//button[text()='Show More']"
+                )
 
-            data_dict = {"comment": comment_text, button: int(votes)}
-            comment_content.append(data_dict)
+        with self.metrics.time("extraction"):
+            comments = await self.get_comments(
+                comment_selector, button, self.n_top_comments
+            )
+        return comments, True
 
-        return comment_content
-
-    @staticmethod
-    def create_df_output(
-        comments: List[Dict], url: str, date_: date, article_num: int
-    ) -> pd.DataFrame:
-        df = pd.DataFrame(comments).drop_duplicates()
-        df["article_num"] = article_num
-        df["url"] = url
-        df["date"] = date_
-        df = df.set_index("date")
-        return df
+    create_df_output = staticmethod(create_df_output)
 
     async def process_article(
-        self,
-        url: str,
-        top_upvotes: int,
-        top_article: pd.DataFrame,
-        date_: date,
-        i: int,
-    ):
-        """Process single article"""
-        if not self.load_webpage(url):
-            return top_upvotes, top_article
+        self, url: str, top_articles: TopArticles, date_: date, i: int
+    ) -> None:
+        """Process single article, offering it to the day's top articles"""
+        if not await self.load_webpage(url):
+            self.record_failed(date_, i, url)
+            return
 
-        top_comments = await self.get_button_comments(comment_type="Best rated")
+        top_comments, complete = await self.get_button_comments(
+            comment_type="Best rated",
+            # The heap's minimum only rises, so a rejected article never enters
+            would_keep=lambda upvotes: top_articles.would_keep(upvotes, i),
+        )
+        if self.measure_transfer:
+            await self.record_transfer()
+        if self.ledger is not None:
+            # A cut short row must not be reused where all comments are needed
+            n_top_comments = None if complete else len(top_comments)
+            self.ledger.record(date_, i, url, top_comments, n_top_comments)
         if not top_comments:
-            return top_upvotes, top_article
+            return
 
         top_comment_upvotes = top_comments[0]["rating-button-up"]
-        if top_comment_upvotes <= top_upvotes:
-            return top_upvotes, top_article
+        if top_articles.push(top_comment_upvotes, i, url, top_comments):
+            log.info(
+                f"New top comment found with {top_comment_upvotes} upvotes - {url}"
+            )
 
-        log.info(
-            f"New top comment found with {top_comment_upvotes} upvotes - {url}",
-            prefix=logs.PREFIX,
-        )
-        top_upvotes = top_comment_upvotes
-        top_article = self.create_df_output(
-            comments=top_comments,
-            url=url,
-            date_=date_,
-            article_num=i,
-        )
-        return top_upvotes, top_article
+    async def process_url(
+        self, url: str, top_articles: TopArticles, date_: date, i: int
+    ) -> None:
+        """
+        Process single article, refreshing the session and retrying on failure.
+        A crashed browser is replaced and the article retried.
+        """
+        with self.metrics.time("article"):
+            for attempt in range(self.retry_attempts + 1):
+                if attempt:
+                    self.metrics.inc("retry")
+                try:
+                    await self.process_article(url, top_articles, date_, i)
+                    break
+                except (TimeoutException, StaleElementReferenceException):
+                    log.info(
+                        "Stale element reference or timeout occurred. Retrying..."
+                    )
+                    with self.metrics.time("refresh"):
+                        await self.refresh_driver()
+                except WebDriverException as e:
+                    if await self.session_alive():
+                        log.info(f"WebDriver error: {e.msg}. Retrying...")
+                        continue
+                    self.metrics.inc("driver_crash")
+                    await self.restart_driver(f"session lost: {e.msg}")
+            else:
+                self.record_failed(date_, i, url)
 
-    async def process_date(self, date_: date) -> pd.DataFrame:
+        await self.maybe_recycle()
+
+    def record_failed(self, date_: date, i: int, url: str) -> None:
+        self.metrics.inc("failed")
+        if self.ledger is not None:
+            self.ledger.record_failed(date_, i, url)
+
+    async def process_date(
+        self,
+        date_: date,
+        article_urls: List[str] = None,
+        skip_urls: Set[str] = frozenset(),
+    ) -> pd.DataFrame:
         """Process all articles on date"""
-        article_urls = get_dates_article_urls(date_)
+        if article_urls is None:
+            article_urls = get_dates_article_urls(date_)
         n_articles = len(article_urls)
-        top_upvotes = 0
-        top_article = None
+        done_urls, top_articles = resume_top_articles(
+            self.ledger, date_, self.top_k, article_urls
+        )
         week_num = get_week_num(date_)
+        done_urls |= skip_urls
 
         # For each article on date, check number of top-rated comment upvotes
         for i, url in enumerate(article_urls):
-            logs.PREFIX = f"Week {week_num} | {date_} | {i + 1}/{n_articles} articles"
+            if url in done_urls:
+                continue
+
+            prefix = f"Week {week_num} | {date_} | {i + 1}/{n_articles} articles"
+            logs.set_prefix(prefix)
 
             if (i + 1) % self.log_n_iter == 0:
-                log.info(logs.PREFIX)
+                log.info(prefix)
 
-            for _ in range(self.retry_attempts + 1):
-                try:
-                    top_upvotes, top_article = await self.process_article(
-                        url, top_upvotes, top_article, date_, i
-                    )
-                    break
-                except (TimeoutException, StaleElementReferenceException):
-                    log.info("Stale element reference or timeout occurred. Retrying...", prefix=logs.PREFIX)
-                    await self.refresh_driver()
+            await self.process_url(url, top_articles, date_, i)
 
-        return top_article
+        log.info(f"Waits: {self.waiter.summary(n_articles)}")
+        self.waiter.reset_decisions()
+        self.metrics.end_day(date_, n_articles)
+        return top_articles.to_df(date_)
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src import CACHE_DIR
+from src.webscraper.dates import ARCHIVE_TIMEOUT, get_dates_article_urls
+
+SITEMAP_CACHE_DIR = os.path.join(CACHE_DIR, "sitemaps")
+
+
+def cache_path(d: date) -> str:
+    return os.path.join(SITEMAP_CACHE_DIR, f"{d.strftime('%Y%m%d')}.json")
+
+
+def load_cached_article_urls(d: date) -> Optional[List[str]]:
+    path = cache_path(d)
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_cached_article_urls(d: date, article_urls: List[str]) -> None:
+    """Write atomically so an interrupted run never leaves a partial entry"""
+    os.makedirs(SITEMAP_CACHE_DIR, exist_ok=True)
+    path = cache_path(d)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(article_urls, f)
+    os.replace(tmp_path, path)
+
+
+class SitemapPrefetcher:
+    """
+    Fetch sitemap archives for a whole date range in the background over one
+    pooled session. Archives older than cache_after_days no longer change, so
+    they are cached on disk by date and never refetched.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        retries: int,
+        backoff_factor: float,
+        request_timeout: float = ARCHIVE_TIMEOUT,
+        cache_after_days: int = 2,
+    ):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.request_timeout = request_timeout
+        self.cache_after_days = cache_after_days
+        self.session = None
+        self.executor = None
+        self.futures: Dict[date, Future] = {}
+
+    def __enter__(self):
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.max_workers, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        for future in self.futures.values():
+            future.cancel()
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        self.executor = None
+        self.session = None
+        self.futures = {}
+
+    def fetch(self, d: date) -> List[str]:
+        article_urls = load_cached_article_urls(d)
+        if article_urls is not None:
+            return article_urls
+
+        article_urls = get_dates_article_urls(
+            d, session=self.session, timeout=self.request_timeout
+        )
+        # Recent archives can still be growing, e.g. yesterday's just after
+        # midnight, so only settled days are cached
+        if d <= date.today() - timedelta(days=self.cache_after_days):
+            save_cached_article_urls(d, article_urls)
+
+        return article_urls
+
+    def prefetch(self, dates: List[date]) -> None:
+        for d in dates:
+            if d not in self.futures:
+                self.futures[d] = self.executor.submit(self.fetch, d)
+
+    async def get(self, d: date) -> List[str]:
+        """Await article urls for date, fetching now if not already queued"""
+        self.prefetch([d])
+        return await asyncio.wrap_future(self.futures.pop(d))
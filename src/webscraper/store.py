@@ -0,0 +1,100 @@
+import os
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src import DATA_DIR
+
+RESULTS_DIR = os.path.join(DATA_DIR, "results")
+PARTITION_PREFIX = "date="
+PARTITION_SUFFIX = ".parquet"
+
+SCHEMA = pa.schema(
+    [
+        ("date", pa.date32()),
+        ("comment", pa.string()),
+        ("rating-button-up", pa.int64()),
+        ("article_num", pa.int64()),
+        ("url", pa.string()),
+    ]
+)
+DICTIONARY_COLUMNS = ["date", "url"]
+
+
+class ResultStore:
+    """
+    Append-only store holding one small Parquet partition per scraped date.
+    Partitions are written atomically, so a crash mid-write never loses
+    previously completed days, and reads only touch the partitions requested.
+    """
+
+    def __init__(self, root: str = RESULTS_DIR):
+        self.root = root
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.root})"
+
+    def partition_path(self, date_: date) -> str:
+        filename = f"{PARTITION_PREFIX}{date_.isoformat()}{PARTITION_SUFFIX}"
+        return os.path.join(self.root, filename)
+
+    def append(self, df: Optional[pd.DataFrame], date_: date) -> None:
+        """Write partition for date. An empty frame still marks the day as done"""
+        os.makedirs(self.root, exist_ok=True)
+        if df is None:
+            table = SCHEMA.empty_table()
+        else:
+            df = df.reset_index()[SCHEMA.names]
+            table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+
+        path = self.partition_path(date_)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path, use_dictionary=DICTIONARY_COLUMNS)
+        os.replace(tmp_path, path)
+
+    def completed_dates(self) -> List[date]:
+        """Dates with a partition, read from file names only"""
+        if not os.path.exists(self.root):
+            return []
+
+        dates = []
+        for file in os.listdir(self.root):
+            if file.startswith(PARTITION_PREFIX) and file.endswith(PARTITION_SUFFIX):
+                date_str = file[len(PARTITION_PREFIX) : -len(PARTITION_SUFFIX)]
+                dates.append(datetime.strptime(date_str, "%Y-%m-%d").date())
+
+        return sorted(dates)
+
+    def iter_partitions(self, dates: List[date]) -> Iterator[pd.DataFrame]:
+        """Yield stored partitions for dates in date order, skipping missing ones"""
+        for date_ in sorted(dates):
+            path = self.partition_path(date_)
+            if os.path.exists(path):
+                yield pq.read_table(path).to_pandas()
+
+    def load(self, dates: List[date] = None) -> pd.DataFrame:
+        """Load partitions for dates, or all partitions if none given"""
+        dates = self.completed_dates() if dates is None else dates
+        partitions = list(self.iter_partitions(dates))
+        if not partitions:
+            return SCHEMA.empty_table().to_pandas().set_index("date")
+
+        return pd.concat(partitions).set_index("date")
+
+    def compact(self, filepath: str, dates: List[date]) -> int:
+        """
+        Stream partitions for dates into a single csv one at a time, so memory
+        stays bounded by the largest partition. Returns number of rows written.
+        """
+        tmp_path = f"{filepath}.tmp"
+        n_rows = 0
+        with open(tmp_path, "w", newline="") as f:
+            for df in self.iter_partitions(dates):
+                df.to_csv(f, header=f.tell() == 0, index=False)
+                n_rows += len(df)
+
+        os.replace(tmp_path, filepath)
+        return n_rows
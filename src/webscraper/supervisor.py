@@ -0,0 +1,232 @@
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import src.utils.logger as logs
+from src.cloud_sdk.preemption import watch_preemption
+from src.configs.config import load_config
+from src.utils.memory import MB, available_memory, cpu_count
+from src.webscraper.run import (
+    PREEMPTED_EXIT_CODE,
+    load_checkpoint,
+    process_args,
+    save_output,
+    save_weekly_output,
+)
+from src.webscraper.store import ResultStore
+from src.webscraper.task_queue import PENDING, TaskQueue, connect_task_queue
+
+log = logs.CustomLogger(__name__)
+
+"""
+Run several scraper processes on one machine, sized to its cores and memory.
+Takes the same arguments as run.py, which it replaces on instances:
+
+python webscraper/supervisor.py --start-date 01/03/2023 --end-date 31/03/2023
+    --n-top-comments 1 --processes 3
+
+Dates are put on a local task queue (or a shared --queue is used as given),
+so a process that finishes early keeps leasing days instead of idling.
+Every process writes its own date partitions to the shared result store,
+and the combined output is saved once all of them have exited.
+
+SIGTERM (e.g. spot preemption) is passed on to every process, which saves
+its partial day and exits. Nothing is restarted and the supervisor exits
+with the same status, leaving the remaining dates to a replacement.
+"""
+
+RUN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run.py")
+
+
+def parse_args(argv=None) -> Tuple[argparse.Namespace, List[str]]:
+    """Supervisor arguments, leaving the rest for run.py"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--processes", type=int, default=0, help="0 to size to cores and memory"
+    )
+    return parser.parse_known_args(argv)
+
+
+def browsers_per_process(scraper_config: dict) -> int:
+    if scraper_config["backend"] == "http":
+        return 0
+    return scraper_config["n_workers"]
+
+
+def plan_processes(
+    n_cores: int, available_mb: float, n_browsers: int, supervisor_config: dict
+) -> int:
+    """
+    Processes the machine can run at once. Browser backends are bound by how
+    many Chrome sessions each core and the free memory can carry; the HTTP
+    backend runs one event loop per core.
+    """
+    if n_browsers == 0:
+        n_processes = n_cores
+    else:
+        by_cpu = n_cores * supervisor_config["browsers_per_core"] // n_browsers
+        process_mb = (
+            n_browsers * supervisor_config["browser_mb"]
+            + supervisor_config["process_mb"]
+        )
+        by_memory = (available_mb - supervisor_config["reserve_mb"]) // process_mb
+        n_processes = int(min(by_cpu, by_memory))
+
+    if supervisor_config["max_processes"]:
+        n_processes = min(n_processes, supervisor_config["max_processes"])
+    return max(1, n_processes)
+
+
+def worker_id(args: argparse.Namespace, name: str) -> str:
+    return f"{args.worker_id}-{name}"
+
+
+def run_command(args: argparse.Namespace, queue_uri: str, name: str) -> List[str]:
+    """Scraper process leasing dates from queue, named for its metrics"""
+    command = [
+        sys.executable,
+        RUN_SCRIPT,
+        "--queue",
+        queue_uri,
+        "--n-top-comments",
+        str(args.n_top_comments),
+        "--worker-id",
+        worker_id(args, name),
+        "--process",
+        name,
+    ]
+    if args.results_uri:
+        command += ["--results-uri", args.results_uri]
+    if args.json_log:
+        command += ["--json-log", args.json_log]
+    if args.skip_published:
+        command.append("--skip-published")
+    return command
+
+
+def supervise(
+    commands: Dict[str, List[str]],
+    queue: TaskQueue,
+    max_restarts: int,
+    poll_seconds: float = 1,
+) -> Dict[str, int]:
+    """
+    Run every process, keyed by its worker id, until it exits. One that fails
+    has its leased dates returned to the queue and is restarted while work is
+    left, up to max_restarts times across all processes. Returns exit codes.
+    """
+    processes = {name: subprocess.Popen(cmd) for name, cmd in commands.items()}
+    exit_codes = {}
+    restarts = 0
+    stopping = []
+
+    def stop(signum, frame) -> None:
+        stopping.append(signum)
+        for process in processes.values():
+            process.send_signal(signum)
+
+    previous_handler = signal.signal(signal.SIGTERM, stop)
+    try:
+        while processes:
+            time.sleep(poll_seconds)
+            for name, process in list(processes.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+
+                processes.pop(name)
+                exit_codes[name] = code
+                if code == 0:
+                    log.info(f"Process {name} finished")
+                    continue
+
+                released = queue.release_worker(name)
+                log.warning(
+                    f"Process {name} exited with {code} - "
+                    f"{released} leased dates returned to queue"
+                )
+                if stopping:
+                    continue
+                if restarts < max_restarts and queue.counts().get(PENDING):
+                    restarts += 1
+                    log.info(f"Restarting process {name} ({restarts}/{max_restarts})")
+                    processes[name] = subprocess.Popen(commands[name])
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+
+    return exit_codes
+
+
+def run_supervisor(argv: List = None) -> None:
+    supervisor_args, run_argv = parse_args(argv)
+    dates, args = process_args(run_argv)
+    scraper_config = load_config("webscraper/scraper_config.yaml")
+    supervisor_config = scraper_config["supervisor"]
+    store = ResultStore()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue_uri = args.queue
+        if queue_uri is None:
+            queue_uri = f"sqlite://{os.path.join(tmp, 'dates.sqlite')}"
+            dates_left = load_checkpoint(store, dates)
+            queue = connect_task_queue(queue_uri)
+            queue.put([d.isoformat() for d in dates_left])
+            n_tasks = len(dates_left)
+        else:
+            queue = connect_task_queue(queue_uri)
+            n_tasks = queue.counts().get(PENDING, 0)
+
+        n_cores = cpu_count()
+        available_mb = available_memory() / MB
+        n_processes = supervisor_args.processes or plan_processes(
+            n_cores=n_cores,
+            available_mb=available_mb,
+            n_browsers=browsers_per_process(scraper_config),
+            supervisor_config=supervisor_config,
+        )
+        n_processes = max(1, min(n_processes, n_tasks))
+        log.info(
+            f"Running {n_processes} processes on {n_cores} cores, "
+            f"{available_mb:.0f} MB available - {queue.counts()}"
+        )
+
+        commands = {
+            worker_id(args, f"p{i}"): run_command(args, queue_uri, f"p{i}")
+            for i in range(n_processes)
+        }
+        exit_codes = supervise(
+            commands, queue, max_restarts=supervisor_config["max_restarts"]
+        )
+        log.info(f"All processes exited {exit_codes} - {queue.counts()}")
+        queue.close()
+
+    # A process can also be signalled before it has set up its own handler
+    if set(exit_codes.values()) & {PREEMPTED_EXIT_CODE, -signal.SIGTERM}:
+        log.warning("Supervisor stopped before finishing - Rerun to resume")
+        sys.exit(PREEMPTED_EXIT_CODE)
+
+    if args.queue:
+        dates = store.completed_dates()
+    missing = sorted(set(dates) - set(store.completed_dates()))
+    if missing:
+        log.warning(f"{len(missing)} dates left unscraped, from {missing[0]}")
+    if dates:
+        save_output(store=store, date_range=dates)
+    if dates and args.weekly:
+        save_weekly_output(store=store, date_range=dates, k=scraper_config["top_k"])
+
+
+if __name__ == "__main__":
+    log.info(f"Starting supervisor on {socket.gethostname()}")
+    watch_preemption()
+    run_supervisor()
@@ -0,0 +1,284 @@
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from google.cloud import storage
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+
+
+class Task(NamedTuple):
+    task_id: str
+    worker_id: str
+
+
+class TaskQueue(ABC):
+    """
+    Shared queue of tasks leased by workers. A lease must be kept alive with
+    heartbeats; once it expires the task goes back to pending for any worker
+    to pick up. Only a shared backend can be used by workers on several VMs.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def put(self, task_ids: List[str]) -> None:
+        pass
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        """Lease next pending task, or None if nothing is left to lease"""
+
+    @abstractmethod
+    def heartbeat(self, task: Task, lease_seconds: float) -> bool:
+        """Extend lease, returning False if it was lost to another worker"""
+
+    @abstractmethod
+    def complete(self, task: Task) -> None:
+        """Mark task done, unless its lease was lost to another worker"""
+
+    @abstractmethod
+    def release(self, task: Task) -> None:
+        """Return task to pending after a failure"""
+
+    @abstractmethod
+    def release_worker(self, worker_id: str) -> int:
+        """Return every task leased by worker to pending, e.g. after it died"""
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """Local backend, shared by every worker process on one machine"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(CREATE_TABLE)
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.path})"
+
+    def put(self, task_ids: List[str]) -> None:
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO tasks (task_id, status) VALUES (?, ?)",
+            [(task_id, PENDING) for task_id in task_ids],
+        )
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        now = time.time()
+        # Take the write lock up front so two workers never lease the same task
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, worker_id = NULL "
+                "WHERE status = ? AND lease_expires < ?",
+                (PENDING, LEASED, now),
+            )
+            row = self.conn.execute(
+                "SELECT task_id FROM tasks WHERE status = ? ORDER BY task_id LIMIT 1",
+                (PENDING,),
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE task_id = ?",
+                (LEASED, worker_id, now + lease_seconds, row[0]),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return Task(task_id=row[0], worker_id=worker_id)
+
+    def heartbeat(self, task: Task, lease_seconds: float) -> bool:
+        cursor = self.conn.execute(
+            "UPDATE tasks SET lease_expires = ? "
+            "WHERE task_id = ? AND worker_id = ? AND status = ?",
+            (time.time() + lease_seconds, task.task_id, task.worker_id, LEASED),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, task: Task) -> None:
+        self.conn.execute(
+            "UPDATE tasks SET status = ?, lease_expires = NULL "
+            "WHERE task_id = ? AND worker_id = ? AND status = ?",
+            (DONE, task.task_id, task.worker_id, LEASED),
+        )
+
+    def release(self, task: Task) -> None:
+        self.conn.execute(
+            "UPDATE tasks SET status = ?, worker_id = NULL, lease_expires = NULL "
+            "WHERE task_id = ? AND worker_id = ? AND status = ?",
+            (PENDING, task.task_id, task.worker_id, LEASED),
+        )
+
+    def release_worker(self, worker_id: str) -> int:
+        cursor = self.conn.execute(
+            "UPDATE tasks SET status = ?, worker_id = NULL, lease_expires = NULL "
+            "WHERE worker_id = ? AND status = ?",
+            (PENDING, worker_id, LEASED),
+        )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+        return dict(rows.fetchall())
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class GCSTaskQueue(TaskQueue):
+    """
+    Backend shared by VMs, one empty object per task in a bucket with its
+    state held in the object's metadata. Every change is a metadata patch
+    conditional on the metageneration it was read at, so of two workers
+    racing for a task only one lease succeeds.
+    """
+
+    shared = True
+
+    def __init__(self, location: str):
+        bucket, _, prefix = location.partition("/")
+        self.bucket_name = bucket
+        self.prefix = f"{prefix.strip('/')}/" if prefix.strip("/") else ""
+        self.bucket = storage.Client().bucket(bucket)
+
+    def __repr__(self):
+        return f"{__class__.__name__}(gs://{self.bucket_name}/{self.prefix})"
+
+    def blob(self, task_id: str) -> storage.Blob:
+        return self.bucket.blob(f"{self.prefix}{task_id}")
+
+    def task_blobs(self) -> List[storage.Blob]:
+        """Every task with its metadata, in task id order"""
+        blobs = self.bucket.list_blobs(prefix=self.prefix)
+        return sorted(blobs, key=lambda blob: blob.name)
+
+    def update(self, blob: storage.Blob, **state) -> bool:
+        """Patch task state, returning False if it changed since it was read"""
+        metageneration = blob.metageneration
+        metadata = blob.metadata or {}
+        blob.metadata = {**metadata, **{key: str(v) for key, v in state.items()}}
+        try:
+            blob.patch(if_metageneration_match=metageneration)
+        except (PreconditionFailed, NotFound):
+            return False
+        return True
+
+    def leased_blob(self, task: Task) -> Optional[storage.Blob]:
+        """Task's current blob if task's worker still holds its lease"""
+        blob = self.bucket.get_blob(self.blob(task.task_id).name)
+        if blob is None:
+            return None
+        metadata = blob.metadata or {}
+        held = metadata.get("status") == LEASED
+        return blob if held and metadata.get("worker_id") == task.worker_id else None
+
+    def put(self, task_ids: List[str]) -> None:
+        for task_id in task_ids:
+            blob = self.blob(task_id)
+            blob.metadata = {"status": PENDING, "worker_id": "", "attempts": "0"}
+            try:
+                blob.upload_from_string(b"", if_generation_match=0)
+            except PreconditionFailed:
+                # Already queued, as with INSERT OR IGNORE
+                pass
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Task]:
+        now = time.time()
+        for blob in self.task_blobs():
+            metadata = blob.metadata or {}
+            status = metadata.get("status")
+            expired = status == LEASED and float(metadata["lease_expires"]) < now
+            if status != PENDING and not expired:
+                continue
+            leased = self.update(
+                blob,
+                status=LEASED,
+                worker_id=worker_id,
+                lease_expires=now + lease_seconds,
+                attempts=int(metadata.get("attempts", 0)) + 1,
+            )
+            if leased:
+                task_id = blob.name[len(self.prefix) :]
+                return Task(task_id=task_id, worker_id=worker_id)
+        return None
+
+    def heartbeat(self, task: Task, lease_seconds: float) -> bool:
+        blob = self.leased_blob(task)
+        if blob is None:
+            return False
+        return self.update(blob, lease_expires=time.time() + lease_seconds)
+
+    def complete(self, task: Task) -> None:
+        blob = self.leased_blob(task)
+        if blob is not None:
+            self.update(blob, status=DONE, lease_expires="")
+
+    def release(self, task: Task) -> None:
+        blob = self.leased_blob(task)
+        if blob is not None:
+            self.update(blob, status=PENDING, worker_id="", lease_expires="")
+
+    def release_worker(self, worker_id: str) -> int:
+        released = 0
+        for blob in self.task_blobs():
+            metadata = blob.metadata or {}
+            if metadata.get("status") == LEASED and metadata["worker_id"] == worker_id:
+                released += self.update(
+                    blob, status=PENDING, worker_id="", lease_expires=""
+                )
+        return released
+
+    def counts(self) -> Dict[str, int]:
+        return dict(
+            Counter((blob.metadata or {}).get("status") for blob in self.task_blobs())
+        )
+
+
+TASK_QUEUE_BACKENDS = {"sqlite": SQLiteTaskQueue, "gs": GCSTaskQueue}
+
+
+def task_queue_backend(uri: str) -> type:
+    """Backend class for a '<backend>://<location>' uri"""
+    backend, sep, _ = uri.partition("://")
+    if not sep or backend not in TASK_QUEUE_BACKENDS:
+        raise ValueError(f"Unsupported task queue uri: {uri}")
+    return TASK_QUEUE_BACKENDS[backend]
+
+
+def connect_task_queue(uri: str) -> TaskQueue:
+    """
+    Open queue from a '<backend>://<location>' uri, e.g. sqlite:///tmp/q.db on
+    one machine or gs://bucket/queue across VMs
+    """
+    return task_queue_backend(uri)(uri.partition("://")[2])
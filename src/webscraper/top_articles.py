@@ -0,0 +1,120 @@
+import heapq
+from datetime import date
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from src.utils import logger as logs
+
+log = logs.CustomLogger(__name__)
+
+UPVOTES = "rating-button-up"
+
+
+def create_df_output(
+    comments: List[Dict], url: str, date_: date, article_num: int
+) -> pd.DataFrame:
+    df = pd.DataFrame(comments).drop_duplicates()
+    df["article_num"] = article_num
+    df["url"] = url
+    df["date"] = date_
+    df = df.set_index("date")
+    return df
+
+
+class TopArticles:
+    """
+    Bounded min-heap of the k articles with the most top comment upvotes.
+    Ties go to the earlier article, matching the sequential scan order.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.heap: List[Tuple[int, int, str, List[dict]]] = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __repr__(self):
+        return f"{__class__.__name__}({len(self)}/{self.k}, min={self.threshold})"
+
+    @property
+    def threshold(self) -> int:
+        """Upvotes an article must exceed to enter the heap"""
+        if len(self.heap) < self.k:
+            return 0
+        return self.heap[0][0]
+
+    def would_keep(self, upvotes: int, article_num: int) -> bool:
+        """Whether push would keep an article, with ties going to the earlier one"""
+        if upvotes <= 0:
+            return False
+        if len(self.heap) < self.k:
+            return True
+        return (upvotes, -article_num) > self.heap[0][:2]
+
+    def push(self, upvotes: int, article_num: int, url: str, comments: List[dict]):
+        """Offer article to the heap, returning whether it was kept"""
+        if not self.would_keep(upvotes, article_num):
+            return False
+
+        entry = (upvotes, -article_num, url, comments)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        else:
+            heapq.heapreplace(self.heap, entry)
+        return True
+
+    def ranked(self) -> List[Tuple[int, int, str, List[dict]]]:
+        """Entries as (upvotes, article_num, url, comments), best first"""
+        entries = sorted(self.heap, key=lambda e: e[:2], reverse=True)
+        return [(upvotes, -neg_num, url, c) for upvotes, neg_num, url, c in entries]
+
+    def to_df(self, date_: date) -> Optional[pd.DataFrame]:
+        if not self.heap:
+            return None
+
+        return pd.concat(
+            [
+                create_df_output(
+                    comments=comments, url=url, date_=date_, article_num=article_num
+                )
+                for _, article_num, url, comments in self.ranked()
+            ]
+        )
+
+
+def resume_top_articles(
+    ledger, date_: date, k: int, article_urls: List[str]
+) -> Tuple[Set[str], TopArticles]:
+    """
+    Urls on date the ledger can answer without scraping, and the heap rebuilt
+    from them. Cache hits and misses are counted towards the run's totals.
+    """
+    top_articles = TopArticles(k)
+    if ledger is None:
+        return set(), top_articles
+
+    for upvotes, article_num, url, comments in ledger.best_articles(date_, k):
+        top_articles.push(upvotes, article_num, url, comments)
+
+    cached_urls = ledger.completed_urls(date_)
+    hits = ledger.count_lookups(article_urls, cached_urls)
+    log.info(f"Article cache - {hits} hits, {len(article_urls) - hits} misses")
+    return cached_urls, top_articles
+
+
+def weekly_top_articles(df: pd.DataFrame, k: int) -> pd.DataFrame:
+    """
+    Top k articles across a week of daily results. Each day keeps its own top
+    k, so the week's top k are always among them.
+    """
+    df = df.reset_index()
+    articles = df.groupby(["date", "url"], sort=False)[UPVOTES].max()
+    articles = articles.reset_index().sort_values(
+        [UPVOTES, "date"], ascending=[False, True]
+    )
+    rank = {url: i for i, url in enumerate(articles["url"].head(k))}
+    top = df[df["url"].isin(rank)]
+    top = top.iloc[top["url"].map(rank).argsort(kind="stable")]
+    return top.set_index("date")
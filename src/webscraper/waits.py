@@ -0,0 +1,147 @@
+import math
+from collections import defaultdict, deque
+from time import perf_counter
+from typing import Callable, Deque, Dict, List, Tuple
+
+from selenium.common.exceptions import (
+    ElementClickInterceptedException,
+    TimeoutException,
+)
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+Locator = Tuple[str, str]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of unsorted values"""
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def click_when_ready(locator: Locator) -> Callable:
+    """Wait condition that clicks element as soon as it is clickable"""
+    clickable = EC.element_to_be_clickable(locator)
+
+    def _predicate(driver):
+        element = clickable(driver)
+        if not element:
+            return False
+        element.click()
+        return element
+
+    return _predicate
+
+
+class AdaptiveWaiter:
+    """
+    Poll the DOM for readiness instead of sleeping, timing every wait per
+    selector. Once enough samples are seen, the timeout for a selector is
+    tuned to its observed p95 latency, so waits on elements that never appear
+    (e.g. articles without comments) stop paying the full static timeout.
+    A timeout counts as a sample at the timeout it hit, so if loads slow down
+    the p95 climbs back instead of only fast successes being remembered.
+    """
+
+    def __init__(
+        self,
+        element_timeout: float,
+        poll_frequency: float,
+        min_timeout: float,
+        max_timeout: float,
+        timeout_margin: float,
+        min_samples: int,
+        window: int,
+        baseline_sleep: float,
+    ):
+        self.element_timeout = element_timeout
+        self.poll_frequency = poll_frequency
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_margin = timeout_margin
+        self.min_samples = min_samples
+        self.baseline_sleep = baseline_sleep
+        self.latencies: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self.decisions: Dict[str, dict] = defaultdict(
+            lambda: {"waits": 0, "timeouts": 0, "waited": 0.0, "saved": 0.0}
+        )
+
+    def timeout(self, key: str) -> float:
+        """Static timeout until warmed up, then margin over observed p95"""
+        latencies = self.latencies[key]
+        if len(latencies) < self.min_samples:
+            return self.element_timeout
+
+        tuned = percentile(list(latencies), 95) * self.timeout_margin
+        return min(max(tuned, self.min_timeout), self.max_timeout)
+
+    def until(self, driver, key: str, condition: Callable):
+        """Block until condition is truthy, raising TimeoutException on expiry"""
+        timeout = self.timeout(key)
+        wait = WebDriverWait(
+            driver,
+            timeout,
+            poll_frequency=self.poll_frequency,
+            ignored_exceptions=[ElementClickInterceptedException],
+        )
+        decision = self.decisions[key]
+        decision["waits"] += 1
+        start = perf_counter()
+        try:
+            result = wait.until(condition)
+        except TimeoutException:
+            # Latency was at least the timeout, so only a larger one can be tuned
+            self.latencies[key].append(timeout)
+            decision["timeouts"] += 1
+            decision["waited"] += timeout
+            decision["saved"] += self.baseline_sleep + self.element_timeout - timeout
+            raise
+
+        elapsed = perf_counter() - start
+        self.latencies[key].append(elapsed)
+        decision["waited"] += elapsed
+        decision["saved"] += self.baseline_sleep
+        return result
+
+    def presence_of_all(self, driver, locator: Locator):
+        return self.until(
+            driver, locator[1], EC.presence_of_all_elements_located(locator)
+        )
+
+    def presence_of(self, driver, locator: Locator):
+        return self.until(driver, locator[1], EC.presence_of_element_located(locator))
+
+    def click(self, driver, locator: Locator):
+        return self.until(driver, locator[1], click_when_ready(locator))
+
+    def reset_decisions(self) -> None:
+        """Clear decision counters, keeping latency history for tuning"""
+        self.decisions.clear()
+
+    def stats(self) -> Dict[str, dict]:
+        """Per selector wait decisions, latency percentiles and current timeout"""
+        stats = {}
+        for key, decision in self.decisions.items():
+            latencies = list(self.latencies[key])
+            stats[key] = {
+                **decision,
+                "p50": percentile(latencies, 50) if latencies else None,
+                "p95": percentile(latencies, 95) if latencies else None,
+                "timeout": self.timeout(key),
+            }
+        return stats
+
+    def summary(self, n_articles: int) -> str:
+        """Per article wait cost and saving against fixed sleep + static timeout"""
+        n_articles = max(n_articles, 1)
+        decisions = self.decisions.values()
+        waits = sum(d["waits"] for d in decisions) / n_articles
+        waited = sum(d["waited"] for d in decisions) / n_articles
+        saved = sum(d["saved"] for d in decisions) / n_articles
+        return (
+            f"{waits:.1f} waits, {waited:.2f}s waited, "
+            f"{saved:.2f}s saved per article"
+        )
@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+
+import pytest
+
+from src.cloud_sdk.autoscaler import FleetController
+from src.cloud_sdk.object_store import LocalObjectStore
+from src.cloud_sdk.simulator import STEP_SECONDS, SimulatedClock, SimulatedCompute
+from src.configs.config import load_config
+from src.webscraper.collect import published_dates
+from src.webscraper.partition import plan_date_groups
+
+ARTICLES_PER_DAY = 1000
+
+
+@pytest.fixture
+def config():
+    return dict(load_config("cloud_sdk/cloud_config.yaml")["coordinator"])
+
+
+def start_fleet(
+    tmp_path,
+    config: dict,
+    n_days: int,
+    n_instances: int = 1,
+    articles_per_second: float = None,
+    preemptions_per_hour: float = 0,
+    deadline_hours: float = None,
+    budget: float = None,
+):
+    """Controller over simulated instances, with its first instances launched"""
+    dates = [date(2023, 1, 1) + timedelta(days=i) for i in range(n_days)]
+    date_articles = {d: ARTICLES_PER_DAY for d in dates}
+    results = LocalObjectStore(str(tmp_path))
+    clock = SimulatedClock()
+    compute = SimulatedCompute(
+        results,
+        date_articles,
+        clock,
+        startup_seconds=config["startup_seconds"],
+        articles_per_second=articles_per_second or config["articles_per_second"],
+        preemptions_per_hour=preemptions_per_hour,
+    )
+    controller = FleetController(
+        compute,
+        results,
+        make_script=lambda group: ",".join(d.isoformat() for d in group),
+        date_articles=date_articles,
+        config=config,
+        price_per_hour=config["price_per_hour"],
+        deadline=deadline_hours * 3600 if deadline_hours else None,
+        budget=budget,
+        clock=clock.time,
+        sleep=clock.sleep,
+    )
+    n_instances = controller.initial_instances(n_instances)
+    costs = {d: float(n) for d, n in date_articles.items()}
+    controller.launch(plan_date_groups(dates, costs, n_instances, contiguous=True))
+    return controller, compute, clock, dates
+
+
+def test_scales_up_to_meet_deadline(tmp_path, config):
+    # Instances turn out half as fast as the controller first assumes
+    controller, compute, clock, dates = start_fleet(
+        tmp_path,
+        config,
+        n_days=20,
+        articles_per_second=config["articles_per_second"] / 2,
+        deadline_hours=24,
+    )
+    n_initial = compute.n_launched
+
+    cost, dropped = controller.run()
+
+    assert clock.now <= 24 * 3600
+    assert compute.n_launched > n_initial
+    assert compute.n_launched <= config["max_instances"]
+    assert dropped == []
+    assert published_dates(controller.results) == set(dates)
+    # Finished instances are deleted, not left billing
+    assert compute.statuses == {}
+    assert cost == pytest.approx(controller.spent())
+
+
+def test_without_deadline_keeps_initial_fleet(tmp_path, config):
+    controller, compute, clock, dates = start_fleet(
+        tmp_path, config, n_days=4, n_instances=2
+    )
+
+    controller.run()
+
+    assert compute.n_launched == 2
+    assert published_dates(controller.results) == set(dates)
+
+
+def test_records_startup_of_launched_instances(tmp_path, config):
+    controller, compute, clock, dates = start_fleet(
+        tmp_path, config, n_days=4, n_instances=2
+    )
+
+    controller.run()
+
+    assert set(compute.startups) == set(controller.launched_at)
+    for seconds in compute.startups.values():
+        assert 0 <= seconds - config["startup_seconds"] <= STEP_SECONDS
+
+
+def test_budget_stops_fleet_and_drops_dates(tmp_path, config):
+    budget = 0.1
+    controller, compute, clock, dates = start_fleet(
+        tmp_path, config, n_days=20, n_instances=2, budget=budget
+    )
+
+    cost, dropped = controller.run()
+
+    assert dropped
+    assert compute.statuses == {}
+    published = published_dates(controller.results)
+    assert published.isdisjoint(dropped)
+    assert published | set(dropped) == set(dates)
+    # Overspend is bounded by one poll interval of the fleet
+    overspend = 2 * config["poll_seconds"] / 3600 * config["price_per_hour"]
+    assert budget <= cost <= budget + overspend
+
+
+def test_replaces_preempted_instances(tmp_path, config):
+    controller, compute, clock, dates = start_fleet(
+        tmp_path, config, n_days=10, n_instances=2, preemptions_per_hour=0.5
+    )
+
+    cost, dropped = controller.run()
+
+    assert compute.n_preempted > 0
+    assert 0 < controller.replacements <= compute.n_preempted
+    assert dropped == []
+    assert published_dates(controller.results) == set(dates)
+
+
+def test_replacement_limit_drops_dates(tmp_path, config):
+    config["max_replacements"] = 1
+    controller, compute, clock, dates = start_fleet(
+        tmp_path, config, n_days=10, n_instances=2, preemptions_per_hour=2
+    )
+
+    cost, dropped = controller.run()
+
+    assert controller.replacements == 1
+    assert compute.n_launched == 3
+    assert dropped
+    published = published_dates(controller.results)
+    assert published | set(dropped) == set(dates)
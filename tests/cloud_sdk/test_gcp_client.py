@@ -0,0 +1,252 @@
+import asyncio
+import json
+from itertools import accumulate
+
+import pytest
+
+from src.cloud_sdk import gcp_client
+from src.cloud_sdk.gcp_client import BATCH_SIZE, READY_MESSAGE, GCPClient
+from src.configs.config import load_config
+
+
+class FakeRequest:
+    def __init__(self, handler, **kwargs):
+        self.handler = handler
+        self.kwargs = kwargs
+
+    def execute(self):
+        return self.handler(**self.kwargs)
+
+
+class FakeBatch:
+    def __init__(self, compute: "FakeCompute", callback):
+        self.compute = compute
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request: FakeRequest, request_id: str) -> None:
+        assert len(self.requests) < BATCH_SIZE
+        self.requests.append((request_id, request))
+
+    def execute(self) -> None:
+        self.compute.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                response, exception = request.execute(), None
+            except Exception as e:
+                response, exception = None, e
+            self.callback(request_id, response, exception)
+
+
+class FakeResource:
+    """API resource whose methods build requests that call handlers on execute"""
+
+    def __init__(self, **handlers):
+        self.handlers = handlers
+
+    def __getattr__(self, method: str):
+        handler = self.handlers[method]
+        return lambda **kwargs: FakeRequest(handler, **kwargs)
+
+
+class FakeCompute:
+    """
+    Compute API stand-in. Each instance's insert operation finishes after
+    op_polls polls, then its serial port output is served one chunk per poll.
+    """
+
+    def __init__(
+        self,
+        op_polls: int = 1,
+        serial_chunks=None,
+        fail=(),
+        op_error=(),
+        get_error=(),
+        slow=(),
+    ):
+        self.op_polls = op_polls
+        self.serial_chunks = serial_chunks or ["Setup complete\n"]
+        self.fail = set(fail)
+        self.op_error = set(op_error)
+        self.get_error = set(get_error)
+        self.slow = set(slow)
+        self.vms = {}
+        self.polls = {}
+        self.batch_sizes = []
+
+    def new_batch_http_request(self, callback) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+    def insert(self, project, zone, body):
+        name = body["name"]
+        if name in self.fail:
+            raise RuntimeError(f"quota exceeded for {name}")
+        self.vms[name] = {"name": name, "status": "PROVISIONING"}
+        return {"name": f"op-{name}", "status": "RUNNING"}
+
+    def get_operation(self, project, zone, operation):
+        name = operation[len("op-") :]
+        self.polls[name] = self.polls.get(name, 0) + 1
+        if name in self.get_error:
+            raise RuntimeError(f"operation {operation} not found")
+        if self.polls[name] < self.op_polls or name in self.slow:
+            return {"name": operation, "status": "RUNNING"}
+        if name in self.op_error:
+            return {"name": operation, "status": "DONE", "error": {"code": "X"}}
+        self.vms[name]["status"] = "RUNNING"
+        return {"name": operation, "status": "DONE"}
+
+    def serial_output(self, project, zone, instance, start):
+        """Output from offset start up to the end of the next chunk"""
+        contents = "".join(self.serial_chunks)
+        end = start
+        for chunk_end in accumulate(len(chunk) for chunk in self.serial_chunks):
+            if chunk_end > start:
+                end = chunk_end
+                break
+        return {"contents": contents[start:end], "next": str(end)}
+
+    def instances(self) -> FakeResource:
+        return FakeResource(
+            insert=self.insert,
+            getSerialPortOutput=self.serial_output,
+            list=lambda project, zone: {"items": list(self.vms.values())},
+            delete=lambda project, zone, instance: self.vms.pop(instance),
+        )
+
+    def zoneOperations(self) -> FakeResource:
+        return FakeResource(get=self.get_operation)
+
+
+class FakeClock:
+    """Replaces asyncio.sleep and monotonic, recording every delay"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.delays = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        self.delays.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(gcp_client, "monotonic", clock.monotonic)
+    monkeypatch.setattr(gcp_client.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def startup_log(tmp_path, monkeypatch):
+    path = tmp_path / "startup.jsonl"
+    monkeypatch.setattr(gcp_client, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(gcp_client, "STARTUP_LOG_PATH", str(path))
+    return path
+
+
+def make_client(compute: FakeCompute, **project) -> GCPClient:
+    config = load_config("cloud_sdk/cloud_config.yaml")
+    config["project"].update(
+        {"startup_timeout": 900, "poll_interval": 5, "max_poll_interval": 60}
+    )
+    config["project"].update(project)
+    return GCPClient(config, client=compute)
+
+
+def await_ready(client: GCPClient, names) -> dict:
+    operations = client.create_vm_instances([{"name": name} for name in names])
+    return asyncio.run(client.await_instances_ready(operations))
+
+
+def test_inserts_are_batched_and_failures_reported():
+    names = [f"tc-{i}" for i in range(250)]
+    compute = FakeCompute(fail={"tc-3", "tc-140"})
+    client = make_client(compute)
+    operations = client.create_vm_instances([{"name": name} for name in names])
+
+    assert compute.batch_sizes == [100, 100, 50]
+    assert set(operations) == set(names) - {"tc-3", "tc-140"}
+    assert operations["tc-0"]["name"] == "op-tc-0"
+
+
+def test_launch_returns_none_for_failed_inserts(monkeypatch):
+    compute = FakeCompute()
+    client = make_client(compute)
+    template = load_config(client.instance_config["instance_template"])
+    monkeypatch.setattr(
+        client, "load_instance_template", lambda script: {**template, "name": script}
+    )
+    compute.fail = {"b"}
+
+    launched = client.launch(["a", "b", "c"])
+    assert [name for name, _ in launched] == ["a", "b", "c"]
+    assert [op is None for _, op in launched] == [False, True, False]
+
+
+def test_ready_after_message_split_across_reads(clock, startup_log):
+    chunks = [
+        "Startup phase packages: 12.5s\nStartup phase bund",
+        "le: 3.0s\nStartup total: 41.2s\nSetup com",
+        "plete\n",
+    ]
+    compute = FakeCompute(op_polls=2, serial_chunks=chunks)
+    client = make_client(compute)
+    ready = await_ready(client, ["tc-a", "tc-b"])
+
+    assert set(ready) == {"tc-a", "tc-b"}
+    assert client.startup_phases["tc-a"] == {
+        "packages": 12.5,
+        "bundle": 3.0,
+        "total": 41.2,
+    }
+    records = [json.loads(line) for line in startup_log.read_text().splitlines()]
+    assert {r["instance"] for r in records} == {"tc-a", "tc-b"}
+    assert records[0]["machine_type"] == "n2-standard-2"
+    assert records[0]["phases"]["total"] == 41.2
+
+
+def test_failed_operation_is_dropped(clock):
+    compute = FakeCompute(op_error={"tc-bad"})
+    client = make_client(compute)
+    ready = await_ready(client, ["tc-ok", "tc-bad"])
+    assert set(ready) == {"tc-ok"}
+
+
+def test_polling_backs_off_until_progress(clock):
+    compute = FakeCompute(op_polls=6, serial_chunks=[READY_MESSAGE])
+    client = make_client(compute)
+    await_ready(client, ["tc-a"])
+
+    # No change for five polls, then the operation completes and output follows
+    assert clock.delays == [5, 10, 20, 40, 60, 60, 5]
+
+
+def test_timeout_names_waiting_instances(clock):
+    compute = FakeCompute(op_polls=1000)
+    client = make_client(compute, startup_timeout=100)
+    with pytest.raises(TimeoutError, match="tc-slow"):
+        await_ready(client, ["tc-slow"])
+
+
+def test_failed_requests_drop_instance_without_waiting(clock):
+    compute = FakeCompute(get_error={"tc-bad"})
+    client = make_client(compute, startup_timeout=100)
+    ready = await_ready(client, ["tc-ok", "tc-bad"])
+
+    assert set(ready) == {"tc-ok"}
+    assert clock.now < 100
+
+
+def test_timeout_records_instances_already_ready(clock, startup_log):
+    compute = FakeCompute(slow={"tc-slow"})
+    client = make_client(compute, startup_timeout=100)
+    with pytest.raises(TimeoutError, match="tc-slow"):
+        await_ready(client, ["tc-ok", "tc-slow"])
+
+    records = [json.loads(line) for line in startup_log.read_text().splitlines()]
+    assert [r["instance"] for r in records] == ["tc-ok"]
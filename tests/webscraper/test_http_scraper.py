@@ -0,0 +1,122 @@
+import asyncio
+from datetime import date
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.webscraper.http_scraper import DailyMailHttpScraper
+
+COMMENTS_PATH = "/reader-comments/p/asset/readcomments/{article_id}"
+ARTICLE_URL = "https://www.dailymail.co.uk/news/article-{}/story.html#comments"
+
+
+def comment(message: str, vote_rating: int, vote_count: int) -> dict:
+    return {"message": message, "voteRating": vote_rating, "voteCount": vote_count}
+
+
+# Article id to response the fixture server gives, in order of attempts
+RESPONSES = {
+    "1": [{"payload": {"page": [comment("first", 8, 12), comment("second", 2, 4)]}}],
+    "2": [{"payload": {"page": [comment("best", 20, 30)]}}],
+    "3": [{"payload": {"page": []}}],
+    "4": [{"payload": None}],
+    "5": ["<html>Service unavailable</html>"] * 3,
+    "6": [web.HTTPInternalServerError, {"payload": {"page": [comment("x", 1, 1)]}}],
+    "7": [["not", "an", "object"]] * 3,
+}
+
+
+def fixture_app(attempts: dict) -> web.Application:
+    """Comments endpoint serving RESPONSES, counting attempts per article"""
+
+    async def comments(request: web.Request) -> web.Response:
+        article_id = request.match_info["article_id"]
+        if article_id not in RESPONSES:
+            raise web.HTTPNotFound()
+        n = attempts.get(article_id, 0)
+        attempts[article_id] = n + 1
+        response = RESPONSES[article_id][min(n, len(RESPONSES[article_id]) - 1)]
+        if isinstance(response, type):
+            raise response()
+        if isinstance(response, str):
+            return web.Response(text=response, content_type="text/html")
+        return web.json_response(response)
+
+    app = web.Application()
+    app.router.add_get(COMMENTS_PATH, comments)
+    return app
+
+
+def run_with_scraper(work, n_top_comments: int = 1, top_k: int = 1):
+    """Run work(scraper, attempts) against a scraper using the fixture server"""
+
+    async def run():
+        attempts = {}
+        async with TestServer(fixture_app(attempts)) as server:
+            scraper = DailyMailHttpScraper(
+                n_top_comments=n_top_comments,
+                top_k=top_k,
+                log_n_iter=100,
+                retry_attempts=2,
+                comments_url=str(server.make_url("")) + COMMENTS_PATH,
+                max_connections=10,
+                request_timeout=5,
+            )
+            async with scraper:
+                return await work(scraper, attempts)
+
+    return asyncio.run(run())
+
+
+def fetch(article_id: str, n_top_comments: int = 1):
+    async def work(scraper, attempts):
+        return await scraper.fetch_comments(article_id)
+
+    return run_with_scraper(work, n_top_comments)
+
+
+def test_fetch_comments_returns_page():
+    assert fetch("2") == [comment("best", 20, 30)]
+
+
+def test_fetch_comments_empty_for_missing_article_or_comments():
+    assert fetch("404") == []
+    assert fetch("3") == []
+    assert fetch("4") == []
+
+
+def test_fetch_comments_none_once_non_json_retries_exhausted():
+    assert fetch("5") is None
+    assert fetch("7") is None
+
+
+def test_fetch_comments_retries_server_error():
+    async def work(scraper, attempts):
+        comments = await scraper.fetch_comments("6")
+        return comments, attempts["6"]
+
+    comments, attempts = run_with_scraper(work)
+    assert comments == [comment("x", 1, 1)]
+    assert attempts == 2
+
+
+def test_get_top_comments_maps_votes_to_upvotes():
+    async def work(scraper, attempts):
+        return await scraper.get_top_comments(ARTICLE_URL.format(1))
+
+    top_comments = run_with_scraper(work, n_top_comments=2)
+    assert top_comments == [
+        {"comment": "first", "rating-button-up": 10},
+        {"comment": "second", "rating-button-up": 3},
+    ]
+
+
+def test_process_date_survives_bad_articles():
+    urls = [ARTICLE_URL.format(i) for i in range(1, 8)]
+
+    async def work(scraper, attempts):
+        return await scraper.process_date(date(2023, 1, 1), urls)
+
+    df = run_with_scraper(work, top_k=2)
+    assert list(df["url"]) == [ARTICLE_URL.format(2), ARTICLE_URL.format(1)]
+    assert list(df["rating-button-up"]) == [25, 10]
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import signal
+from datetime import date
+from functools import partial
+
+import pytest
+
+from src.cloud_sdk.object_store import LocalObjectStore
+from src.configs.config import load_config
+from src.webscraper import run
+from src.webscraper.collect import progress_prefix
+from src.webscraper.ledger import ArticleLedger
+from src.webscraper.store import ResultStore
+from src.webscraper.task_queue import PENDING, connect_task_queue
+
+DATE = date(2023, 1, 1)
+ARTICLE_URLS = [f"https://www.dailymail.co.uk/news/article-{i}/x.html" for i in (1, 2)]
+
+
+class FakeSitemaps:
+    def __init__(self, **sitemap_config):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+    def prefetch(self, dates) -> None:
+        pass
+
+    async def get(self, date_: date):
+        return ARTICLE_URLS
+
+
+class PreemptedScraper:
+    """Records one article, then has the process sent SIGTERM mid-date"""
+
+    def __init__(self, ledger: ArticleLedger, results: LocalObjectStore):
+        self.ledger = ledger
+        self.results = results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+    async def process_date(self, date_, article_urls, skip_urls=None):
+        comments = [{"message": "first", "rating-button-up": 3}]
+        self.ledger.record(date_, 0, article_urls[0], comments)
+        # Stop once the status reporter has published at least once
+        while not self.results.list("status/"):
+            await asyncio.sleep(0.01)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(10)
+
+
+@pytest.fixture
+def preempted_run(tmp_path, monkeypatch):
+    results = LocalObjectStore(str(tmp_path / "results"))
+
+    def test_config(path: str) -> dict:
+        config = load_config(path)
+        config["prefilter"]["enabled"] = False
+        config["results"]["status_seconds"] = 0.01
+        return config
+
+    def create_scraper(ledger, **scraper_config):
+        return PreemptedScraper(ledger, results)
+
+    ledger_path = str(tmp_path / "ledger.sqlite")
+    monkeypatch.setattr(run, "load_config", test_config)
+    monkeypatch.setattr(run, "create_scraper", create_scraper)
+    monkeypatch.setattr(run, "SitemapPrefetcher", FakeSitemaps)
+    monkeypatch.setattr(run, "ArticleLedger", partial(ArticleLedger, ledger_path))
+    monkeypatch.setattr(run, "ResultStore", partial(ResultStore, str(tmp_path)))
+    return results
+
+
+def test_sigterm_saves_progress_and_releases_lease(tmp_path, preempted_run):
+    queue_uri = f"sqlite://{tmp_path / 'tasks.sqlite'}"
+    queue = connect_task_queue(queue_uri)
+    queue.put([DATE.isoformat()])
+    queue.close()
+
+    with pytest.raises(SystemExit) as exit_info:
+        run.run_pipeline(
+            [
+                "--queue",
+                queue_uri,
+                "--n-top-comments",
+                "1",
+                "--results-uri",
+                f"file://{preempted_run.root}",
+                "--worker-id",
+                "vm-1-p0",
+            ]
+        )
+
+    assert exit_info.value.code == run.PREEMPTED_EXIT_CODE == 143
+
+    progress_keys = preempted_run.list(progress_prefix(DATE))
+    assert progress_keys == [f"{progress_prefix(DATE)}vm-1-p0.json"]
+    with open(preempted_run.path(progress_keys[0])) as f:
+        assert [row["url"] for row in json.load(f)] == ARTICLE_URLS[:1]
+    with open(preempted_run.path("status/vm-1-p0.json")) as f:
+        assert json.load(f)["articles"] == 1
+
+    queue = connect_task_queue(queue_uri)
+    assert queue.counts() == {PENDING: 1}
+    queue.close()
@@ -0,0 +1,104 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.webscraper.prefilter import CommentCountFilter
+
+COUNT_PATH = "/reader-comments/p/asset/readcomments/{article_id}"
+ARTICLE_URL = "https://www.dailymail.co.uk/news/article-{}/story.html#comments"
+MIN_COMMENTS = 2
+
+# Article id to the response the fixture server gives, capped at max comments
+RESPONSES = {
+    "1": {"payload": {"total": 5, "page": [{}, {}, {}, {}, {}]}},
+    "2": {"payload": {"total": 1, "page": [{}]}},
+    "3": {"payload": {"page": [{}, {}, {}]}},
+    "4": {"payload": {"page": [{}]}},
+    "5": "<html>Service unavailable</html>",
+    "6": ["not", "an", "object"],
+    "7": {"payload": None},
+}
+
+
+def fixture_app(requested_max: dict) -> web.Application:
+    """Count endpoint serving RESPONSES, recording the max each request asked"""
+
+    async def count(request: web.Request) -> web.Response:
+        article_id = request.match_info["article_id"]
+        if article_id not in RESPONSES:
+            raise web.HTTPNotFound()
+        requested_max[article_id] = int(request.query["max"])
+        response = RESPONSES[article_id]
+        if isinstance(response, str):
+            return web.Response(text=response, content_type="text/html")
+        if isinstance(response, dict) and response["payload"]:
+            page = response["payload"]["page"][: requested_max[article_id]]
+            response = {"payload": {**response["payload"], "page": page}}
+        return web.json_response(response)
+
+    app = web.Application()
+    app.router.add_get(COUNT_PATH, count)
+    return app
+
+
+def run_with_filter(work):
+    """Run work(prefilter, requested_max) against the fixture server"""
+
+    async def run():
+        requested_max = {}
+        async with TestServer(fixture_app(requested_max)) as server:
+            prefilter = CommentCountFilter(
+                count_url=str(server.make_url("")) + COUNT_PATH,
+                min_comments=MIN_COMMENTS,
+                max_connections=10,
+                request_timeout=5,
+            )
+            async with prefilter:
+                return await work(prefilter, requested_max)
+
+    return asyncio.run(run())
+
+
+def count(article_id: str):
+    async def work(prefilter, requested_max):
+        return await prefilter.get_comment_count(ARTICLE_URL.format(article_id))
+
+    return run_with_filter(work)
+
+
+def test_count_uses_total():
+    assert count("1") == 5
+    assert count("2") == 1
+
+
+def test_count_without_total_pages_up_to_min_comments():
+    async def work(prefilter, requested_max):
+        n = await prefilter.get_comment_count(ARTICLE_URL.format("3"))
+        return n, requested_max["3"]
+
+    n, requested_max = run_with_filter(work)
+    assert requested_max == MIN_COMMENTS
+    assert n == MIN_COMMENTS
+    assert count("4") == 1
+
+
+def test_missing_article_has_no_comments():
+    assert count("404") == 0
+
+
+def test_unreadable_response_is_unknown():
+    assert count("5") is None
+    assert count("6") is None
+    assert count("7") is None
+
+
+def test_low_comment_urls_keeps_unknown_counts():
+    urls = {article_id: ARTICLE_URL.format(article_id) for article_id in "1234567"}
+    urls["404"] = ARTICLE_URL.format("404")
+
+    async def work(prefilter, requested_max):
+        return await prefilter.low_comment_urls(list(urls.values()))
+
+    skip_urls = run_with_filter(work)
+    assert skip_urls == {urls["2"], urls["4"], urls["404"]}
@@ -0,0 +1,41 @@
+from datetime import date
+
+from src.cloud_sdk.object_store import LocalObjectStore
+from src.configs.config import load_config
+from src.webscraper import run
+from src.webscraper.collect import partition_key
+from src.webscraper.run import ScrapeSession
+
+DATE = date(2023, 1, 1)
+
+
+def publish(results: LocalObjectStore, worker_id: str, date_: date, tmp_path) -> str:
+    local_path = tmp_path / "partition.parquet"
+    local_path.write_bytes(b"")
+    key = partition_key(worker_id, date_)
+    results.put_file(str(local_path), key)
+    return key
+
+
+def test_dates_published_mid_session_are_skipped(tmp_path, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(run.time, "monotonic", lambda: clock[0])
+    results = LocalObjectStore(str(tmp_path / "results"))
+    config = load_config("webscraper/scraper_config.yaml")
+    session = ScrapeSession(config, None, results, "vm-1-p0", skip_published=True)
+
+    assert session.published_key(DATE) is None
+    # Another instance publishes the date after this one first listed
+    key = publish(results, "vm-2-p0", DATE, tmp_path)
+    assert session.published_key(DATE) is None
+    clock[0] += config["results"]["published_seconds"] + 1
+    assert session.published_key(DATE) == key
+
+
+def test_published_dates_are_scraped_without_skip_published(tmp_path):
+    results = LocalObjectStore(str(tmp_path / "results"))
+    publish(results, "vm-2-p0", DATE, tmp_path)
+    config = load_config("webscraper/scraper_config.yaml")
+    session = ScrapeSession(config, None, results, "vm-1-p0")
+
+    assert session.published_key(DATE) is None
@@ -0,0 +1,146 @@
+import asyncio
+import copy
+
+import pytest
+from google.api_core.exceptions import PreconditionFailed
+
+from src.webscraper import task_queue
+from src.webscraper.run import run_leased
+from src.webscraper.task_queue import DONE, LEASED, PENDING, connect_task_queue
+
+
+class FakeBlob:
+    """Blob snapshot of a FakeBucket object, with GCS precondition checks"""
+
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.metadata = None
+        self.metageneration = None
+
+    def upload_from_string(self, data, if_generation_match=None):
+        if if_generation_match == 0 and self.name in self.bucket.objects:
+            raise PreconditionFailed("exists")
+        self.bucket.objects[self.name] = (dict(self.metadata or {}), 1)
+
+    def patch(self, if_metageneration_match=None):
+        _, metageneration = self.bucket.objects[self.name]
+        if if_metageneration_match != metageneration:
+            raise PreconditionFailed("changed")
+        self.bucket.objects[self.name] = (dict(self.metadata), metageneration + 1)
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def snapshot(self, name: str) -> FakeBlob:
+        blob = FakeBlob(self, name)
+        metadata, blob.metageneration = self.objects[name]
+        blob.metadata = copy.deepcopy(metadata)
+        return blob
+
+    def get_blob(self, name: str):
+        return self.snapshot(name) if name in self.objects else None
+
+    def list_blobs(self, prefix: str = ""):
+        return [self.snapshot(n) for n in self.objects if n.startswith(prefix)]
+
+
+class FakeClient:
+    def __init__(self, bucket: FakeBucket):
+        self._bucket = bucket
+
+    def bucket(self, name: str) -> FakeBucket:
+        return self._bucket
+
+
+@pytest.fixture
+def bucket(monkeypatch) -> FakeBucket:
+    bucket = FakeBucket()
+    monkeypatch.setattr(task_queue.storage, "Client", lambda: FakeClient(bucket))
+    return bucket
+
+
+@pytest.fixture(params=["sqlite", "gs"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        queue = connect_task_queue(f"sqlite://{tmp_path / 'tasks.sqlite'}")
+    else:
+        request.getfixturevalue("bucket")
+        queue = connect_task_queue("gs://bucket/queue")
+    yield queue
+    queue.close()
+
+
+def test_tasks_leased_once_in_order(queue):
+    queue.put(["2023-01-02", "2023-01-01"])
+    queue.put(["2023-01-01"])
+    first = queue.lease("a", lease_seconds=60)
+    second = queue.lease("b", lease_seconds=60)
+    assert (first.task_id, second.task_id) == ("2023-01-01", "2023-01-02")
+    assert queue.lease("c", lease_seconds=60) is None
+    assert queue.counts() == {LEASED: 2}
+
+
+def test_expired_lease_is_taken_over(queue):
+    queue.put(["2023-01-01"])
+    lost = queue.lease("a", lease_seconds=-1)
+    taken = queue.lease("b", lease_seconds=60)
+    assert taken.task_id == lost.task_id
+    assert not queue.heartbeat(lost, lease_seconds=60)
+    assert queue.heartbeat(taken, lease_seconds=60)
+
+
+def test_lost_lease_cannot_complete_or_release(queue):
+    queue.put(["2023-01-01"])
+    lost = queue.lease("a", lease_seconds=-1)
+    taken = queue.lease("b", lease_seconds=60)
+    queue.complete(lost)
+    queue.release(lost)
+    assert queue.counts() == {LEASED: 1}
+    queue.complete(taken)
+    assert queue.counts() == {DONE: 1}
+
+
+def test_release_worker_returns_its_tasks(queue):
+    queue.put(["2023-01-01", "2023-01-02", "2023-01-03"])
+    queue.lease("a", lease_seconds=60)
+    queue.lease("a", lease_seconds=60)
+    queue.lease("b", lease_seconds=60)
+    assert queue.release_worker("a") == 2
+    assert queue.counts() == {PENDING: 2, LEASED: 1}
+
+
+def test_gcs_lease_race_has_one_winner(bucket, monkeypatch):
+    queue = connect_task_queue("gs://bucket/queue")
+    queue.put(["2023-01-01"])
+    # Both workers read the task as pending before either patches it
+    stale = queue.task_blobs()
+    assert queue.lease("a", lease_seconds=60) is not None
+    monkeypatch.setattr(queue, "task_blobs", lambda: stale)
+    assert queue.lease("b", lease_seconds=60) is None
+
+
+def test_lost_lease_waits_for_abandoned_work(queue):
+    queue.put(["2023-01-01"])
+    task = queue.lease("a", lease_seconds=-1)
+    events = []
+
+    async def work():
+        # Another worker takes the expired lease over mid-run
+        events.append(queue.lease("b", lease_seconds=60).task_id)
+        try:
+            await asyncio.sleep(10)
+        finally:
+            # Saving progress on the way out still uses the session
+            await asyncio.sleep(0.05)
+            events.append("saved")
+
+    lease_config = {"heartbeat_seconds": 0.01, "lease_seconds": 60}
+    assert not asyncio.run(run_leased(queue, task, work(), lease_config))
+    assert events == [task.task_id, "saved"]
+    assert queue.counts() == {LEASED: 1}
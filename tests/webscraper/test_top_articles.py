@@ -0,0 +1,20 @@
+from src.webscraper.top_articles import TopArticles
+
+
+def test_ties_go_to_earlier_article():
+    top_articles = TopArticles(k=1)
+    assert top_articles.push(5, 3, "c", [])
+    assert top_articles.would_keep(5, 1)
+    assert top_articles.push(5, 1, "a", [])
+    assert not top_articles.would_keep(5, 2)
+    assert not top_articles.push(5, 2, "b", [])
+    assert top_articles.ranked() == [(5, 1, "a", [])]
+
+
+def test_would_keep_matches_push():
+    top_articles = TopArticles(k=2)
+    offers = [(3, 4), (7, 2), (3, 1), (0, 0), (7, 5), (2, 3), (8, 6)]
+    for upvotes, article_num in offers:
+        expected = top_articles.would_keep(upvotes, article_num)
+        assert top_articles.push(upvotes, article_num, str(article_num), []) == expected
+    assert [entry[:2] for entry in top_articles.ranked()] == [(8, 6), (7, 2)]